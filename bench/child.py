@@ -0,0 +1,20 @@
+"""
+Benchmark child process.
+
+Runs naaman against a mock AUR, usage: child.py <aur url> [naaman args]
+(bench/fakealpm must be on the PYTHONPATH to use synthetic databases)
+"""
+import sys
+import naaman.aur as aur
+import naaman.naaman as naaman
+
+
+def main():
+    """Main-entry harness."""
+    aur.set_url(sys.argv[1])
+    sys.argv = [sys.argv[0]] + sys.argv[2:]
+    naaman.main()
+
+
+if __name__ == "__main__":
+    main()
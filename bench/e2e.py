@@ -0,0 +1,136 @@
+"""
+End-to-end naaman benchmarks.
+
+Runs naaman (as a child process) against a local mock AUR and synthetic
+pacman databases at several scales and reports wall time, rpc request
+count and peak rss (KB) per scenario as JSON.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import bench.mockaur as mockaur
+import bench.synthetic as synthetic
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+_CHILD = os.path.join(_ROOT, "bench", "child.py")
+_FAKE = os.path.join(_ROOT, "bench", "fakealpm")
+_DECLINE = b"n\n"
+
+# name, naaman arguments, reuse the previous scenario's cache
+SCENARIOS = [("query", ["-Q"], False),
+             ("gone", ["-Qg"], False),
+             ("query-upgrades", ["-Qu"], False),
+             ("search", ["-Ss", synthetic.AUR_PREFIX], False),
+             ("upgrade-plan", ["-Su"], False),
+             ("upgrade-plan-warm", ["-Su"], True),
+             ("deps-plan", ["-Sd", synthetic.NEW_ROOT], False),
+             ("prewarm", ["--prewarm"], False)]
+
+
+def _run(url, args, env):
+    """Run naaman, returns (exit code, wall seconds, peak rss)."""
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, _CHILD, url] + args,
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL,
+                            env=env)
+    proc.stdin.write(_DECLINE)
+    proc.stdin.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.WEXITSTATUS(status)
+    return proc.returncode, time.time() - start, usage.ru_maxrss
+
+
+def scale(count, scenarios, tiers, fanout, git):
+    """Benchmark all scenarios at a scale."""
+    results = []
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([_ROOT, _FAKE])
+    # naaman refuses to build (or plan builds) as root
+    env["USER"] = "bench"
+    env["LOGNAME"] = "bench"
+    with tempfile.TemporaryDirectory(prefix="naaman.bench.") as t:
+        config, packages = synthetic.generate(t,
+                                              count,
+                                              tiers=tiers,
+                                              fanout=fanout,
+                                              git=git)
+        git_dir = None
+        if git:
+            git_dir = os.path.join(t, "git")
+        mock = mockaur.MockAUR(packages, git_dir=git_dir)
+        url = mock.start()
+        cache = None
+        try:
+            for name, args, warm in SCENARIOS:
+                if scenarios and name not in scenarios:
+                    continue
+                if name == "prewarm" and not git:
+                    continue
+                if not warm or cache is None:
+                    cache = tempfile.mkdtemp(dir=t, prefix="cache.")
+                common = ["--no-config",
+                          "--cache-dir", cache,
+                          "--builds", cache,
+                          "--pacman", config]
+                mock.reset()
+                code, wall, rss = _run(url, common + args, env)
+                results.append({"scenario": name,
+                                "args": args,
+                                "exit": code,
+                                "wall": round(wall, 4),
+                                "rpc": mock.rpc_requests,
+                                "git": mock.git_requests,
+                                "peak_rss_kb": rss})
+        finally:
+            mock.stop()
+    return {"packages": count, "results": results}
+
+
+def main():
+    """Main-entry harness."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales",
+                        type=int,
+                        nargs="+",
+                        default=[10, 100, 1000],
+                        help="installed AUR package counts")
+    parser.add_argument("--tiers",
+                        type=int,
+                        default=2,
+                        help="dependency tiers (depth) of installed packages")
+    parser.add_argument("--fanout",
+                        type=int,
+                        default=2,
+                        help="AUR dependencies per package")
+    parser.add_argument("--scenarios",
+                        nargs="+",
+                        choices=[x[0] for x in SCENARIOS],
+                        help="only run these scenarios")
+    parser.add_argument("--git",
+                        action="store_true",
+                        help="serve git repositories (enables prewarm)")
+    parser.add_argument("--output",
+                        help="write the json report to a file")
+    args = parser.parse_args()
+    report = {"scales": []}
+    for count in args.scales:
+        report["scales"].append(scale(count,
+                                      args.scenarios,
+                                      args.tiers,
+                                      args.fanout,
+                                      args.git))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Fake pycman backend for benchmarks.
+
+Serves synthetic local/sync databases (see bench/synthetic.py) so naaman
+can be measured without libalpm or a real pacman installation.
+"""
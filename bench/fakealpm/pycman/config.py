@@ -0,0 +1,61 @@
+"""Fake pycman configuration (handle) loading."""
+import json
+import os
+
+
+class Package(object):
+    """Synthetic package."""
+
+    def __init__(self, obj):
+        """Init the package from its json definition."""
+        self.name = obj["name"]
+        self.version = obj["version"]
+        self.depends = obj.get("depends", [])
+        self.optdepends = obj.get("optdepends", [])
+        self.provides = obj.get("provides", [])
+        self.conflicts = obj.get("conflicts", [])
+        self.reason = obj.get("reason", 0)
+        self.files = [(x, 0, "") for x in obj.get("files", [])]
+
+
+class Database(object):
+    """Synthetic package database."""
+
+    def __init__(self, name, packages):
+        """Init the database."""
+        self.name = name
+        self.pkgcache = [Package(x) for x in packages]
+        self._index = {}
+        for p in self.pkgcache:
+            self._index[p.name] = p
+
+    def get_pkg(self, name):
+        """Get a package by name."""
+        return self._index.get(name, None)
+
+
+class Handle(object):
+    """Synthetic alpm handle."""
+
+    def __init__(self, config_file):
+        """Init the handle from a synthetic database definition."""
+        with open(config_file, 'r') as f:
+            obj = json.loads(f.read())
+        self.root = obj.get("root", "/")
+        self.dbpath = os.path.dirname(os.path.abspath(config_file)) + "/"
+        self.cachedirs = obj.get("cachedirs", [])
+        self._local = Database("local", obj["local"])
+        self._sync = [Database(k, v) for k, v in obj["sync"].items()]
+
+    def get_localdb(self):
+        """Get the local database."""
+        return self._local
+
+    def get_syncdbs(self):
+        """Get the sync databases."""
+        return self._sync
+
+
+def init_with_config(config_file):
+    """Init a handle (the 'config' is a synthetic database definition)."""
+    return Handle(config_file)
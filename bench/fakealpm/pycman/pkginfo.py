@@ -0,0 +1,11 @@
+"""Fake pycman package information formatting."""
+
+
+def get_term_size():
+    """Get the terminal width."""
+    return 80
+
+
+def format_attr(attrname, value, format=None):
+    """Format an attribute for display."""
+    return "{:<20}: {}".format(attrname, value)
@@ -0,0 +1,297 @@
+"""
+Microbenchmarks for per-package/per-dependency helpers.
+
+Times hot helpers with realistic input sizes (no external services) and
+compares them against stored baseline numbers. Timings are normalized by
+a calibration loop (best of several runs, interleaved with each helper)
+so the baseline is (mostly) portable across machines, helpers over the
+threshold are measured again before being reported.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+import naaman.aur as aur
+import naaman.context as nctx
+from datetime import datetime
+
+_BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                         "baseline.json")
+_REPEAT = 7
+_CALIBRATE = 50
+_RETRIES = 2
+_THRESHOLD = 1.5
+_INSTALLED = 1500
+
+
+class _Package(object):
+    """Installed package stand-in."""
+
+    def __init__(self, name, depends):
+        """Init the package."""
+        self.name = name
+        self.version = "1.0-1"
+        self.depends = depends
+        self.optdepends = []
+
+
+def _names(count, prefix="pkg"):
+    """Get package names (every 7th a vcs package)."""
+    names = []
+    for idx in range(count):
+        suffix = ""
+        if idx % 7 == 0:
+            suffix = "-git"
+        names.append("{}-{:05d}{}".format(prefix, idx, suffix))
+    return names
+
+
+def _calibrate():
+    """Run a reference workload to normalize timings."""
+    total = 0
+    for idx in range(2000):
+        total += len(str(idx))
+    return total
+
+
+def _deps_compare():
+    """Parse dependency strings."""
+    deps = []
+    for idx, name in enumerate(_names(500)):
+        op = ["", ">=", "<=", "=", ">", "<"][idx % 6]
+        if op:
+            deps.append("{}{}1.{}-1".format(name, op, idx))
+        else:
+            deps.append(name)
+
+    def run():
+        for d in deps:
+            aur.deps_compare(d)
+    return run
+
+
+def _get_segment():
+    """Read printable rpc result segments."""
+    results = []
+    for name in _names(200):
+        results.append({"Name": name,
+                        "Version": "1.2.3-1",
+                        "Description": "an example description " * 4})
+
+    def run():
+        for r in results:
+            for key in ["Name", "Description", "Version"]:
+                aur._get_segment(r, key)
+    return run
+
+
+def _is_vcs():
+    """Check names for vcs suffixes."""
+    names = _names(_INSTALLED)
+
+    def run():
+        for n in names:
+            aur.is_vcs(n)
+    return run
+
+
+def _dep_tree():
+    """Walk a dependency tree."""
+    root = aur.DepTree("root")
+    level = [root]
+    for depth in range(4):
+        nxt = []
+        for parent in level:
+            for idx in range(3):
+                child = aur.DepTree("{}-{}".format(parent.name, idx))
+                parent.add(child)
+                nxt.append(child)
+        level = nxt
+
+    def run():
+        for _ in root.get({}):
+            pass
+    return run
+
+
+def _rpc_package():
+    """Build package records from rpc results."""
+    results = []
+    for name in _names(500):
+        results.append({"Name": name,
+                        "Version": "1.2.3-1",
+                        "URLPath": "/cgit/aur.git/snapshot/x.tar.gz",
+                        "PackageBase": name,
+                        "Description": "an example description",
+                        "Maintainer": "maintainer",
+                        "Depends": ["glibc", "gcc-libs", name + "-data"],
+                        "MakeDepends": ["cmake", "git"],
+                        "LastModified": 1500000000})
+
+    def run():
+        for r in results:
+            aur.rpc_package(r)
+    return run
+
+
+def _get_deps():
+    """Order installed packages by dependencies."""
+    names = _names(100)
+    pkgs = []
+    for idx, name in enumerate(names):
+        depends = ["glibc"]
+        if idx >= 10:
+            depends += [names[idx % 10], names[(idx * 3) % 10]]
+        pkgs.append(_Package(name, depends))
+
+    def run():
+        aur._get_deps(pkgs, None)
+    return run
+
+
+class _Db(object):
+    """Local database stand-in."""
+
+    def __init__(self, pkgs):
+        """Init the database."""
+        self.pkgcache = pkgs
+
+
+def _context(cache_dir):
+    """Get a (minimal) context without a pacman handle."""
+    ctx = nctx.Context.__new__(nctx.Context)
+    ctx.db = _Db([_Package(x, []) for x in _names(_INSTALLED)])
+    ctx._pkgcaching = set()
+    ctx._cache_dir = cache_dir
+    ctx.now = datetime.now()
+    ctx.rpc_cache = 60
+    return ctx
+
+
+def _check_pkgcache(cache_dir):
+    """Check installed packages (hits and misses)."""
+    ctx = _context(cache_dir)
+    lookups = _names(_INSTALLED)[::30] + _names(25, prefix="missing")
+
+    def run():
+        for name in lookups:
+            ctx.check_pkgcache(name, "1.0-1")
+    return run
+
+
+def _rpc_caching(cache_dir):
+    """Check rpc cache entries."""
+    ctx = _context(cache_dir)
+    names = _names(50)
+    for name in names:
+        cache_file, _ = aur._rpc_caching(name, ctx)
+        with open(cache_file, 'w') as f:
+            f.write("{}")
+
+    def run():
+        for name in names:
+            aur._rpc_caching(name, ctx)
+    return run
+
+
+def _helpers(cache_dir):
+    """Get the benchmarked helpers (name, number, callable)."""
+    return [("aur.deps_compare", 50, _deps_compare()),
+            ("aur._get_segment", 50, _get_segment()),
+            ("aur.is_vcs", 20, _is_vcs()),
+            ("aur.DepTree.get", 20, _dep_tree()),
+            ("aur._get_deps", 5, _get_deps()),
+            ("aur.rpc_package", 10, _rpc_package()),
+            ("Context.check_pkgcache", 5, _check_pkgcache(cache_dir)),
+            ("aur._rpc_caching", 20, _rpc_caching(cache_dir))]
+
+
+def _time(func, number):
+    """Best time per call and best calibration (measured alongside)."""
+    seconds = []
+    calibration = []
+    for _ in range(_REPEAT):
+        # interleaved, so both see the same machine state (e.g. frequency)
+        calibration.append(timeit.timeit(_calibrate, number=_CALIBRATE))
+        seconds.append(timeit.timeit(func, number=number))
+    return min(seconds) / number, min(calibration) / _CALIBRATE
+
+
+def run(names=None):
+    """Run (all or some) helpers, returns normalized timings."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="naaman.micro.") as t:
+        for name, number, func in _helpers(t):
+            if names is not None and name not in names:
+                continue
+            seconds, calibration = _time(func, number)
+            results[name] = {"seconds": seconds,
+                             "normalized": seconds / calibration}
+    return results
+
+
+def _rerun(results, baseline, threshold):
+    """Measure helpers over the threshold again (keeping the best)."""
+    for _ in range(_RETRIES):
+        slow = [k for k, v in results.items()
+                if k in baseline and v["normalized"] > baseline[k] * threshold]
+        if len(slow) == 0:
+            return
+        for name, result in run(slow).items():
+            if result["normalized"] < results[name]["normalized"]:
+                results[name] = result
+
+
+def main():
+    """Main-entry harness."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update",
+                        action="store_true",
+                        help="store the current numbers as the baseline")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=_THRESHOLD,
+                        help="allowed slowdown factor over the baseline")
+    parser.add_argument("--baseline",
+                        default=_BASELINE,
+                        help="baseline file")
+    args = parser.parse_args()
+    results = run()
+    if args.update:
+        baseline = {k: round(v["normalized"], 3) for k, v in results.items()}
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print("baseline updated: {}".format(args.baseline))
+        return
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.loads(f.read())
+    _rerun(results, baseline, args.threshold)
+    failed = False
+    for name in sorted(results.keys()):
+        current = results[name]["normalized"]
+        expect = baseline.get(name, None)
+        status = "ok"
+        ratio = 0
+        if expect is None:
+            status = "no baseline"
+        else:
+            ratio = current / expect
+            if ratio > args.threshold:
+                status = "REGRESSION"
+                failed = True
+        print("{:<24} {:>10.1f}us {:>8.2f}x {}".format(
+            name,
+            results[name]["seconds"] * 1000000,
+            ratio,
+            status))
+    if failed:
+        print("helpers regressed past {}x".format(args.threshold))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
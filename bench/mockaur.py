@@ -0,0 +1,141 @@
+"""
+Local stand-in for the AUR.
+
+Serves the /rpc (v5) info and search endpoints (and the packages.gz name
+list) from an in-memory package set and git repositories (dumb http) from
+a directory, counting requests.
+"""
+import functools
+import gzip
+import http.server
+import json
+import threading
+import urllib.parse
+
+RPC = "/rpc"
+PACKAGES = "/packages.gz"
+
+
+class MockAUR(object):
+    """Mock AUR server."""
+
+    def __init__(self, packages, git_dir=None):
+        """Init the mock with rpc results (by name)."""
+        self.packages = packages
+        self.git_dir = git_dir
+        self.rpc_requests = 0
+        self.git_requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def count(self, rpc):
+        """Count a request."""
+        with self._lock:
+            if rpc:
+                self.rpc_requests += 1
+            else:
+                self.git_requests += 1
+
+    def reset(self):
+        """Reset request counters."""
+        with self._lock:
+            self.rpc_requests = 0
+            self.git_requests = 0
+
+    def info(self, names):
+        """Get info results."""
+        return [self.packages[x] for x in names if x in self.packages]
+
+    def search(self, by, arg):
+        """Get search results."""
+        results = []
+        for name in sorted(self.packages.keys()):
+            pkg = self.packages[name]
+            if by == "maintainer":
+                if pkg.get("Maintainer", None) != arg:
+                    continue
+            else:
+                text = name
+                if by == "name-desc":
+                    text += " " + (pkg.get("Description", None) or "")
+                if arg not in text:
+                    continue
+            results.append(pkg)
+        return results
+
+    def rpc(self, query):
+        """Handle an rpc request."""
+        q = urllib.parse.parse_qs(query)
+        req_type = q.get("type", [""])[0]
+        if req_type in ["info", "multiinfo"]:
+            results = self.info(q.get("arg[]", []))
+        elif req_type == "search":
+            results = self.search(q.get("by", ["name-desc"])[0],
+                                  q.get("arg", [""])[0])
+        else:
+            return {"version": 5,
+                    "type": "error",
+                    "resultcount": 0,
+                    "results": [],
+                    "error": "Incorrect request type specified."}
+        return {"version": 5,
+                "type": req_type,
+                "resultcount": len(results),
+                "results": results}
+
+    def start(self):
+        """Start serving, returns the base url."""
+        handler = functools.partial(_Handler, self, directory=self.git_dir)
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                       handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    """Mock AUR request handler."""
+
+    def __init__(self, mock, *args, **kwargs):
+        """Init the handler."""
+        self._mock = mock
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        """Handle rpc or git requests."""
+        url = urllib.parse.urlparse(self.path)
+        if url.path == PACKAGES:
+            self._mock.count(True)
+            names = "\n".join(sorted(self._mock.packages.keys()))
+            body = gzip.compress(names.encode("utf-8"))
+            self._send(body, "application/gzip")
+            return
+        if url.path != RPC:
+            self._mock.count(False)
+            if self._mock.git_dir is None:
+                self.send_error(404)
+                return
+            return super().do_GET()
+        self._mock.count(True)
+        body = json.dumps(self._mock.rpc(url.query)).encode("utf-8")
+        self._send(body, "application/json")
+
+    def _send(self, body, content_type):
+        """Send a response body."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Silence request logging."""
+        pass
@@ -0,0 +1,115 @@
+"""
+Synthetic pacman databases and AUR package sets.
+
+Generates N installed AUR packages (in tiers, each tier depending on the
+one below it), repository packages, a set of not-yet-installed AUR packages
+for dependency resolution, and the matching AUR rpc results.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+
+AUR_PREFIX = "bench-pkg-"
+NEW_ROOT = "bench-new-root"
+_NEW_PREFIX = "bench-new-"
+_REPO_PREFIX = "repo-pkg-"
+_VERSION = "1.0-1"
+_UPGRADE = "1.1-1"
+_MAINTAINER = "bench"
+_SEED = 1337
+
+
+def _rpc(name, version, depends, idx):
+    """Build an rpc result."""
+    return {"ID": idx,
+            "Name": name,
+            "PackageBaseID": idx,
+            "PackageBase": name,
+            "Version": version,
+            "Description": "synthetic benchmark package {}".format(name),
+            "URL": "https://example.com/{}".format(name),
+            "NumVotes": idx % 50,
+            "Popularity": 0.1,
+            "OutOfDate": None,
+            "Maintainer": _MAINTAINER,
+            "FirstSubmitted": 1500000000,
+            "LastModified": 1500000000 + idx,
+            "URLPath": "/cgit/aur.git/snapshot/{}.tar.gz".format(name),
+            "Depends": depends,
+            "MakeDepends": [],
+            "License": ["MIT"],
+            "Keywords": []}
+
+
+def generate(path, count, tiers=2, fanout=2, upgrade_every=10, git=False):
+    """Generate a synthetic system, returns (pacman config, rpc results)."""
+    rand = random.Random(_SEED)
+    repos = ["{}{:05d}".format(_REPO_PREFIX, x) for x in range(count * 2)]
+    local = []
+    sync = []
+    for name in repos:
+        sync.append({"name": name, "version": _VERSION})
+        local.append({"name": name, "version": _VERSION})
+    packages = {}
+    tier_size = max(1, count // max(1, tiers))
+    below = []
+    current = []
+    for idx in range(count):
+        name = "{}{:05d}".format(AUR_PREFIX, idx)
+        if idx > 0 and idx % tier_size == 0:
+            below = current
+            current = []
+        depends = [rand.choice(repos)]
+        if len(below) > 0:
+            depends += rand.sample(below, min(fanout, len(below)))
+        current.append(name)
+        version = _VERSION
+        if upgrade_every > 0 and idx % upgrade_every == 0:
+            version = _UPGRADE
+        local.append({"name": name,
+                      "version": _VERSION,
+                      "depends": depends,
+                      "reason": idx % 2})
+        packages[name] = _rpc(name, version, depends, idx)
+    new_count = max(1, count // 10)
+    new = ["{}{:05d}".format(_NEW_PREFIX, x) for x in range(new_count)]
+    for idx, name in enumerate(new):
+        later = new[idx + 1:]
+        depends = rand.sample(later, min(fanout, len(later)))
+        packages[name] = _rpc(name, _VERSION, depends, count + idx)
+    packages[NEW_ROOT] = _rpc(NEW_ROOT, _VERSION, new[0:fanout], -1)
+    if not os.path.exists(os.path.join(path, "local")):
+        os.makedirs(os.path.join(path, "local"))
+    config = os.path.join(path, "pacman.json")
+    with open(config, 'w') as f:
+        f.write(json.dumps({"local": local, "sync": {"core": sync}}))
+    if git:
+        _git_repos(os.path.join(path, "git"), sorted(packages.keys()))
+    return config, packages
+
+
+def _git_repos(path, bases):
+    """Create (dumb http served) bare git repositories for package bases."""
+    template = os.path.join(path, "template")
+    work = os.path.join(path, "work")
+    os.makedirs(work)
+    with open(os.path.join(work, "PKGBUILD"), 'w') as f:
+        f.write("pkgname=bench\npkgver=1.0\npkgrel=1\narch=('any')\n")
+
+    def _git(args, cwd):
+        subprocess.check_call(["git",
+                               "-c", "user.name=bench",
+                               "-c", "user.email=bench@localhost"] + args,
+                              cwd=cwd,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    _git(["init", "-q"], work)
+    _git(["add", "PKGBUILD"], work)
+    _git(["commit", "-q", "-m", "bench"], work)
+    _git(["clone", "-q", "--bare", work, template], path)
+    _git(["update-server-info"], template)
+    for base in bases:
+        shutil.copytree(template, os.path.join(path, base + ".git"))
+    return path
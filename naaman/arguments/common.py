@@ -26,12 +26,15 @@ find out what AUR packages are currently installed on the system.""",
     parser.add_argument('-u', '--upgrades',
                         help="""perform an upgrade of installed packages on the
 the system. this will attempt to upgrade all AUR installed packages. a list of
-target packages may also be passed.""",
+target packages may also be passed. with -Q this will list installed AUR
+packages that have upgrades available instead.""",
                         action="store_true")
     parser.add_argument('-s', '--search',
                         help="""search for packages in the AUR. the AUR rpc
 endpoints will be called to attempt to find a package with a name or
-description matching the input string (change fields using --rpc-field).""",
+description matching the input string (change fields using --rpc-field).
+multiple terms are searched concurrently and packages matching all of them are
+shown (see --search-union).""",
                         action="store_true")
     parser.add_argument('-c', '--clean',
                         help="""clean the cache. this will clean the naaman
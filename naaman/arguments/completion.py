@@ -0,0 +1,26 @@
+"""
+Completion options.
+
+Options for completing AUR package names (e.g. from bash completion)
+"""
+
+COMPLETION_OPTIONS = "Completion options"
+
+
+def options(parser):
+    """Get completion options."""
+    group = parser.add_argument_group(COMPLETION_OPTIONS)
+    group.add_argument("--complete",
+                       help="""print AUR package names starting with a prefix
+from the completion index (see --complete-refresh). this is answered before
+the rest of naaman is loaded and is meant for shell completion.""",
+                       metavar="PREFIX",
+                       type=str)
+    group.add_argument("--complete-refresh",
+                       help="""refresh the completion index of AUR package
+names from the AUR package list (packages.gz) or from a (gzip'd) local file
+and exit. --prewarm also refreshes the index.""",
+                       metavar="FILE",
+                       nargs="?",
+                       const="",
+                       type=str)
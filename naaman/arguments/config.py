@@ -66,6 +66,17 @@ def load_config(args, config_file):
                        "NO_SUDO",
                        "FETCH_DIR",
                        "DO_NOT_TRACK",
+                       "METRICS_FILE",
+                       "METRICS_TEXTFILE",
+                       "REPO_DIR",
+                       "AUR_URL",
+                       "SOURCES_SIZE",
+                       "RPC_LIMIT",
+                       "WORKSPACE_AGE",
+                       "WORKSPACE_SIZE",
+                       "VCS_BUDGET",
+                       "VCS_BUDGET_TIME",
+                       "BUILD_SPOOL",
                        "VCS_IGNORE"]:
                 val = None
                 lowered = key.lower()
@@ -91,7 +102,14 @@ def load_config(args, config_file):
                                  "NO_CACHE",
                                  "REORDER_DEPS"]:
                         val == value == "True"
-                    elif key in ["VCS_IGNORE", "RPC_CACHE"]:
+                    elif key in ["VCS_IGNORE",
+                                 "RPC_CACHE",
+                                 "SOURCES_SIZE",
+                                 "RPC_LIMIT",
+                                 "WORKSPACE_AGE",
+                                 "WORKSPACE_SIZE",
+                                 "VCS_BUDGET",
+                                 "VCS_BUDGET_TIME"]:
                         val = int(value)
                     else:
                         val = value
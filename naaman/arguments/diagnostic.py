@@ -0,0 +1,38 @@
+"""
+Diagnostic options.
+
+Options for measuring where naaman spends its time
+"""
+
+DIAGNOSTIC_OPTIONS = "Diagnostic options"
+
+
+def options(parser):
+    """Get diagnostic options."""
+    group = parser.add_argument_group(DIAGNOSTIC_OPTIONS)
+    group.add_argument("--profile",
+                       help="""time the phases of the operation (rpc
+requests, dependency resolution, git/makepkg/pacman steps, shell commands)
+and print a breakdown table when naaman exits.""",
+                       action="store_true")
+    group.add_argument("--profile-dump",
+                       help="""with --profile, also write a cProfile (.pstats)
+dump and the top N tracemalloc allocation sites into the cache directory.""",
+                       metavar="N",
+                       type=int)
+    group.add_argument("--trace-file",
+                       help="""record the operation (rpc requests with cache
+hits/misses, git/makepkg/pacman steps, subprocesses, lock waits) as nested
+spans in the chrome trace-event format and write them to this file at exit.
+the file can be opened in a timeline viewer (e.g. chrome://tracing).""",
+                       type=str)
+    group.add_argument("--metrics-file",
+                       help="""append a json line with metrics of the run
+(duration, rpc requests, rpc cache hits/misses/evictions, bytes downloaded,
+packages built/failed/installed, build seconds per package) to this file.""",
+                       type=str)
+    group.add_argument("--metrics-textfile",
+                       help="""write the metrics of the run to this file in
+the prometheus text format (e.g. for the node-exporter textfile collector).
+the file is replaced atomically on each run.""",
+                       type=str)
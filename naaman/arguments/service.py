@@ -0,0 +1,65 @@
+"""
+Service/resident options.
+
+Options for running naaman as a long-lived service and for talking to it
+"""
+
+SERVICE_OPTIONS = "Service options"
+SOCKET = "naaman.sock"
+RPC_ADDRESS = "127.0.0.1:8080"
+
+
+def options(parser):
+    """Get service options."""
+    group = parser.add_argument_group(SERVICE_OPTIONS)
+    group.add_argument("--daemon",
+                       help="""run naaman as a resident daemon. the daemon
+keeps the pacman handle, repository indexes, and AUR rpc results loaded and
+serves query/search requests (e.g. -Q, -Qg, -Qu, -Ss) from clients over a unix
+socket. indexes are reloaded when the pacman database changes.""",
+                       action="store_true")
+    group.add_argument("--prewarm",
+                       help="""refresh the rpc cache and git mirrors for all
+installed AUR packages (and their AUR dependencies) in bulk and exit without
+building anything. this is meant to be run from a timer so that interactive
+upgrades run from a fresh cache.""",
+                       action="store_true")
+    group.add_argument("--client",
+                       help="""forward this invocation to a running naaman
+daemon (--daemon) instead of loading the pacman databases locally. output
+from the daemon is streamed back to the terminal.""",
+                       action="store_true")
+    group.add_argument("--socket",
+                       help="""the unix socket used by --daemon and --client.
+defaults to {} in the naaman cache directory.""".format(SOCKET),
+                       type=str)
+    group.add_argument("--serve-rpc",
+                       help="""serve the AUR rpc (v5) info and search endpoints
+as a caching proxy on [host:]port (default {}). results are shared from the
+naaman rpc cache (--rpc-cache) and concurrent requests are coalesced into one
+upstream request. point other hosts at it with --aur-url.""".format(
+                           RPC_ADDRESS),
+                       metavar="ADDRESS",
+                       nargs="?",
+                       const=RPC_ADDRESS,
+                       type=str)
+    group.add_argument("--build-worker",
+                       help="""claim and build jobs queued (--build-spool)
+in a shared spool directory. jobs are claimed one at a time (several workers
+can share a spool) and the built packages and build logs are dropped back in
+the spool.""",
+                       metavar="SPOOL",
+                       type=str)
+    group.add_argument("--worker-idle",
+                       help="""stop a build worker after being idle for this
+many seconds. default is 0 (keep running)""",
+                       metavar="SECONDS",
+                       default=0,
+                       type=int)
+    group.add_argument("--worker-chroot",
+                       help="""build jobs with makechrootpkg in a clean copy
+of this (devtools, e.g. mkarchroot DIR/root base-devel) chroot, installing the
+packages a job requires there. without a chroot jobs requiring packages fail
+(nothing from the spool is installed on the worker host).""",
+                       metavar="DIR",
+                       type=str)
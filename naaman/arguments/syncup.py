@@ -26,6 +26,19 @@ check for updates every <hours> period.""")
                        help="""time betweeen vcs update checks (hours).
 specifying this option will result in vcs-based AUR packages to only be
 updated every <hour> threshold. default is 720 (30 days)""")
+    group.add_argument('--vcs-budget',
+                       type=int,
+                       default=0,
+                       help="""check at most this many vcs packages per run.
+each vcs package is checked once past the --vcs-ignore threshold (tracked per
+package), the stalest first, so checks are spread across runs. default is 0
+(no limit)""")
+    group.add_argument('--vcs-budget-time',
+                       type=int,
+                       default=0,
+                       help="""check vcs packages per run for at most this
+long (minutes, estimated from past builds), the stalest first. default is 0
+(no limit)""")
     group.add_argument('--no-vcs',
                        help="""perform all sync operations but
 skip updating any vcs packages. this will allow for performing various
@@ -73,6 +86,38 @@ default is 60 minutes.
 """,
                        type=int,
                        default=60)
+    group.add_argument("--rpc-limit",
+                       help="""the AUR rpc request budget per day (the AUR
+limits requests per address). requests are tracked in the cache directory,
+past half the budget lookups are batched and cached longer (--rpc-cache),
+and the last 10 percent is kept for installs/upgrades. 0 disables tracking.
+default is 4000.""",
+                       type=int,
+                       default=4000)
+    group.add_argument("--sources-size",
+                       help="""size cap (MB) of the managed makepkg sources
+(SRCDEST) kept per package base in the cache (or --builds) directory so
+rebuilds and vcs checks do not download sources again. least recently used
+sources are evicted over the cap and -Sc removes sources of packages that are
+no longer installed. 0 disables it. default is 2048.""",
+                       type=int,
+                       default=2048)
+    group.add_argument("--workspaces",
+                       help="""keep a build workspace per package base in the
+--builds (or cache) directory instead of building in a temporary directory.
+workspaces are updated in place to the new PKGBUILD revision and makepkg does
+not clean src/ so builds that support it rebuild incrementally.""",
+                       action="store_true")
+    group.add_argument("--workspace-age",
+                       help="""evict workspaces (--workspaces) not used for
+this many days. default is 30.""",
+                       type=int,
+                       default=30)
+    group.add_argument("--workspace-size",
+                       help="""size cap (MB) of all workspaces (--workspaces),
+least recently used workspaces are evicted over the cap. default is 20480.""",
+                       type=int,
+                       default=20480)
     group.add_argument("-i", "--info",
                        help="""display additional information about packages
 when searching for information in the AUR. this can only be used during a
@@ -99,18 +144,32 @@ AUR packages on the system""",
 package building without problem. though this relies on knowing a PKGBUILD is
 safe to use and install. utilize this option to tell naaman to fetch to a
 location and not manage the files/perform the build. the user can then verify
-the PKGBUILD and run makepkg manually.""")
+the PKGBUILD and run makepkg manually. the AUR dependencies of the targets are
+fetched too (make dependencies with --makedeps), package bases already fetched
+are updated (git pull) and a summary of the new commits is printed.""")
     group.add_argument('--fetch-dir',
                        help="""specifies the location to store fetched
 (--fetch) packages on the file system. whenever fetch is used this is the
-directory that naaman will write to (defaults to '.').""")
+directory that naaman will write to, one directory per package base (defaults
+to '.').""")
     group.add_argument('--rpc-field',
                        help="""when querying the AUR RPC endpoint, naaman will
 use a default search field to search for packages. by setting this argument
 naaman will be instructed to, instead, search using the specified field when
-querying the RPC endpoint during a search.""",
-                       default=aur.RPC_NAME_DESC,
-                       choices=aur.RPC_FIELDS)
+querying the RPC endpoint during a search. multiple fields can be given
+comma-separated (e.g. name,maintainer) to match a term in any of them.
+fields: {}""".format(", ".join(aur.RPC_FIELDS)),
+                       default=aur.RPC_NAME_DESC)
+    group.add_argument('--search-union',
+                       help="""when searching for multiple terms, show
+packages matching any of the terms instead of packages matching all of them.
+""",
+                       action="store_true")
+    group.add_argument('--aur-url',
+                       help="""the AUR url used for rpc requests and cloning
+packages. set this to use a mirror or a naaman rpc proxy (--serve-rpc) instead
+of the AUR (defaults to {}).""".format(aur.AUR_URL),
+                       type=str)
     group.add_argument("--do-not-track",
                        help="""specify package names (1 or more) that naaman
 is NOT responsible for tracking and should skip during processing. naaman will
@@ -122,3 +181,52 @@ not attempt to process these packages at any point.""",
                        help="""include the make dependencies as part of the
 dependency resolution when handling/resolving dependencies.""",
                        action="store_true")
+    group.add_argument("--repo-dir",
+                       help="""maintain a local pacman repository (naaman.db)
+in this directory. every package naaman builds is added to the repository so
+other hosts can use it as a normal [naaman] repository. targets whose exact
+version is already in the repository are installed from it instead of being
+built again.""",
+                       type=str)
+    group.add_argument("--resume",
+                       help="""resume an interrupted sync/upgrade. every
+sync/upgrade is journaled in the cache directory (planned packages, finished
+builds and installs), resuming skips the installed packages and installs the
+packages already built from the saved package files instead of building them
+again.""",
+                       action="store_true")
+    group.add_argument("--rebuild-needed",
+                       help="""rebuild only the installed AUR packages that
+need it, e.g. after a library soname bump. naaman indexes the shared libraries
+(sonames) the files of each AUR package link against and its dependencies
+(cached in the cache directory), then lists and rebuilds the packages needing
+a library that is no longer installed or a dependency no longer provided.""",
+                       action="store_true")
+    group.add_argument("--roots",
+                       help="""run a sync/upgrade or query for several
+system roots (pacman configs, e.g. of containers/chroots) in one run. the
+installed AUR packages of all roots are looked up in one batch and each root
+is reported/upgraded with its own config (pacman --config). packages are
+built once into a shared repository (--repo-dir, or the cache directory) and
+installed from it in every other root needing them. repeat for each root.""",
+                       metavar='CONFIG',
+                       type=str,
+                       action='append')
+    group.add_argument("--time-budget",
+                       help="""only sync/upgrade what fits in a time budget
+(e.g. 45m, 1h30m; minutes when no unit is given), e.g. for a maintenance
+window. builds are estimated from past build times (or package metadata),
+explicitly installed packages come first and then the longest waiting
+updates, packages are only selected with the packages they require and the
+rest are reported and deferred to a later run.""",
+                       metavar='DURATION',
+                       type=str)
+    group.add_argument("--build-spool",
+                       help="""build on 'naaman --build-worker' processes
+(e.g. on other hosts) instead of locally. build jobs (package base, AUR
+commit, makepkg arguments) are queued in this shared directory (e.g. NFS),
+the packages (and build logs) are dropped back there by the workers. builds
+not waiting on other builds are queued together, the longest (estimated)
+chain of builds first, so workers build in parallel.""",
+                       metavar='DIR',
+                       type=str)
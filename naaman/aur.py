@@ -6,14 +6,28 @@ e.g.
 2. AUR package resolution
 3. (poor) dependency management
 """
+import concurrent.futures
+import urllib.error
 import urllib.parse
 import urllib.request
 import string
+import sys
 import json
+import io
 import os
+import time
 import naaman.consts as cst
 import naaman.logger as log
 import naaman.shell as sh
+import naaman.timing as timing
+import naaman.metrics as metrics
+import naaman.ratelimit as ratelimit
+import naaman.executor as executor
+import naaman.history as history
+import naaman.journal as journal
+import naaman.repo as repo
+import naaman.sources as sources
+import naaman.workspaces as workspaces
 from datetime import datetime
 
 _PRINTABLE = set(string.printable)
@@ -22,25 +36,57 @@ RPC_NAME_DESC = "name-desc"
 RPC_NAME = "name"
 RPC_MAINTAINER = "maintainer"
 RPC_FIELDS = [RPC_NAME_DESC, RPC_NAME, RPC_MAINTAINER]
-_AUR = "https://aur.archlinux.org{}"
-_AUR_GIT = _AUR.format("/{}.git")
+AUR_URL = "https://aur.archlinux.org"
+_AUR_GIT = "/{}.git"
 _RESULT_JSON = 'results'
 _AUR_NAME = "Name"
 _AUR_DESC = "Description"
-_AUR_RAW_URL = _AUR.format("/rpc?v=5&type={}&arg{}")
+_AUR_RAW_URL = "/rpc?v=5&type={}&arg{}"
 _AUR_INFO = _AUR_RAW_URL.format("info", "[]={}")
 _AUR_SEARCH = _AUR_RAW_URL.format("search&by={}", "{}")
 _AUR_VERS = "Version"
 _AUR_URLP = "URLPath"
 _AUR_DEPS = "Depends"
-_AUR_BASE = "PackageBase"
+AUR_BASE = "PackageBase"
 _AUR_MAKEDEPS = "MakeDepends"
+_AUR_INFO_ARG = "&arg[]="
+INFO_BATCH = 100
 _MAKEPKG_VCS = ["-od"]
+_aur = AUR_URL
+_CACHE_MISS = "miss"
+_CACHE_FILE = "file"
+_CACHE_MEMORY = "memory"
+_TOO_MANY = 429
+_SEARCH_WORKERS = 8
+_FETCH_WORKERS = 8
+FETCH_CLONED = "cloned"
+FETCH_UPDATED = "updated"
+FETCH_UNCHANGED = "unchanged"
+FETCH_FAILED = "failed"
+_RETRIES = 2
+
+
+def set_url(url):
+    """Set the AUR (base) url for rpc and git requests."""
+    global _aur
+    _aur = url.rstrip("/")
+
+
+def base_url():
+    """Get the AUR (base) url."""
+    return _aur
+
+
+def _url(path):
+    """Get a full AUR url."""
+    return _aur + path
 
 
 class DepTree(object):
     """Tracks the dependency tree."""
 
+    __slots__ = ["name", "_children"]
+
     def __init__(self, name):
         """Init the tree."""
         self.name = name
@@ -62,16 +108,59 @@ class DepTree(object):
         visited[self.name] = depth
 
 
+def _names(values):
+    """Get a tuple of (interned) names."""
+    if not values:
+        return ()
+    return tuple([sys.intern(x) for x in values])
+
+
 class AURPackage(object):
-    """AUR package object."""
+    """AUR package record (built once per rpc result)."""
+
+    __slots__ = ["name",
+                 "version",
+                 "url",
+                 "deps",
+                 "base",
+                 "description",
+                 "upstream",
+                 "maintainer",
+                 "depends",
+                 "makedepends",
+                 "checkdepends",
+                 "optdepends",
+                 "provides",
+                 "conflicts",
+                 "replaces",
+                 "last_modified",
+                 "out_of_date",
+                 "votes",
+                 "popularity"]
 
     def __init__(self, name, version, url, deps, basepkg):
         """Init the instance."""
-        self.name = name
+        self.name = sys.intern(name)
         self.version = version
         self.url = url
-        self.deps = deps
-        self.base = basepkg
+        self.deps = None
+        if deps is not None:
+            self.deps = _names(deps)
+        self.base = sys.intern(basepkg)
+        self.description = None
+        self.upstream = None
+        self.maintainer = None
+        self.depends = ()
+        self.makedepends = ()
+        self.checkdepends = ()
+        self.optdepends = ()
+        self.provides = ()
+        self.conflicts = ()
+        self.replaces = ()
+        self.last_modified = None
+        self.out_of_date = None
+        self.votes = 0
+        self.popularity = 0
 
 
 def _get_segment(j, key):
@@ -85,6 +174,32 @@ def _get_segment(j, key):
     return res
 
 
+def rpc_package(result, deps=None):
+    """Create a package record from an rpc result."""
+    pkg = AURPackage(_get_segment(result, _AUR_NAME),
+                     _get_segment(result, _AUR_VERS),
+                     result.get(_AUR_URLP, None),
+                     deps,
+                     result[AUR_BASE])
+    pkg.description = result.get(_AUR_DESC, None)
+    pkg.upstream = result.get("URL", None)
+    maintainer = result.get("Maintainer", None)
+    if maintainer:
+        pkg.maintainer = sys.intern(maintainer)
+    pkg.depends = _names(result.get(_AUR_DEPS, None))
+    pkg.makedepends = _names(result.get(_AUR_MAKEDEPS, None))
+    pkg.checkdepends = _names(result.get("CheckDepends", None))
+    pkg.optdepends = _names(result.get("OptDepends", None))
+    pkg.provides = _names(result.get("Provides", None))
+    pkg.conflicts = _names(result.get("Conflicts", None))
+    pkg.replaces = _names(result.get("Replaces", None))
+    pkg.last_modified = result.get("LastModified", None)
+    pkg.out_of_date = result.get("OutOfDate", None)
+    pkg.votes = result.get("NumVotes", 0)
+    pkg.popularity = result.get("Popularity", 0)
+    return pkg
+
+
 def is_vcs(name):
     """Check if vcs package."""
     for t in ['-git',
@@ -102,6 +217,8 @@ def is_vcs(name):
 class Deps(object):
     """Dependency object."""
 
+    __slots__ = ["version", "op", "pkg"]
+
     def __init__(self, vers, op, package):
         """Init a new dependency object."""
         self.version = vers
@@ -123,6 +240,118 @@ def deps_compare(package):
     return Deps(d_version, d_compare, package)
 
 
+def provided(packages):
+    """Get the provided names (and versions) of packages."""
+    result = {}
+    for pkg in packages:
+        provides = [(pkg.name, pkg.version)]
+        for p in pkg.provides:
+            d = deps_compare(p)
+            provides.append((d.pkg, d.version))
+        for name, version in provides:
+            if name not in result:
+                result[name] = set()
+            result[name].add(version)
+    return result
+
+
+def satisfied(provided, depends):
+    """Check if a dependency is provided."""
+    d = deps_compare(depends)
+    for v in provided.get(d.pkg, ()):
+        if version_matches(v, d.op, d.version):
+            return True
+    return False
+
+
+def _rpmvercmp(a, b):
+    """Compare version strings (as rpm/alpm do)."""
+    if a == b:
+        return 0
+    i = 0
+    j = 0
+    while i < len(a) and j < len(b):
+        sep_a = i
+        sep_b = j
+        while i < len(a) and not a[i].isalnum():
+            i += 1
+        while j < len(b) and not b[j].isalnum():
+            j += 1
+        if i == len(a) or j == len(b):
+            break
+        if i - sep_a != j - sep_b:
+            return -1 if i - sep_a < j - sep_b else 1
+        seg_a = i
+        seg_b = j
+        is_num = a[i].isdigit()
+        while i < len(a) and a[i].isalnum() and a[i].isdigit() == is_num:
+            i += 1
+        while j < len(b) and b[j].isalnum() and b[j].isdigit() == is_num:
+            j += 1
+        one = a[seg_a:i]
+        two = b[seg_b:j]
+        if two == "":
+            return 1 if is_num else -1
+        if is_num:
+            one = one.lstrip("0")
+            two = two.lstrip("0")
+            if len(one) != len(two):
+                return -1 if len(one) < len(two) else 1
+        if one != two:
+            return -1 if one < two else 1
+    if i >= len(a) and j >= len(b):
+        return 0
+    if (i >= len(a) and not b[j].isalpha()) or \
+            (i < len(a) and a[i].isalpha()):
+        return -1
+    return 1
+
+
+def _evr(version):
+    """Split a version into epoch, version and release."""
+    epoch = "0"
+    if ":" in version:
+        epoch, version = version.split(":", 1)
+        if not epoch.isdigit():
+            epoch = "0"
+    release = None
+    if "-" in version:
+        version, release = version.rsplit("-", 1)
+    return epoch, version, release
+
+
+def vercmp(a, b):
+    """Compare package versions (as pacman's vercmp: -1, 0 or 1)."""
+    if a == b:
+        return 0
+    epoch_a, version_a, release_a = _evr(a)
+    epoch_b, version_b, release_b = _evr(b)
+    result = _rpmvercmp(epoch_a, epoch_b)
+    if result == 0:
+        result = _rpmvercmp(version_a, version_b)
+    if result == 0 and release_a is not None and release_b is not None:
+        result = _rpmvercmp(release_a, release_b)
+    return result
+
+
+def version_matches(version, op, wanted):
+    """Check if a version matches a dependency comparison (op, version)."""
+    if op is None:
+        return True
+    if version is None:
+        return False
+    result = vercmp(version, wanted)
+    if op == "=":
+        return result == 0
+    if op == ">=":
+        return result >= 0
+    if op == "<=":
+        return result <= 0
+    if op == ">":
+        return result > 0
+    return result < 0
+
+
 def get_deps(pkgs):
     """Get dependencies."""
     return _get_deps(pkgs, None)
@@ -146,16 +375,21 @@ def _get_deps(pkgs, name):
     return deps
 
 
-def _rpc_caching(package_name, context):
-    """Cache RPC area/check."""
-    now = context.now
+def rpc_cache_file(package_name, context):
+    """Get the RPC cache file for a package."""
     use_file_name = "rpc-"
     for char in package_name:
         c = char
         if not c.isalnum() and c not in ['-']:
             c = "_"
         use_file_name += c
-    cache_file = context.cache_file(use_file_name)
+    return context.cache_file(use_file_name)
+
+
+def _rpc_caching(package_name, context):
+    """Cache RPC area/check."""
+    now = context.now
+    cache_file = rpc_cache_file(package_name, context)
     log.debug(cache_file)
     cache = False
     return_factory = None
@@ -170,6 +404,7 @@ def _rpc_caching(package_name, context):
         if minutes > context.rpc_cache:
             os.remove(cache_file)
             log.debug("over rpc cache threshold")
+            metrics.count(metrics.RPC_CACHE_EVICTIONS)
             cache = True
         else:
             def _open(url):
@@ -183,30 +418,174 @@ def _rpc_caching(package_name, context):
     return return_cache, return_factory
 
 
+def _memory_caching(url, context):
+    """Resident (in-memory) RPC cache check."""
+    cached = context.rpc_memory.get(url)
+    if cached is None:
+        return None
+    stamp, result = cached
+    minutes = (context.timestamp - stamp) / 60
+    log.trace(minutes)
+    if minutes > context.rpc_cache:
+        log.debug("over memory cache threshold")
+        del context.rpc_memory[url]
+        metrics.count(metrics.RPC_CACHE_EVICTIONS)
+        return None
+
+    def _open(url):
+        log.debug("opening memory cache")
+        return io.BytesIO(result)
+    return _open
+
+
+def _rpc_read(url, factory, cache=_CACHE_MISS):
+    """Read an RPC response."""
+    attempt = 0
+    while True:
+        if cache == _CACHE_MISS:
+            ratelimit.acquire()
+        try:
+            with timing.phase("rpc", args={"url": url, "cache": cache}):
+                with factory(url) as req:
+                    result = req.read()
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != _TOO_MANY or attempt >= _RETRIES:
+                raise
+            attempt += 1
+            seconds = ratelimit.blocked(e.headers.get("Retry-After"))
+            log.console_error("AUR rate limited (retry after {}s)".format(
+                seconds))
+    if cache == _CACHE_MISS:
+        metrics.count(metrics.RPC_REQUESTS)
+        metrics.count(metrics.BYTES_DOWNLOADED, len(result))
+    return result
+
+
+def _print_result(result, name, desc, vers, context):
+    """Print a search result."""
+    ind = ""
+    if not name or not desc or not vers:
+        log.debug("unable to read this package")
+        log.trace(result)
+    if context.quiet:
+        log.info(name)
+        return
+    if context.info:
+        keys = [k for k in result.keys()]
+        for k in keys:
+            fmt = None
+            val = result[k]
+            if val and k in ["FirstSubmitted",
+                             "LastModified"]:
+                fmt = "time"
+            log.info(context.alpm.format(k,
+                                         val,
+                                         format=fmt))
+        log.info("")
+        return
+    if context.db.get_pkg(name) is not None:
+        ind = " [installed]"
+    if is_vcs(name):
+        ind += " [vcs]"
+    log.info("aur/{} {}{}".format(name, vers, ind))
+    if not desc or len(desc) == 0:
+        desc = "no description"
+    txt = context.alpm.format_line(desc)
+    log.info(txt)
+
+
+def _search_term(term, fields):
+    """Get the results (by name) matching a term in any of the fields."""
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(len(fields)) as pool:
+        for found in pool.map(lambda f: rpc_search_results(f, term), fields):
+            for result in found:
+                results[result[_AUR_NAME]] = result
+    return results
+
+
+def rpc_search_many(terms, fields, union, context):
+    """Search for several terms (by several fields), print the results."""
+    for field in fields:
+        if field not in RPC_FIELDS:
+            log.console_error("unknown rpc field {}".format(field))
+            context.exiting(1)
+    workers = min(len(terms), _SEARCH_WORKERS)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            per_term = list(pool.map(lambda t: _search_term(t, fields),
+                                     terms))
+    except Exception as e:
+        log.error("error calling AUR search")
+        log.error(e)
+        return False
+    names = set(per_term[0].keys())
+    results = {}
+    for found in per_term:
+        results.update(found)
+        if union:
+            names |= set(found.keys())
+        else:
+            names &= set(found.keys())
+    log.debug("{} results".format(len(names)))
+    matched = False
+    for name in sorted(names):
+        result = results[name]
+        if context.check_repos(name):
+            log.debug("in repos")
+            continue
+        try:
+            _print_result(result,
+                          _get_segment(result, _AUR_NAME),
+                          _get_segment(result, _AUR_DESC),
+                          _get_segment(result, _AUR_VERS),
+                          context)
+            matched = True
+        except Exception as e:
+            log.error("unable to parse package")
+            log.error(e)
+            log.trace(result)
+    return matched
+
+
 def rpc_search(package_name, exact, context, include_deps):
     """Search for a package in the aur."""
     if exact and context.check_repos(package_name):
         log.debug("in repos")
         return None
     if exact or context.info_verbose:
-        url = _AUR_INFO
+        url = info_url([package_name])
     else:
         if context.rpc_field not in RPC_FIELDS:
             log.console_error("unknown rpc field {}".format(context.rpc_field))
             context.exiting(1)
-        url = _AUR_SEARCH.format(context.rpc_field, "={}")
-    url = url.format(urllib.parse.quote(package_name))
+        url = search_url(context.rpc_field, package_name)
     log.debug(url)
     factory = None
     caching = None
     found = False
-    if exact and context.rpc_cache > 0 and not context.force_refresh:
+    remember = False
+    cache_state = _CACHE_MISS
+    if context.rpc_memory is not None and \
+       context.rpc_cache > 0 and \
+       not context.force_refresh:
+        factory = _memory_caching(url, context)
+        remember = factory is None
+        if not remember:
+            cache_state = _CACHE_MEMORY
+    if factory is None and \
+       exact and \
+       context.rpc_cache > 0 and \
+       not context.force_refresh:
         log.debug("rpc cache enabled")
         context.lock()
         try:
             c, f = _rpc_caching(package_name, context)
             factory = f
             caching = c
+            if factory is not None:
+                cache_state = _CACHE_FILE
             log.trace((c, f))
         except Exception as e:
             log.error("unexpected rpc cache error")
@@ -215,93 +594,65 @@ def rpc_search(package_name, exact, context, include_deps):
     if factory is None:
         factory = urllib.request.urlopen
     try:
-        with factory(url) as req:
-            result = req.read()
-            if caching:
-                log.debug('writing cache')
-                with open(caching, 'wb') as f:
-                    f.write(result)
-            j = json.loads(result.decode("utf-8"))
-            if "error" in j:
-                log.console_error(j['error'])
-            result_json = []
-            if _RESULT_JSON in j:
-                result_json = j[_RESULT_JSON]
-            if len(result_json) > 0:
-                for result in result_json:
-                    try:
-                        name = _get_segment(result, _AUR_NAME)
-                        desc = _get_segment(result, _AUR_DESC)
-                        vers = _get_segment(result, _AUR_VERS)
-                        found = True
-                        if name and context.check_repos(name):
-                            log.debug("package in a repository db")
-                            # This is in the repos, abort displaying
-                            # you can't 'install' this anyway
-                            # ...using naaman
-                            log.debug("in repos")
-                            continue
-                        if exact:
-                            if name == package_name:
-                                deps = None
-                                if context.deps or include_deps:
-                                    raw_deps = []
-                                    if _AUR_DEPS in result:
-                                        raw_deps += result[_AUR_DEPS]
-                                    if context.makedeps:
-                                        if _AUR_MAKEDEPS in result:
-                                            raw_deps += result[_AUR_MAKEDEPS]
-                                    if len(raw_deps) > 0:
-                                        _aur_deps = raw_deps
-                                        if context.deps:
-                                            _handle_deps(package_name,
-                                                         context,
-                                                         _aur_deps)
-                                        if include_deps:
-                                            deps = _aur_deps
-                                else:
-                                    log.debug("no dependency checks")
-                                return AURPackage(name,
-                                                  vers,
-                                                  result[_AUR_URLP],
-                                                  deps,
-                                                  result[_AUR_BASE])
-                        else:
-                            ind = ""
-                            if not name or not desc or not vers:
-                                log.debug("unable to read this package")
-                                log.trace(result)
-                            if context.quiet:
-                                log.info(name)
-                                continue
-                            if context.info:
-                                keys = [k for k in result.keys()]
-                                max_key = max([len(k) for k in keys]) + 3
-                                for k in keys:
-                                    fmt = None
-                                    val = result[k]
-                                    if val and k in ["FirstSubmitted",
-                                                     "LastModified"]:
-                                        fmt = "time"
-                                    log.info(context.alpm.format(k,
-                                                                 val,
-                                                                 format=fmt))
-                                log.info("")
-                                continue
-                            if context.db.get_pkg(name) is not None:
-                                ind = " [installed]"
-                            if is_vcs(name):
-                                ind += " [vcs]"
-                            log.info("aur/{} {}{}".format(name, vers, ind))
-                            if not desc or len(desc) == 0:
-                                desc = "no description"
-                            txt = context.alpm.format_line(desc)
-                            log.info(txt)
-                    except Exception as e:
-                        log.error("unable to parse package")
-                        log.error(e)
-                        log.trace(result)
-                        break
+        if cache_state == _CACHE_MISS:
+            metrics.count(metrics.RPC_CACHE_MISSES)
+        else:
+            metrics.count(metrics.RPC_CACHE_HITS)
+        result = _rpc_read(url, factory, cache=cache_state)
+        if caching:
+            log.debug('writing cache')
+            with open(caching, 'wb') as f:
+                f.write(result)
+        if remember:
+            context.rpc_memory[url] = (context.timestamp, result)
+        j = json.loads(result.decode("utf-8"))
+        if "error" in j:
+            log.console_error(j['error'])
+        result_json = []
+        if _RESULT_JSON in j:
+            result_json = j[_RESULT_JSON]
+        if len(result_json) > 0:
+            for result in result_json:
+                try:
+                    name = _get_segment(result, _AUR_NAME)
+                    desc = _get_segment(result, _AUR_DESC)
+                    vers = _get_segment(result, _AUR_VERS)
+                    found = True
+                    if name and context.check_repos(name):
+                        log.debug("package in a repository db")
+                        # This is in the repos, abort displaying
+                        # you can't 'install' this anyway
+                        # ...using naaman
+                        log.debug("in repos")
+                        continue
+                    if exact:
+                        if name == package_name:
+                            deps = None
+                            if context.deps or include_deps:
+                                raw_deps = []
+                                if _AUR_DEPS in result:
+                                    raw_deps += result[_AUR_DEPS]
+                                if context.makedeps:
+                                    if _AUR_MAKEDEPS in result:
+                                        raw_deps += result[_AUR_MAKEDEPS]
+                                if len(raw_deps) > 0:
+                                    _aur_deps = raw_deps
+                                    if context.deps:
+                                        _handle_deps(package_name,
+                                                     context,
+                                                     _aur_deps)
+                                    if include_deps:
+                                        deps = _aur_deps
+                            else:
+                                log.debug("no dependency checks")
+                            return rpc_package(result, deps=deps)
+                    else:
+                        _print_result(result, name, desc, vers, context)
+                except Exception as e:
+                    log.error("unable to parse package")
+                    log.error(e)
+                    log.trace(result)
+                    break
     except Exception as e:
         log.error("error calling AUR search")
         log.error(e)
@@ -309,6 +660,162 @@ def rpc_search(package_name, exact, context, include_deps):
         log.console_error("no exact matches for {}".format(package_name))
 
 
+def cache_info(package_name, result, context):
+    """Write an info result as if it was requested on its own."""
+    results = []
+    if result is not None:
+        results.append(result)
+    obj = {}
+    obj["version"] = 5
+    obj["type"] = "multiinfo"
+    obj["resultcount"] = len(results)
+    obj[_RESULT_JSON] = results
+    with open(rpc_cache_file(package_name, context), 'w') as f:
+        f.write(json.dumps(obj))
+
+
+def info_url(package_names):
+    """Get the rpc (multi) info url for packages."""
+    return _url(_AUR_INFO.format(_AUR_INFO_ARG.join(
+        [urllib.parse.quote(x) for x in package_names])))
+
+
+def search_url(field, term):
+    """Get the rpc search url for a term (by field)."""
+    return _url(_AUR_SEARCH.format(field, "={}").format(
+        urllib.parse.quote(term)))
+
+
+def rpc_info(package_names):
+    """Get rpc info results for packages (name -> result)."""
+    url = info_url(package_names)
+    log.debug(url)
+    found = {}
+    result = _rpc_read(url, urllib.request.urlopen)
+    j = json.loads(result.decode("utf-8"))
+    if "error" in j:
+        log.console_error(j['error'])
+    for result in j.get(_RESULT_JSON, []):
+        found[result[_AUR_NAME]] = result
+    return found
+
+
+def rpc_search_results(field, term):
+    """Get rpc search results for a term (by field)."""
+    url = search_url(field, term)
+    log.debug(url)
+    result = _rpc_read(url, urllib.request.urlopen)
+    j = json.loads(result.decode("utf-8"))
+    if "error" in j:
+        raise Exception(j['error'])
+    return j.get(_RESULT_JSON, [])
+
+
+def rpc_prefetch(package_names, context):
+    """Batch info lookups (not cached yet) into the rpc cache."""
+    if context.rpc_cache <= 0 or context.force_refresh:
+        return
+    pending = []
+    for name in package_names:
+        if name in pending or context.check_repos(name):
+            continue
+        cache_file = rpc_cache_file(name, context)
+        if os.path.exists(cache_file):
+            minutes = (context.timestamp - os.path.getmtime(cache_file)) / 60
+            if minutes <= context.rpc_cache:
+                continue
+        pending.append(name)
+    log.debug("prefetching {} packages".format(len(pending)))
+    for idx in range(0, len(pending), INFO_BATCH):
+        batch = pending[idx:idx + INFO_BATCH]
+        try:
+            found = rpc_info(batch)
+        except Exception as e:
+            log.error("error calling AUR info")
+            log.error(e)
+            return
+        for name in batch:
+            cache_info(name, found.get(name, None), context)
+
+
+def rpc_prewarm(package_names, context):
+    """Bulk refresh the rpc cache for packages and their AUR deps."""
+    results = {}
+    pending = []
+    for name in package_names:
+        if name in pending or context.check_repos(name):
+            continue
+        pending.append(name)
+    while len(pending) > 0:
+        batch = pending[0:INFO_BATCH]
+        pending = pending[INFO_BATCH:]
+        try:
+            found = rpc_info(batch)
+        except Exception as e:
+            log.error("error calling AUR info")
+            log.error(e)
+            continue
+        for name in batch:
+            result = found.get(name, None)
+            results[name] = result
+            cache_info(name, result, context)
+            if result is None:
+                continue
+            raw_deps = result.get(_AUR_DEPS, [])
+            if context.makedeps:
+                raw_deps = raw_deps + result.get(_AUR_MAKEDEPS, [])
+            for dep in raw_deps:
+                d = deps_compare(dep).pkg
+                if d in results or d in batch or d in pending:
+                    continue
+                if context.check_repos(d):
+                    continue
+                pending.append(d)
+    return [x for x in results.values() if x is not None]
+
+
+def fetch(base, fetch_dir):
+    """Clone (or pull) a package base into the fetch directory."""
+    path = os.path.join(fetch_dir, base)
+    if os.path.isdir(os.path.join(path, ".git")):
+        old = sh.head(path)
+        if not sh.command(["git", "pull", "-q", "--ff-only"], workdir=path):
+            return (FETCH_FAILED, None)
+        new = sh.head(path)
+        if old == new:
+            return (FETCH_UNCHANGED, None)
+        return (FETCH_UPDATED, sh.changes(path, old, new))
+    if os.path.exists(path):
+        log.console_error("{} exists and is not a git clone".format(path))
+        return (FETCH_FAILED, None)
+    if not sh.command(["git", "clone", "-q", _url(_AUR_GIT.format(base)),
+                       path]):
+        return (FETCH_FAILED, None)
+    return (FETCH_CLONED, None)
+
+
+def fetch_all(bases, fetch_dir):
+    """Clone/pull package bases concurrently (base -> (status, changes))."""
+    results = {}
+    if len(bases) == 0:
+        return results
+    workers = min(_FETCH_WORKERS, len(bases))
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        fetched = pool.map(lambda b: fetch(b, fetch_dir), bases)
+        for base, result in zip(bases, fetched):
+            results[base] = result
+    return results
+
+
+def mirror(base, context):
+    """Create or update the local git mirror of a package base."""
+    mirror_dir = context.get_cache_mirrors()
+    if not os.path.exists(mirror_dir):
+        os.makedirs(mirror_dir)
+    return sh.mirror(_url(_AUR_GIT.format(base)),
+                     os.path.join(mirror_dir, base + ".git"))
+
+
 def _handle_deps(root_package, context, dependencies):
     """Handle dependencies resolution."""
     log.debug("resolving deps")
@@ -359,33 +866,52 @@ def check_vcs(package, context, version):
     return result
 
 
-def install(file_definition, makepkg, cache_dirs, context, version):
-    """Install a package."""
+@timing.timed("install")
+def install(file_definition,
+            makepkg,
+            cache_dirs,
+            context,
+            version,
+            outputs=None):
+    """Install a package (or several outputs of its package base)."""
     can_sudo = context.can_sudo
     new_file = context.build_dir
-    url = _AUR.format(file_definition.url)
     action = "installing"
     is_installing = version is None
     if not is_installing:
         action = "checking version"
-    log.console_output("{}: {}".format(action, file_definition.name))
+    glob = [file_definition.name]
+    if outputs:
+        glob = outputs
+    log.console_output("{}: {}".format(action, ", ".join(glob)))
     with new_file() as t:
-        if context.fetching:
-            clone_to = file_definition.name
-            p = context.fetch_dir
-        else:
-            clone_to = "."
-            p = os.path.join(t, file_definition.name)
-            os.makedirs(p)
-        f_dir = os.path.join(t, file_definition.name)
-        pkg = sh.InstallPkg(can_sudo, f_dir)
-        if not pkg.git(_AUR_GIT.format(file_definition.base), clone_to, p):
+        clone_to = "."
+        p = os.path.join(t, file_definition.name)
+        os.makedirs(p)
+        f_dir = p
+        workspace = None
+        if context.workspaces:
+            workspace = workspaces.get(context, file_definition.base)
+            p = workspace
+            f_dir = workspace
+        pkg = sh.InstallPkg(can_sudo, f_dir, config=context.root_config)
+        fetched = time.time()
+        source = _url(_AUR_GIT.format(file_definition.base))
+        mirrored = os.path.join(context.get_cache_mirrors(),
+                                file_definition.base + ".git")
+        if os.path.exists(mirrored):
+            log.debug("using mirror {}".format(mirrored))
+            if mirror(file_definition.base, context):
+                source = mirrored
+        if workspace and os.path.exists(os.path.join(workspace, ".git")):
+            log.debug("updating workspace {}".format(workspace))
+            if not pkg.update(source):
+                return False
+            pkg.clear()
+        elif not pkg.git(source, clone_to, p):
             return False
-        if context.fetching:
-            log.console_output("{} was fetched".format(file_definition.name))
-            return True
-        glob = file_definition.name
-        if is_installing:
+        fetched = time.time() - fetched
+        if is_installing and len(glob) == 1:
             log.debug("installing")
             is_split = pkg.is_split()
             if is_split:
@@ -396,8 +922,48 @@ def install(file_definition, makepkg, cache_dirs, context, version):
                               True) is None:
                     glob = None
                 log.debug(glob)
-        if not pkg.makepkg(makepkg):
+        src = None
+        if context.sources_size > 0:
+            src = sources.srcdest(context,
+                                  file_definition.base,
+                                  outputs or [file_definition.name])
+        started = time.time()
+        if is_installing:
+            job = build_job(file_definition,
+                            makepkg,
+                            context,
+                            commit=sh.head(f_dir))
+            seconds = context.executor.build(pkg, f_dir, job, srcdest=src)
+            built = seconds is not None
+            if not built:
+                seconds = time.time() - started
+        else:
+            if workspace:
+                makepkg = workspaces.makepkg_args(makepkg)
+            built = pkg.makepkg(makepkg, srcdest=src)
+        if src is not None:
+            sources.update(context, file_definition.base)
+        if workspace:
+            workspaces.evict(context, file_definition.base)
+        if is_installing:
+            metrics.build(file_definition.name, seconds)
+            if built:
+                metrics.count(metrics.PACKAGES_BUILT)
+                history.record(context,
+                               file_definition.base,
+                               file_definition.version,
+                               seconds,
+                               fetched)
+        if not built:
             return False
+        if is_installing:
+            journal.built(file_definition.base,
+                          file_definition.version,
+                          pkg.artifacts())
+        if is_installing and context.repo_dir:
+            if not repo.add(context.repo_dir, pkg.artifacts()):
+                log.console_error("unable to add {} to the repository".format(
+                    file_definition.name))
         if is_installing:
             if not pkg.install(glob):
                 return False
@@ -406,3 +972,13 @@ def install(file_definition, makepkg, cache_dirs, context, version):
             return True
         else:
             return pkg.version(version)
+
+
+def build_job(package, makepkg, context, commit=None):
+    """Create the build job of a package base (at the AUR revision)."""
+    source = _url(_AUR_GIT.format(package.base))
+    if commit is None:
+        commit = sh.remote_head(source)
+    if context.workspaces:
+        makepkg = workspaces.makepkg_args(makepkg)
+    return executor.job(package.base, source, commit, makepkg)
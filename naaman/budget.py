@@ -0,0 +1,160 @@
+"""
+Time-budgeted syncs.
+
+Fits planned builds into a time budget (e.g. a maintenance window). Each
+package base is costed from its build history (without history: the
+average of the known estimates or, with none known, its metadata).
+Explicitly installed packages come first and then the packages waiting
+longest on their update (AUR last modified), a package is only selected
+along with the planned packages it requires and the rest are deferred.
+
+The same costs order parallel builds: the package base starting the
+longest (estimated) chain of builds depending on it goes first.
+"""
+import naaman.aur as aur
+
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+_DEFAULT = 300
+_PER_DEP = 60
+
+
+def seconds(value):
+    """Get the seconds of a duration (e.g. 45m, 1h30m, 90s or minutes)."""
+    value = value.strip().lower()
+    total = 0
+    if value.isdigit():
+        total = int(value) * _UNITS["m"]
+    else:
+        number = ""
+        for c in value:
+            if c.isdigit():
+                number += c
+                continue
+            if c not in _UNITS or number == "":
+                raise ValueError("invalid duration: {}".format(value))
+            total += int(number) * _UNITS[c]
+            number = ""
+        if number != "":
+            raise ValueError("invalid duration: {}".format(value))
+    if total <= 0:
+        raise ValueError("invalid duration: {}".format(value))
+    return total
+
+
+def costs(packages, estimates):
+    """Get the estimated build seconds of each package base."""
+    known = [x for x in estimates.values() if x is not None]
+    result = {}
+    for pkg in packages:
+        if pkg.base in result:
+            continue
+        cost = estimates.get(pkg.base, None)
+        if cost is None:
+            if len(known) > 0:
+                cost = sum(known) / len(known)
+            else:
+                deps = len(pkg.makedepends) + len(pkg.checkdepends)
+                cost = _DEFAULT + _PER_DEP * deps
+        result[pkg.base] = cost
+    return result
+
+
+def _priority(explicit):
+    """Get the priority (sort key) of a package."""
+    def _key(pkg):
+        stale = pkg.last_modified
+        if stale is None:
+            stale = float("inf")
+        return (pkg.name not in explicit, stale, pkg.name)
+    return _key
+
+
+def select(packages, base_costs, budget, explicit):
+    """Select the packages fitting the budget (selected, deferred)."""
+    by_name = {}
+    for pkg in packages:
+        for name in [pkg.name] + [aur.deps_compare(x).pkg
+                                  for x in pkg.provides]:
+            by_name[name] = pkg
+
+    def _closure(pkg, found):
+        if pkg.name in found:
+            return
+        found[pkg.name] = pkg
+        for d in pkg.depends + pkg.makedepends + pkg.checkdepends:
+            dep = by_name.get(aur.deps_compare(d).pkg, None)
+            if dep is not None:
+                _closure(dep, found)
+    selected = set()
+    bases = set()
+    spent = 0
+    for pkg in sorted(packages, key=_priority(explicit)):
+        if pkg.name in selected:
+            continue
+        needed = {}
+        _closure(pkg, needed)
+        new_bases = set([x.base for x in needed.values()]) - bases
+        cost = sum([base_costs[x] for x in new_bases])
+        if spent + cost > budget:
+            continue
+        spent += cost
+        bases |= new_bases
+        selected |= set(needed.keys())
+    return ([x for x in packages if x.name in selected],
+            [x for x in packages if x.name not in selected])
+
+
+def requires(builds):
+    """Get the planned package bases each package base (build) requires."""
+    base_of = {}
+    for group in builds:
+        for pkg in group:
+            for name in [pkg.name] + [aur.deps_compare(x).pkg
+                                      for x in pkg.provides]:
+                base_of[name] = pkg.base
+    result = {}
+    for group in builds:
+        base = group[0].base
+        result[base] = set()
+        for pkg in group:
+            for d in pkg.depends + pkg.makedepends + pkg.checkdepends:
+                other = base_of.get(aur.deps_compare(d).pkg, None)
+                if other is not None and other != base:
+                    result[base].add(other)
+    return result
+
+
+def critical_path(builds, base_costs):
+    """Order builds by their critical path (ordered builds, path lengths)."""
+    needs = requires(builds)
+    dependents = {}
+    for base, required in needs.items():
+        for other in required:
+            if other not in dependents:
+                dependents[other] = []
+            dependents[other].append(base)
+    lengths = {}
+
+    def _length(base):
+        if base in lengths:
+            return lengths[base]
+        lengths[base] = base_costs[base]
+        longest = 0
+        for other in dependents.get(base, []):
+            longest = max(longest, _length(other))
+        lengths[base] = base_costs[base] + longest
+        return lengths[base]
+    for base in needs:
+        _length(base)
+    ordered = []
+    placed = set()
+    remaining = list(builds)
+    while len(remaining) > 0:
+        ready = [x for x in remaining if needs[x[0].base] <= placed]
+        if len(ready) == 0:
+            ready = remaining
+        group = max(ready, key=lambda x: lengths[x[0].base])
+        ordered.append(group)
+        placed.add(group[0].base)
+        remaining.remove(group)
+    return ordered, lengths
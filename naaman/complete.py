@@ -0,0 +1,119 @@
+"""
+AUR package name completion.
+
+Keeps a sorted list of AUR package names (one per line) in the cache
+directory and answers prefix lookups by bisecting the memory-mapped file.
+Completion is answered from the entry point before the rest of naaman
+(argument parsing, pycman, etc.) is loaded so it stays fast on every tab.
+"""
+import mmap
+import os
+import sys
+
+INDEX = "aur-names.list"
+PACKAGES = "/packages.gz"
+COMPLETE = "--complete"
+_CACHE_DIR = "--cache-dir"
+_LIMIT = 200
+
+
+def _lines(data):
+    """Get package names from a name list."""
+    names = set()
+    for line in data.decode("utf-8").split("\n"):
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#"):
+            continue
+        names.add(line)
+    return sorted(names)
+
+
+def refresh(index, source):
+    """Refresh the name index from a (gzip'd) name list url or file."""
+    import gzip
+    import urllib.request
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        with urllib.request.urlopen(source) as req:
+            data = req.read()
+    if data[0:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    names = _lines(data)
+    tmp = index + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write("\n".join(names) + "\n")
+    os.rename(tmp, index)
+    return len(names)
+
+
+def _line_start(mm, offset):
+    """Get the start of the line containing an offset."""
+    return mm.rfind(b"\n", 0, offset) + 1
+
+
+def lookup(index, prefix, limit=_LIMIT):
+    """Get (up to limit) names starting with a prefix."""
+    if not os.path.exists(index) or os.path.getsize(index) == 0:
+        return []
+    key = prefix.encode("utf-8")
+    with open(index, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lo = 0
+            hi = len(mm)
+            # find the first line >= prefix
+            while lo < hi:
+                mid = _line_start(mm, (lo + hi) // 2)
+                end = mm.find(b"\n", mid)
+                if end < 0:
+                    end = len(mm)
+                if mm[mid:end] < key:
+                    lo = end + 1
+                else:
+                    hi = mid
+            results = []
+            pos = _line_start(mm, lo)
+            while pos < len(mm) and len(results) < limit:
+                end = mm.find(b"\n", pos)
+                if end < 0:
+                    end = len(mm)
+                name = mm[pos:end]
+                if not name.startswith(key):
+                    break
+                results.append(name.decode("utf-8"))
+                pos = end + 1
+    return results
+
+
+def default_cache():
+    """Get the default cache directory (without loading xdg)."""
+    cache_home = os.environ.get("XDG_CACHE_HOME", "")
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "naaman")
+
+
+def complete(cache_dir, prefix):
+    """Print completions for a prefix."""
+    names = lookup(os.path.join(cache_dir, INDEX), prefix)
+    if len(names) > 0:
+        sys.stdout.write("\n".join(names) + "\n")
+    return 0
+
+
+def main():
+    """Entry point, answers completions before loading naaman."""
+    argv = sys.argv[1:]
+    if len(argv) > 0 and argv[0] == COMPLETE:
+        prefix = ""
+        if len(argv) > 1:
+            prefix = argv[1]
+        cache_dir = default_cache()
+        if _CACHE_DIR in argv:
+            idx = argv.index(_CACHE_DIR)
+            if idx + 1 < len(argv):
+                cache_dir = argv[idx + 1]
+        exit(complete(cache_dir, prefix))
+    import naaman.naaman as naaman
+    naaman.main()
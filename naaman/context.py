@@ -16,7 +16,11 @@ import naaman.arguments.custom as csm_args
 import naaman.logger as log
 import naaman.consts as cst
 import naaman.alpm as alpm
+import naaman.executor as executor
 import naaman.shell as sh
+import naaman.timing as timing
+import naaman.metrics as metrics
+import naaman.ratelimit as ratelimit
 from datetime import datetime
 
 
@@ -29,14 +33,23 @@ _TMP_PREFIX = "naaman."
 class Context(object):
     """Context for operations."""
 
-    def __init__(self, targets, groups, args):
+    def __init__(self, targets, groups, args, resident=None):
         """Init the context."""
         self.root = "root" == getpass.getuser()
-        self.alpm = alpm.Alpm()
+        self._resident = resident
         self.targets = []
         if targets and len(targets) > 0:
             self.targets = targets
-        self.handle = self.alpm.config(args.pacman)
+        self.rpc_memory = None
+        self.pacman_config = args.pacman
+        self.root_config = None
+        if resident:
+            self.alpm = resident.alpm
+            self.handle = resident.handle
+            self.rpc_memory = resident.rpc
+        else:
+            self.alpm = alpm.Alpm()
+            self.handle = self.alpm.config(args.pacman)
         self.db = self.handle.get_localdb()
         self.groups = groups
         self.confirm = not args.no_confirm
@@ -44,10 +57,12 @@ class Context(object):
         self.info = args.info
         self.info_verbose = args.info_verbose
         self._sync = None
+        self._syncpkgs = None
         self._repos = None
         self._cache_dir = args.cache_dir
         self.can_sudo = not args.no_sudo
         self.deps = not args.skip_deps
+        self.skip_deps = args.skip_deps
         self._tracked_depends = []
         self._pkgcaching = None
         self._scripts = {}
@@ -56,13 +71,12 @@ class Context(object):
         self.do_not_track = []
         if args.do_not_track and len(args.do_not_track) > 0:
             self.do_not_track = args.do_not_track
-        self.rpc_cache = args.rpc_cache
+        self.rpc_cache = ratelimit.ttl(args.rpc_cache)
         self._lock_file = os.path.join(self._cache_dir, "file" + _LOCKS)
         self.force_refresh = args.force_refresh
         self._custom_args = self.groups[csm_args.CUSTOM_ARGS]
         self.now = datetime.now()
         self.timestamp = self.now.timestamp()
-        self.fetching = args.fetch
         self.makedeps = args.makedeps
         self.fetch_dir = "."
         self.rpc_field = args.rpc_field
@@ -74,6 +88,21 @@ class Context(object):
                 self.exiting(1)
             self.fetch_dir = args.fetch_dir
             log.trace(self.fetch_dir)
+        self.repo_dir = args.repo_dir
+        if self.repo_dir and not os.path.isdir(self.repo_dir):
+            log.console_error("invalid repo dir: {}".format(self.repo_dir))
+            self.exiting(1)
+        self.executor = executor.Local()
+        if args.build_spool:
+            if not os.path.isdir(args.build_spool):
+                log.console_error("invalid build spool: {}".format(
+                    args.build_spool))
+                self.exiting(1)
+            self.executor = executor.Spool(args.build_spool)
+        self.sources_size = args.sources_size
+        self.workspaces = args.workspaces
+        self.workspace_age = args.workspace_age
+        self.workspace_size = args.workspace_size
         self.builds = args.builds
         if self.builds:
             if not os.path.isdir(self.builds):
@@ -107,6 +136,7 @@ class Context(object):
 
     def exiting(self, code):
         """Exit via context."""
+        metrics.exit_code(code)
         self.unlock()
         exit(code)
 
@@ -127,6 +157,34 @@ class Context(object):
         """Get the cache pkgs location."""
         return os.path.join(self._cache_dir, "pkg")
 
+    def get_cache_mirrors(self):
+        """Get the git mirrors location."""
+        return os.path.join(self._cache_dir, "mirrors")
+
+    def get_cache_sources(self):
+        """Get the managed sources (SRCDEST) location."""
+        if self.builds:
+            return os.path.join(self.builds, "sources")
+        return os.path.join(self._cache_dir, "sources")
+
+    def get_cache_workspaces(self):
+        """Get the build workspaces location."""
+        if self.builds:
+            return os.path.join(self.builds, "workspaces")
+        return os.path.join(self._cache_dir, "workspaces")
+
+    def get_cache_journals(self):
+        """Get the location of the journals of --roots roots."""
+        return os.path.join(self._cache_dir, "journals")
+
+    def get_cache_journal(self):
+        """Get the sync/upgrade journal location (one per root)."""
+        if self.root_config:
+            root = os.path.abspath(self.root_config).strip(os.sep)
+            return os.path.join(self.get_cache_journals(),
+                                root.replace(os.sep, "_"))
+        return os.path.join(self._cache_dir, "journal")
+
     def get_cache_dirs(self):
         """Get cache directories for any builds."""
         if self.builds:
@@ -139,11 +197,25 @@ class Context(object):
                 b_dir = os.path.join(self.builds, f)
                 if not os.path.isdir(b_dir):
                     continue
+                if b_dir == self.get_cache_sources():
+                    continue
                 log.debug(b_dir)
                 yield b_dir
         cache_dir = self.get_cache_pkgs()
         if os.path.exists(cache_dir):
             yield self.get_cache_pkgs()
+        mirror_dir = self.get_cache_mirrors()
+        if os.path.exists(mirror_dir):
+            yield mirror_dir
+        workspace_dir = self.get_cache_workspaces()
+        if not self.builds and os.path.exists(workspace_dir):
+            yield workspace_dir
+        journal_dir = os.path.join(self._cache_dir, "journal")
+        if os.path.exists(journal_dir):
+            yield journal_dir
+        journals_dir = self.get_cache_journals()
+        if os.path.exists(journals_dir):
+            yield journals_dir
 
     def cache_file(self, file_name, ext=_CACHE_FILE):
         """Get a cache file."""
@@ -156,14 +228,28 @@ class Context(object):
         """Get sync'd dbs."""
         if self._sync:
             return
+        if self._resident:
+            self._sync = self._resident.syncdbs()
+            return
         self._sync = self.handle.get_syncdbs()
 
+    def get_syncdbs(self):
+        """Get the sync'd dbs."""
+        self._get_dbs()
+        return self._sync
+
     def get_packages(self):
         """Get mirror packages."""
+        if self._syncpkgs is not None:
+            return self._syncpkgs
+        if self._resident:
+            self._syncpkgs = self._resident.packages()
+            return self._syncpkgs
         self._get_dbs()
         syncpkgs = set()
         for db in self._sync:
             syncpkgs |= set(p.name for p in db.pkgcache)
+        self._syncpkgs = syncpkgs
         return syncpkgs
 
     def check_repos(self, package_name):
@@ -187,6 +273,8 @@ class Context(object):
                     "sudo required but not allowed, re-run as root")
                 self.exiting(1)
         cmd.append("/usr/bin/pacman")
+        if self.root_config:
+            cmd = cmd + ["--config", self.root_config]
         cmd = cmd + args
         log.trace(cmd)
         return sh.command(cmd)
@@ -213,6 +301,20 @@ class Context(object):
     def lock(self):
         """Lock to a single instance."""
         log.debug("locking")
+        with timing.phase("lock", args={"file": self._lock_file}):
+            locked = self._lock()
+        if locked:
+            return
+        log.console_error("lock file exists")
+        log.console_error("only one instance of naaman may run at a time")
+        log.console_error(
+            "delete {} if this is an error".format(self._lock_file))
+        # not exiting (the lock belongs to the other instance)
+        metrics.exit_code(1)
+        exit(1)
+
+    def _lock(self):
+        """Try to take the lock file."""
         if not os.path.exists(self._lock_file):
             log.debug("locked")
             with open(self._lock_file, 'w') as f:
@@ -221,9 +323,5 @@ class Context(object):
                 obj["pid"] = str(os.getpid())
                 log.trace(obj)
                 f.write(json.dumps(obj))
-            return
-        log.console_error("lock file exists")
-        log.console_error("only one instance of naaman may run at a time")
-        log.console_error(
-            "delete {} if this is an error".format(self._lock_file))
-        exit(1)
+            return True
+        return False
@@ -0,0 +1,151 @@
+"""
+Resident naaman daemon.
+
+Keeps the pacman handle, repository indexes and AUR rpc results warm
+between invocations and serves (read-only) requests over a unix socket.
+Clients send their arguments and the console output is streamed back.
+"""
+import os
+import sys
+import glob
+import json
+import socket
+import socketserver
+import naaman.logger as log
+
+_ARGS = "args"
+_OUT = "out"
+_EXIT = "exit"
+_ENCODING = "utf-8"
+
+
+class Resident(object):
+    """Warm backing state shared across daemon requests."""
+
+    def __init__(self, context, pacman):
+        """Init the resident state from an initial context."""
+        self.alpm = context.alpm
+        self.handle = context.handle
+        self.pacman = pacman
+        self.rpc = {}
+        self._sync = None
+        self._syncpkgs = None
+        self._stamp = self._db_stamp()
+
+    def _db_stamp(self):
+        """Get the modification state of the local/sync databases."""
+        db_path = self.handle.dbpath
+        paths = [os.path.join(db_path, "local")]
+        paths += sorted(glob.glob(os.path.join(db_path, "sync", "*.db")))
+        stamp = []
+        for p in paths:
+            if os.path.exists(p):
+                stamp.append((p, os.path.getmtime(p)))
+        return stamp
+
+    def check(self):
+        """Reload indexes if the pacman database has changed."""
+        stamp = self._db_stamp()
+        if stamp == self._stamp:
+            return
+        log.console_output("pacman database changed, reloading")
+        self.handle = self.alpm.config(self.pacman)
+        self._sync = None
+        self._syncpkgs = None
+        self.rpc = {}
+        self._stamp = stamp
+
+    def syncdbs(self):
+        """Get the sync'd dbs."""
+        if self._sync is None:
+            self._sync = self.handle.get_syncdbs()
+        return self._sync
+
+    def packages(self):
+        """Get the (cached) set of repository package names."""
+        if self._syncpkgs is None:
+            syncpkgs = set()
+            for db in self.syncdbs():
+                syncpkgs |= set(p.name for p in db.pkgcache)
+            self._syncpkgs = syncpkgs
+        return self._syncpkgs
+
+
+class _Forward(object):
+    """Stream console output to a client."""
+
+    def __init__(self, wfile):
+        """Init the forwarder."""
+        self._wfile = wfile
+
+    def write(self, text):
+        """Write output to the client."""
+        _send(self._wfile, {_OUT: text})
+
+    def flush(self):
+        """Flush output to the client."""
+        self._wfile.flush()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle a single client request."""
+
+    def handle(self):
+        """Run the client's arguments against the resident state."""
+        server = self.server
+        code = 1
+        try:
+            request = json.loads(self.rfile.readline().decode(_ENCODING))
+            log.debug("daemon request: {}".format(request[_ARGS]))
+            server.resident.check()
+            with log.capture(_Forward(self.wfile)):
+                code = server.runner(request[_ARGS], server.resident)
+        except SystemExit as e:
+            code = e.code
+        except Exception as e:
+            log.error("daemon request failed")
+            log.error(e)
+        _send(self.wfile, {_EXIT: code})
+
+
+def _send(wfile, obj):
+    """Send a message to the client."""
+    wfile.write((json.dumps(obj) + "\n").encode(_ENCODING))
+
+
+def serve(context, pacman, path, runner):
+    """Serve requests until interrupted."""
+    if os.path.exists(path):
+        log.console_error("socket exists: {}".format(path))
+        log.console_error("delete it if no daemon is running")
+        context.exiting(1)
+    server = socketserver.UnixStreamServer(path, _Handler)
+    server.resident = Resident(context, pacman)
+    server.runner = runner
+    log.console_output("daemon listening on {}".format(path))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def client(path, args):
+    """Forward arguments to a daemon and stream the output back."""
+    if not os.path.exists(path):
+        log.console_error("no daemon socket: {}".format(path))
+        return 1
+    code = 1
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        with s.makefile("rwb") as f:
+            _send(f, {_ARGS: args})
+            f.flush()
+            for line in f:
+                message = json.loads(line.decode(_ENCODING))
+                if _OUT in message:
+                    sys.stdout.write(message[_OUT])
+                if _EXIT in message:
+                    code = message[_EXIT]
+                    break
+    return code
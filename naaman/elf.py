@@ -0,0 +1,77 @@
+"""
+ELF dynamic section reading.
+
+Reads the shared library dependencies (DT_NEEDED sonames) of ELF files
+(32/64-bit, either byte order) without any external tools.
+"""
+import struct
+
+_MAGIC = b"\x7fELF"
+_DATA_LSB = 1
+_SHT_DYNAMIC = 6
+_DT_NULL = 0
+_DT_NEEDED = 1
+# (e_shoff, e_shentsize, e_shnum), section header, dynamic entry
+_FORMATS = {1: ("32xI10xHH", "IIIIIIIIII", "iI"),
+            2: ("40xQ10xHH", "IIQQQQIIQQ", "qQ")}
+
+
+def _read(f, offset, size):
+    """Read a block of a file."""
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated elf file")
+    return data
+
+
+def _string(f, offset):
+    """Read a null-terminated string."""
+    f.seek(offset)
+    result = b""
+    while True:
+        chunk = f.read(64)
+        if not chunk:
+            break
+        idx = chunk.find(b"\x00")
+        if idx >= 0:
+            result += chunk[0:idx]
+            break
+        result += chunk
+    return result.decode("utf-8", errors="replace")
+
+
+def needed(path):
+    """Get the DT_NEEDED sonames of an ELF file (empty if not ELF)."""
+    with open(path, 'rb') as f:
+        ident = f.read(16)
+        if len(ident) != 16 or ident[0:4] != _MAGIC:
+            return []
+        if ident[4] not in _FORMATS:
+            return []
+        order = "<" if ident[5] == _DATA_LSB else ">"
+        header, section, entry = [order + x for x in _FORMATS[ident[4]]]
+        shoff, shentsize, shnum = struct.unpack(
+            header, _read(f, 0, struct.calcsize(header)))
+        if shoff == 0 or shnum == 0:
+            return []
+        size = struct.calcsize(section)
+        sections = []
+        for idx in range(shnum):
+            data = _read(f, shoff + idx * shentsize, size)
+            sections.append(struct.unpack(section, data))
+        results = []
+        entry_size = struct.calcsize(entry)
+        for s in sections:
+            # name, type, flags, addr, offset, size, link, ...
+            if s[1] != _SHT_DYNAMIC or s[6] >= len(sections):
+                continue
+            strtab = sections[s[6]][4]
+            for idx in range(s[5] // entry_size):
+                data = _read(f, s[4] + idx * entry_size, entry_size)
+                tag, value = struct.unpack(entry, data)
+                if tag == _DT_NULL:
+                    break
+                if tag == _DT_NEEDED:
+                    results.append(_string(f, strtab + value))
+        return results
@@ -0,0 +1,412 @@
+"""
+Build executors.
+
+The makepkg step of an install runs through an executor: Local runs
+makepkg in the cloned package directory, Spool hands build jobs (package
+base, git source and commit, makepkg arguments, the packages of the
+planned package bases it requires) to 'naaman --build-worker' processes
+(e.g. on other hosts) through a shared spool directory:
+
+    jobs/      pending jobs (<priority>-<id>.json)
+    claimed/   jobs taken by a worker (claimed by an atomic rename)
+    done/      finished jobs (<id>/ with the result, package files and
+               build log, renamed into place once complete)
+    logs/      build logs collected by the submitter
+    packages/  packages (per run and package base) installed in the
+               (clean) chroot of the jobs requiring them
+    workers/   worker heartbeats
+
+Jobs are claimed in name order, so higher priority (the longer estimated
+critical path) jobs start first. Workers touch their heartbeat (and the
+claimed job while building), a stale claim is requeued (once) and a job
+waiting without any live worker fails. Nothing from the spool is
+installed on the worker host: with a (devtools) chroot the worker builds
+with makechrootpkg in a clean copy of it, without one jobs requiring
+packages fail.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import naaman.logger as log
+import naaman.shell as sh
+
+_JOBS = "jobs"
+_CLAIMED = "claimed"
+_DONE = "done"
+_LOGS = "logs"
+_WORKERS = "workers"
+_PACKAGES = "packages"
+_DIRS = [_JOBS, _CLAIMED, _DONE, _LOGS, _WORKERS, _PACKAGES]
+_EXT = ".json"
+_RESULT = "result.json"
+_LOG = "build.log"
+_TMP_PREFIX = "naaman.worker."
+_POLL = 1
+_HEARTBEAT = 30
+_STALE = 300
+_RETRIES = 1
+_PRIORITY = 10 ** 9
+
+_ID = "id"
+_BASE = "base"
+_SOURCE = "source"
+_COMMIT = "commit"
+_MAKEPKG = "makepkg"
+_DEPENDS = "depends"
+_OK = "ok"
+_FILES = "files"
+_WORKER = "worker"
+_SECONDS = "seconds"
+
+
+def job(base, source, commit, makepkg):
+    """Create a build job."""
+    return {_BASE: base,
+            _SOURCE: source,
+            _COMMIT: commit,
+            _MAKEPKG: list(makepkg)}
+
+
+def _init(path):
+    """Create the spool directories."""
+    for d in _DIRS:
+        os.makedirs(os.path.join(path, d), exist_ok=True)
+
+
+def _write(path, obj):
+    """Write a json file (renamed into place)."""
+    tmp = os.path.join(os.path.dirname(path),
+                       "." + os.path.basename(path) + ".tmp")
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(obj, sort_keys=True))
+    os.rename(tmp, path)
+
+
+def _stale(path, now):
+    """Check if a heartbeat (file) is stale."""
+    try:
+        return now - os.path.getmtime(path) > _STALE
+    except FileNotFoundError:
+        return False
+
+
+def _heartbeat(paths, stop):
+    """Touch (existing) files until stopped."""
+    while not stop.wait(_HEARTBEAT):
+        for path in paths:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+
+class Local(object):
+    """Build in the local package clone."""
+
+    parallel = False
+
+    def submit(self, build_job, priority=0, requires=None):
+        """Queue a build job (builds run when installing)."""
+        return None
+
+    def built(self, base, files):
+        """Keep the packages of a package base (installed locally)."""
+        pass
+
+    def build(self, pkg, path, build_job, srcdest=None):
+        """Build a package base (build seconds, None on failure)."""
+        started = time.time()
+        if not pkg.makepkg(build_job[_MAKEPKG], srcdest=srcdest):
+            return None
+        return time.time() - started
+
+    def finish(self):
+        """Finish (nothing queued locally)."""
+        pass
+
+
+class Spool(object):
+    """Build on workers through a shared spool directory."""
+
+    parallel = True
+
+    def __init__(self, path):
+        """Init the spool."""
+        self._path = path
+        self._pending = {}
+        self._requires = {}
+        self._run = uuid.uuid4().hex[:12]
+        _init(path)
+
+    def _packages(self, base):
+        """Get the packages directory of a package base (in this run)."""
+        return os.path.join(self._path, _PACKAGES, self._run, base)
+
+    def built(self, base, files):
+        """Keep the packages of a package base (for jobs requiring it)."""
+        packages = self._packages(base)
+        os.makedirs(packages, exist_ok=True)
+        for f in files:
+            shutil.copy(f, packages)
+
+    def _depends(self, requires):
+        """Get the packages (spool paths) of the required package bases."""
+        result = []
+        for base in sorted(requires):
+            packages = self._packages(base)
+            if not os.path.isdir(packages):
+                log.debug("no packages for {}".format(base))
+                continue
+            for name in sorted(os.listdir(packages)):
+                result.append(os.path.relpath(os.path.join(packages, name),
+                                              self._path))
+        return result
+
+    def _job_file(self, job_id, priority):
+        """Get the pending job file."""
+        name = "{:010d}-{}{}".format(max(0, _PRIORITY - int(priority)),
+                                     job_id,
+                                     _EXT)
+        return os.path.join(self._path, _JOBS, name)
+
+    def submit(self, build_job, priority=0, requires=None):
+        """Queue a build job (get the job id)."""
+        base = build_job[_BASE]
+        if requires is not None:
+            self._requires[base] = set(requires)
+        if base in self._pending:
+            pending, job_id, job_file = self._pending[base]
+            if pending == build_job:
+                return job_id
+            self._cancel(base)
+        job_id = "{}.{}".format(base, uuid.uuid4().hex[:12])
+        queued = dict(build_job)
+        queued[_ID] = job_id
+        queued[_DEPENDS] = self._depends(self._requires.get(base, []))
+        job_file = self._job_file(job_id, priority)
+        _write(job_file, queued)
+        log.console_output("queued build: {}".format(base))
+        log.debug("queued {}".format(job_file))
+        self._pending[base] = (dict(build_job), job_id, job_file)
+        return job_id
+
+    def _cancel(self, base):
+        """Cancel a pending job (if not yet claimed)."""
+        pending, job_id, job_file = self._pending.pop(base)
+        try:
+            os.remove(job_file)
+            log.debug("cancelled {}".format(job_id))
+        except FileNotFoundError:
+            log.debug("{} already claimed".format(job_id))
+
+    def _workers(self, now):
+        """Check if any worker is alive (recent heartbeat)."""
+        workers = os.path.join(self._path, _WORKERS)
+        for name in os.listdir(workers):
+            if not _stale(os.path.join(workers, name), now):
+                return True
+        return False
+
+    def _abandon(self, base, claimed):
+        """Abandon a stale claim (the worker discards its build)."""
+        pending, job_id, job_file = self._pending.pop(base)
+        try:
+            os.remove(claimed)
+        except FileNotFoundError:
+            log.debug("{} already finished".format(job_id))
+
+    def wait(self, build_job):
+        """Wait for a job to finish (job id and result directory or None)."""
+        base = build_job[_BASE]
+        retries = 0
+        started = time.time()
+        while True:
+            pending, job_id, job_file = self._pending[base]
+            done = os.path.join(self._path, _DONE, job_id)
+            if os.path.isdir(done):
+                return job_id, done
+            claimed = os.path.join(self._path,
+                                   _CLAIMED,
+                                   os.path.basename(job_file))
+            now = time.time()
+            if os.path.exists(job_file):
+                if now - started > _STALE and not self._workers(now):
+                    log.console_error("no build workers for {}".format(
+                        self._path))
+                    self._cancel(base)
+                    return None
+            elif _stale(claimed, now):
+                self._abandon(base, claimed)
+                if retries >= _RETRIES:
+                    log.console_error("build stalled: {}".format(base))
+                    return None
+                retries += 1
+                log.console_output("requeueing stalled build: {}".format(
+                    base))
+                self.submit(build_job, priority=_PRIORITY)
+                started = now
+            time.sleep(_POLL)
+
+    def build(self, pkg, path, build_job, srcdest=None):
+        """Build a package base (build seconds, None on failure)."""
+        self.submit(build_job)
+        waited = self.wait(build_job)
+        self._pending.pop(build_job[_BASE], None)
+        if waited is None:
+            return None
+        job_id, done = waited
+        with open(os.path.join(done, _RESULT), 'r') as f:
+            result = json.loads(f.read())
+        log_file = os.path.join(self._path, _LOGS, job_id + ".log")
+        os.rename(os.path.join(done, _LOG), log_file)
+        ok = result[_OK]
+        if ok:
+            files = [os.path.join(done, x) for x in result[_FILES]]
+            for f in files:
+                shutil.copy(f, path)
+            self.built(build_job[_BASE], files)
+        shutil.rmtree(done)
+        if not ok:
+            log.console_error("build failed on {}, see {}".format(
+                result[_WORKER],
+                log_file))
+            return None
+        log.debug("built on {}".format(result[_WORKER]))
+        return result[_SECONDS]
+
+    def finish(self):
+        """Cancel the queued (unclaimed) jobs and drop the run packages."""
+        for base in list(self._pending.keys()):
+            self._cancel(base)
+        shutil.rmtree(os.path.join(self._path, _PACKAGES, self._run),
+                      ignore_errors=True)
+
+
+def claim(path, worker):
+    """Claim the next pending job (None if there is none)."""
+    jobs = os.path.join(path, _JOBS)
+    for name in sorted(os.listdir(jobs)):
+        if name.startswith(".") or not name.endswith(_EXT):
+            continue
+        claimed = os.path.join(path, _CLAIMED, name)
+        try:
+            # the claim heartbeat starts now (not when queued)
+            os.utime(os.path.join(jobs, name))
+            os.rename(os.path.join(jobs, name), claimed)
+        except FileNotFoundError:
+            log.debug("{} claimed by another worker".format(name))
+            continue
+        log.debug("{} claimed {}".format(worker, name))
+        with open(claimed, 'r') as f:
+            return claimed, json.loads(f.read())
+    return None
+
+
+def _depends(path, build_job):
+    """Get the package files (in the spool) a job requires."""
+    packages = os.path.realpath(os.path.join(path, _PACKAGES))
+    depends = []
+    for d in build_job.get(_DEPENDS, []):
+        f = os.path.realpath(os.path.join(path, d))
+        if not f.startswith(packages + os.sep):
+            raise ValueError("invalid job dependency: {}".format(d))
+        depends.append(f)
+    return depends
+
+
+def run(path, worker, claimed, build_job, chroot=None):
+    """Build a claimed job and drop the result back in the spool."""
+    done = os.path.join(path, _DONE, build_job[_ID])
+    out = os.path.join(path, _DONE, "." + build_job[_ID])
+    os.makedirs(out)
+    log_file = os.path.join(out, _LOG)
+    files = []
+    started = time.time()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat,
+                     args=([claimed, os.path.join(path, _WORKERS, worker)],
+                           stop),
+                     daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix=_TMP_PREFIX) as t:
+            clone = os.path.join(t, build_job[_BASE])
+            ok = sh.logged(["git", "clone", "-q", build_job[_SOURCE], clone],
+                           log_file)
+            if ok and build_job[_COMMIT]:
+                ok = sh.logged(["git", "checkout", "-q", build_job[_COMMIT]],
+                               log_file,
+                               workdir=clone)
+            depends = _depends(path, build_job)
+            makepkg = ["makepkg"]
+            if chroot:
+                makepkg = ["makechrootpkg", "-c", "-r", chroot]
+                for d in depends:
+                    makepkg += ["-I", d]
+                makepkg.append("--")
+            elif len(depends) > 0:
+                with open(log_file, 'a') as f:
+                    f.write("requires packages, run the worker with a "
+                            "chroot (--worker-chroot)\n")
+                ok = False
+            if ok:
+                ok = sh.logged(makepkg + build_job[_MAKEPKG],
+                               log_file,
+                               workdir=clone)
+            if ok:
+                for f in sh.artifacts(clone):
+                    shutil.copy(f, out)
+                    files.append(os.path.basename(f))
+    except Exception as e:
+        with open(log_file, 'a') as f:
+            f.write("{}\n".format(e))
+        ok = False
+        files = []
+    stop.set()
+    result = {_OK: ok,
+              _FILES: files,
+              _WORKER: worker,
+              _SECONDS: time.time() - started}
+    _write(os.path.join(out, _RESULT), result)
+    if not os.path.exists(claimed):
+        log.console_output("{} claim went stale, discarding".format(
+            build_job[_ID]))
+        shutil.rmtree(out)
+        return False
+    os.rename(out, done)
+    os.remove(claimed)
+    return ok
+
+
+def work(path, worker, idle=0, chroot=None):
+    """Claim and build jobs (until idle for this many seconds, 0: never)."""
+    _init(path)
+    heartbeat = os.path.join(path, _WORKERS, worker)
+    beat = 0
+    waited = 0
+    while True:
+        if time.time() - beat >= _HEARTBEAT:
+            open(heartbeat, 'a').close()
+            os.utime(heartbeat)
+            beat = time.time()
+        claimed = claim(path, worker)
+        if claimed is None:
+            if idle > 0 and waited >= idle:
+                os.remove(heartbeat)
+                return
+            time.sleep(_POLL)
+            waited += _POLL
+            continue
+        waited = 0
+        claimed_file, build_job = claimed
+        log.console_output("building {}".format(build_job[_ID]))
+        try:
+            ok = run(path, worker, claimed_file, build_job, chroot=chroot)
+            log.console_output("{} {}".format(
+                build_job[_ID], "built" if ok else "failed"))
+        except Exception as e:
+            log.error("unexpected build error")
+            log.error(e)
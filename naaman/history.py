@@ -0,0 +1,81 @@
+"""
+Build duration history.
+
+Records how long fetching (git) and building (makepkg) took per package
+base and version in the cache directory so upgrades can be estimated
+before they run (and builds can be ordered by their expected duration).
+"""
+import json
+import os
+import time
+import naaman.logger as log
+
+_FILE = "build-history"
+_EXT = ".json"
+_KEEP = 5
+_BUILD = "build"
+_DOWNLOAD = "download"
+_TIME = "time"
+
+
+def _file(context):
+    """Get the history file."""
+    return context.cache_file(_FILE, ext=_EXT)
+
+
+def load(context):
+    """Load the build history."""
+    history_file = _file(context)
+    if not os.path.exists(history_file):
+        return {}
+    try:
+        with open(history_file, 'r') as f:
+            return json.loads(f.read())
+    except Exception as e:
+        log.error("unable to read build history")
+        log.error(e)
+        return {}
+
+
+def record(context, base, version, build_seconds, download_seconds):
+    """Record the durations of a build."""
+    history = load(context)
+    versions = history.get(base, {})
+    entry = {}
+    entry[_BUILD] = round(build_seconds, 3)
+    entry[_DOWNLOAD] = round(download_seconds, 3)
+    entry[_TIME] = time.time()
+    versions[version] = entry
+    newest = sorted(versions.keys(), key=lambda x: versions[x][_TIME])
+    for old in newest[0:-_KEEP]:
+        del versions[old]
+    history[base] = versions
+    history_file = _file(context)
+    tmp = history_file + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(history, sort_keys=True))
+    os.rename(tmp, history_file)
+
+
+def estimate(history, base, version):
+    """Estimate the duration (seconds) of a build (None if unknown)."""
+    versions = history.get(base, None)
+    if not versions:
+        return None
+    entry = versions.get(version, None)
+    if entry is None:
+        latest = max(versions.keys(), key=lambda x: versions[x][_TIME])
+        entry = versions[latest]
+    return entry[_BUILD] + entry[_DOWNLOAD]
+
+
+def duration(seconds):
+    """Format a duration for display."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours > 0:
+        return "{}h{:02d}m".format(hours, minutes)
+    if minutes > 0:
+        return "{}m{:02d}s".format(minutes, seconds)
+    return "{}s".format(seconds)
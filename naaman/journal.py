@@ -0,0 +1,143 @@
+"""
+Sync/upgrade journal.
+
+Records the planned packages of a sync/upgrade, the package files of
+finished builds (copied into the journal directory) and the finished
+installs so an interrupted run (SIGINT, build failure, reboot) can be
+resumed: installed packages are skipped and built packages are installed
+from their saved package files instead of being built again.
+"""
+import json
+import os
+import shutil
+import naaman.logger as log
+
+_FILE = "journal.json"
+_TARGETS = "targets"
+_INSTALL = "install"
+_UPDATING = "updating"
+_REBUILD = "rebuild"
+_BUILT = "built"
+_INSTALLED = "installed"
+_VERSION = "version"
+_FILES = "files"
+_STATE = {}
+_PATH = "path"
+_JOURNAL = "journal"
+
+
+def load(path):
+    """Load an unfinished journal (None if there is none)."""
+    journal_file = os.path.join(path, _FILE)
+    if not os.path.exists(journal_file):
+        return None
+    try:
+        with open(journal_file, 'r') as f:
+            return json.loads(f.read())
+    except Exception as e:
+        log.error("unable to read journal")
+        log.error(e)
+        return None
+
+
+def _save():
+    """Save the journal."""
+    journal_file = os.path.join(_STATE[_PATH], _FILE)
+    tmp = journal_file + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(_STATE[_JOURNAL]))
+    os.rename(tmp, journal_file)
+
+
+def begin(path, targets, is_install, updating, resumed=None, rebuild=()):
+    """Begin (or continue a resumed) journal for planned packages."""
+    if resumed is None:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        resumed = {_BUILT: {}, _INSTALLED: []}
+    if not os.path.exists(path):
+        os.makedirs(path)
+    journal = {}
+    journal[_TARGETS] = list(targets)
+    journal[_INSTALL] = is_install
+    journal[_UPDATING] = updating
+    journal[_REBUILD] = list(rebuild)
+    journal[_BUILT] = resumed[_BUILT]
+    journal[_INSTALLED] = resumed[_INSTALLED]
+    _STATE[_PATH] = path
+    _STATE[_JOURNAL] = journal
+    _save()
+
+
+def _active():
+    """Check if a journal is being recorded."""
+    return _JOURNAL in _STATE
+
+
+def built(base, version, files):
+    """Record a finished build (saving the package files)."""
+    if not _active():
+        return
+    saved = []
+    for f in files:
+        dest = os.path.join(_STATE[_PATH], os.path.basename(f))
+        log.debug("journal: saving {}".format(dest))
+        shutil.copyfile(f, dest)
+        saved.append(dest)
+    _STATE[_JOURNAL][_BUILT][base] = {_VERSION: version, _FILES: saved}
+    _save()
+
+
+def installed(names):
+    """Record finished installs."""
+    if not _active():
+        return
+    _STATE[_JOURNAL][_INSTALLED] += [x for x in names]
+    _save()
+
+
+def remaining(journal):
+    """Get the planned packages that are not installed yet."""
+    done = set(journal[_INSTALLED])
+    return [x for x in journal[_TARGETS] if x not in done]
+
+
+def is_install(journal):
+    """Check if the journal is for an install (or an upgrade)."""
+    return journal[_INSTALL]
+
+
+def is_updating(journal):
+    """Check if the journal is for updating packages."""
+    return journal[_UPDATING]
+
+
+def rebuilding(journal):
+    """Get the packages the journal rebuilds (never from a repository)."""
+    return journal.get(_REBUILD, [])
+
+
+def artifacts(journal, base, version, names):
+    """Get saved package files of a built package base (None if not)."""
+    entry = journal[_BUILT].get(base, None)
+    if entry is None or entry[_VERSION] != version:
+        return None
+    files = [x for x in entry[_FILES] if os.path.exists(x)]
+    if len(files) != len(entry[_FILES]):
+        return None
+    # <name>-<pkgver>-<pkgrel>-<arch>.pkg.tar.*
+    files = [x for x in files
+             if os.path.basename(x).rsplit("-", 3)[0] in names]
+    if len(files) == 0:
+        return None
+    return files
+
+
+def finish():
+    """Finish (remove) the journal."""
+    if not _active():
+        return
+    path = _STATE[_PATH]
+    del _STATE[_JOURNAL]
+    log.debug("journal: finished")
+    shutil.rmtree(path, ignore_errors=True)
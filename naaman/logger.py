@@ -5,6 +5,7 @@ Wraps python logging to support verbose/trace outputs
 """
 
 import os
+import contextlib
 import logging
 import naaman.consts as consts
 import naaman.alpm as alpm
@@ -22,11 +23,12 @@ _CONSOLE_FORMAT = logging.Formatter('%(message)s')
 _FILE_FORMAT = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 _MESSAGE = "{} => {}"
 _PROGRESS_MESSAGE = _MESSAGE.format("", "{}{}")
+_CONSOLE = logging.StreamHandler()
 
 
 def init(verbose, trace, cache_dir):
     """Initialize logging."""
-    ch = logging.StreamHandler()
+    ch = _CONSOLE
     if not os.path.exists(cache_dir):
         _LOGGER.debug("creating cache dir")
         os.makedirs(cache_dir)
@@ -50,6 +52,16 @@ def init(verbose, trace, cache_dir):
         setattr(_LOGGER, "trace", trace_log)
 
 
+@contextlib.contextmanager
+def capture(stream):
+    """Redirect console output to a stream (e.g. a daemon client)."""
+    previous = _CONSOLE.setStream(stream)
+    try:
+        yield
+    finally:
+        _CONSOLE.setStream(previous)
+
+
 def trace(message):
     """Write a trace message."""
     _LOGGER.trace(message)
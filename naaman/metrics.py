@@ -0,0 +1,142 @@
+"""
+Per-run metrics for naaman.
+
+Counts rpc requests, cache effectiveness, downloads, and builds for a run
+and (optionally) exports them at exit as a json line and/or a prometheus
+(node-exporter textfile collector) file.
+"""
+import atexit
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import naaman.logger as log
+
+RPC_REQUESTS = "rpc_requests"
+RPC_CACHE_HITS = "rpc_cache_hits"
+RPC_CACHE_MISSES = "rpc_cache_misses"
+RPC_CACHE_EVICTIONS = "rpc_cache_evictions"
+BYTES_DOWNLOADED = "bytes_downloaded"
+PACKAGES_BUILT = "packages_built"
+PACKAGES_FAILED = "packages_failed"
+PACKAGES_INSTALLED = "packages_installed"
+_COUNTERS = [RPC_REQUESTS,
+             RPC_CACHE_HITS,
+             RPC_CACHE_MISSES,
+             RPC_CACHE_EVICTIONS,
+             BYTES_DOWNLOADED,
+             PACKAGES_BUILT,
+             PACKAGES_FAILED,
+             PACKAGES_INSTALLED]
+_PROM_PREFIX = "naaman_last_run_"
+_STATE = {}
+_VALUES = {}
+_BUILDS = {}
+_LOCK = threading.Lock()
+_START = "start"
+_OPERATION = "operation"
+_EXIT = "exit"
+_JSON = "json"
+_TEXTFILE = "textfile"
+
+
+def enable(json_file, textfile):
+    """Enable exporting metrics at exit."""
+    _STATE[_START] = time.time()
+    _STATE[_JSON] = json_file
+    _STATE[_TEXTFILE] = textfile
+    sys.excepthook = _failing(sys.excepthook)
+    atexit.register(_export)
+
+
+def _failing(hook):
+    """Record an uncaught error as a failed run (before exporting)."""
+    def _hook(exc_type, exc, tb):
+        exit_code(1)
+        hook(exc_type, exc, tb)
+    return _hook
+
+
+def count(name, value=1):
+    """Increment a counter."""
+    with _LOCK:
+        _VALUES[name] = _VALUES.get(name, 0) + value
+
+
+def build(name, seconds):
+    """Record package build time."""
+    with _LOCK:
+        _BUILDS[name] = _BUILDS.get(name, 0) + seconds
+
+
+def operation(name):
+    """Set the operation being performed."""
+    _STATE[_OPERATION] = name
+
+
+def exit_code(code):
+    """Set the exit code of the run."""
+    _STATE[_EXIT] = code
+
+
+def _record():
+    """Get the metrics record for the run."""
+    obj = {}
+    obj["timestamp"] = _STATE[_START]
+    obj["host"] = socket.gethostname()
+    obj["operation"] = _STATE.get(_OPERATION, None)
+    obj["exit"] = _STATE.get(_EXIT, 0)
+    obj["duration"] = round(time.time() - _STATE[_START], 3)
+    for c in _COUNTERS:
+        obj[c] = _VALUES.get(c, 0)
+    obj["build_seconds"] = {k: round(v, 3) for k, v in _BUILDS.items()}
+    return obj
+
+
+def _prometheus(record):
+    """Format a record for the node-exporter textfile collector."""
+    labels = '{{operation="{}"}}'.format(record["operation"])
+    lines = []
+
+    def _metric(name, value, help_text, metric_labels=labels):
+        metric = _PROM_PREFIX + name
+        lines.append("# HELP {} {}".format(metric, help_text))
+        lines.append("# TYPE {} gauge".format(metric))
+        lines.append("{}{} {}".format(metric, metric_labels, value))
+    _metric("timestamp_seconds", record["timestamp"], "run start time")
+    _metric("duration_seconds", record["duration"], "run duration")
+    _metric("exit_code", record["exit"], "run exit code")
+    for c in _COUNTERS:
+        _metric(c, record[c], c.replace("_", " "))
+    builds = record["build_seconds"]
+    if len(builds) > 0:
+        metric = _PROM_PREFIX + "build_seconds"
+        lines.append("# HELP {} build time by package".format(metric))
+        lines.append("# TYPE {} gauge".format(metric))
+        for pkg in sorted(builds.keys()):
+            lines.append('{}{{operation="{}",package="{}"}} {}'.format(
+                metric,
+                record["operation"],
+                pkg,
+                builds[pkg]))
+    return "\n".join(lines) + "\n"
+
+
+def _export():
+    """Export the run metrics."""
+    try:
+        record = _record()
+        if _STATE[_JSON]:
+            with open(_STATE[_JSON], 'a') as f:
+                f.write(json.dumps(record, sort_keys=True) + "\n")
+        if _STATE[_TEXTFILE]:
+            # textfile collectors may read at any time, replace atomically
+            tmp = _STATE[_TEXTFILE] + ".tmp"
+            with open(tmp, 'w') as f:
+                f.write(_prometheus(record))
+            os.rename(tmp, _STATE[_TEXTFILE])
+    except Exception as e:
+        log.error("unable to export metrics")
+        log.error(e)
@@ -5,8 +5,11 @@ N(ot) A(nother) A(UR) Man(ager).
 Is an AUR wrapper/manager that uses pacman as it's backing data store.
 """
 import argparse
+import copy
 import os
+import sys
 import json
+import socket
 import shutil
 import naaman.arguments.common as common_args
 import naaman.arguments.config as config_args
@@ -14,15 +17,36 @@ import naaman.arguments.custom as csm_args
 import naaman.arguments.utils as util_args
 import naaman.arguments.query as query_args
 import naaman.arguments.syncup as sync_args
+import naaman.arguments.service as svc_args
+import naaman.arguments.diagnostic as diag_args
+import naaman.arguments.completion as cmp_args
 import naaman.shell as sh
 import naaman.aur as aur
+import naaman.budget as budget
 import naaman.context as nctx
+import naaman.complete as complete
+import naaman.daemon as daemon
+import naaman.executor as executor
+import naaman.proxy as proxy
 import naaman.logger as log
+import naaman.timing as timing
+import naaman.metrics as metrics
+import naaman.history as history
+import naaman.journal as journal
+import naaman.ratelimit as ratelimit
+import naaman.preflight as preflight
+import naaman.rdeps as rdeps
+import naaman.repo as repo
+import naaman.sources as sources
+import naaman.vcs as vcs
 import naaman.consts as cst
 from datetime import datetime, timedelta
 
+_ROOTS_REPO = "roots"
+_EXPLICIT = 0
 
-def _validate_options(args, unknown, groups):
+
+def _validate_options(args, unknown, groups, resident=None):
     """Validate argument options."""
     valid_count = 0
     invalid = False
@@ -68,6 +92,8 @@ def _validate_options(args, unknown, groups):
         if args.search or args.deps or args.fetch or \
            (not args.upgrades and not args.clean and not args.deps):
             need_targets = True
+        if args.resume and not (args.search or args.deps or args.fetch):
+            need_targets = False
 
     if args.remove:
         call_on("remove")
@@ -77,6 +103,29 @@ def _validate_options(args, unknown, groups):
     if args.query:
         call_on("query")
         valid_count += 1
+        if args.gone and args.upgrades:
+            log.console_error("gone and upgrades do not work together")
+            invalid = True
+
+    if args.daemon:
+        call_on("daemon")
+        valid_count += 1
+
+    if args.prewarm:
+        call_on("prewarm")
+        valid_count += 1
+
+    if args.serve_rpc:
+        call_on("serve rpc")
+        valid_count += 1
+
+    if args.rebuild_needed:
+        call_on("rebuild needed")
+        valid_count += 1
+
+    if args.build_worker:
+        call_on("build worker")
+        valid_count += 1
 
     if not invalid:
         if valid_count > 1:
@@ -87,10 +136,23 @@ def _validate_options(args, unknown, groups):
             invalid = True
 
     if not invalid and \
-       (args.search or args.upgrades or args.clean or args.fetch):
+       (args.search or args.clean or args.fetch):
         if not args.sync:
             log.console_error(
-                "search, upgrade, clean, and fetch are sync only")
+                "search, clean, and fetch are sync only")
+            invalid = True
+
+    if not invalid and args.upgrades:
+        if not args.sync and not args.query:
+            log.console_error("upgrade is sync or query only")
+            invalid = True
+
+    if not invalid and resident:
+        if not (args.query or args.search):
+            log.console_error("daemon only serves query and search")
+            invalid = True
+        if args.pacman != resident.pacman:
+            log.console_error("daemon serves {}".format(resident.pacman))
             invalid = True
 
     if not invalid and args.info and not args.search:
@@ -110,21 +172,50 @@ def _validate_options(args, unknown, groups):
             log.console_error("no targets specified")
             invalid = True
 
+    if args.roots:
+        if not args.sync and not args.query:
+            log.console_error("roots are sync or query only")
+            invalid = True
+        for config in args.roots:
+            if not os.path.exists(config):
+                log.console_error("invalid root config: {}".format(config))
+                invalid = True
+        # the first root's context is the run's context
+        args.pacman = args.roots[0]
+        if args.sync and not args.repo_dir:
+            args.repo_dir = os.path.join(args.cache_dir, _ROOTS_REPO)
+            if not os.path.exists(args.repo_dir):
+                os.makedirs(args.repo_dir)
+
+    if args.time_budget:
+        if not (args.sync or args.rebuild_needed) or args.search or \
+           args.clean or args.deps or args.fetch:
+            log.console_error("time budget is sync/upgrade only")
+            invalid = True
+        try:
+            budget.seconds(args.time_budget)
+        except ValueError as e:
+            log.console_error(str(e))
+            invalid = True
+
     if not args.pacman or not os.path.exists(args.pacman):
         log.console_error("invalid config file")
         invalid = True
 
-    ctx = nctx.Context(unknown, groups, args)
+    with timing.phase("context"):
+        ctx = nctx.Context(unknown, groups, args, resident=resident)
     callback = None
     if not invalid:
         if args.query:
             if args.gone:
                 callback = _gone
+            elif args.upgrades:
+                callback = _query_upgrades
             else:
                 callback = _query
         if args.search:
             callback = _search
-        if args.upgrades:
+        if args.upgrades and args.sync:
             callback = _upgrades
         if args.clean:
             callback = _clean
@@ -136,8 +227,20 @@ def _validate_options(args, unknown, groups):
                not args.clean and \
                not args.deps:
                 callback = _sync
+        if args.sync and args.fetch:
+            callback = _fetch
         if args.remove:
             callback = _remove
+        if args.daemon:
+            callback = _daemon
+        if args.prewarm:
+            callback = _prewarm
+        if args.serve_rpc:
+            callback = _serve_rpc
+        if args.rebuild_needed:
+            callback = _rebuild_needed
+        if args.build_worker:
+            callback = _build_worker
 
     if not invalid and callback is None:
         log.console_error("unable to find callback")
@@ -145,7 +248,46 @@ def _validate_options(args, unknown, groups):
 
     if invalid:
         ctx.exiting(1)
+    metrics.operation(callback.__name__.strip("_"))
+    if args.roots:
+        _roots(ctx, args, unknown, groups, callback)
+        return 0
     callback(ctx)
+    return 0
+
+
+def _roots(context, args, unknown, groups, callback):
+    """Run an operation for several roots (shared AUR lookups/builds)."""
+    contexts = [context]
+    for config in args.roots[1:]:
+        root_args = copy.copy(args)
+        root_args.pacman = config
+        with timing.phase("context"):
+            contexts.append(nctx.Context(unknown, groups, root_args))
+    shared = {}
+    for config, ctx in zip(args.roots, contexts):
+        ctx.root_config = config
+        ctx.rpc_memory = shared
+    names = list(contexts[0].targets)
+    if len(names) == 0:
+        for ctx in contexts:
+            for pkg in _do_query(ctx):
+                if pkg.name not in names:
+                    names.append(pkg.name)
+    log.console_output("{} AUR packages in {} roots".format(len(names),
+                                                            len(contexts)))
+    if contexts[0].rpc_cache <= 0:
+        log.warn("rpc caching is disabled, roots are looked up separately")
+    contexts[0].lock()
+    try:
+        aur.rpc_prefetch(names, contexts[0])
+    except Exception as e:
+        log.error("unexpected prefetch error")
+        log.error(e)
+    contexts[0].unlock()
+    for config, ctx in zip(args.roots, contexts):
+        log.console_output("root: {}".format(config))
+        callback(ctx)
 
 
 def _resolution_output(context, name):
@@ -178,11 +320,15 @@ def _load_deps(depth, packages, context, cache, parent):
         cache[p] = t
 
 
+@timing.timed("deps")
 def _deps(context):
     """Handle dependency resolution."""
     log.debug("attempt dependency resolution")
+    ratelimit.priority(ratelimit.CRITICAL)
     context.deps = False
     targets = context.targets
+    # one sync (and journal) for all targets, dependencies first
+    ordered = []
     for target in targets:
         resolved = aur.DepTree(target)
         log.debug("resolving {}".format(target))
@@ -196,17 +342,20 @@ def _deps(context):
             _load_deps(1, pkg.deps, context, cache, resolved)
             _resolution_output(context, "{} (complete)".format(target))
             actual = reversed(sorted(resolved.get(visits), key=lambda x: x[0]))
-            context.targets = []
             for act in actual:
                 log.debug(act)
                 a = act[1]
-                if a not in context.targets:
-                    context.targets.append(a)
+                if a not in ordered:
+                    ordered.append(a)
         else:
             log.debug("no deps...")
-            context.targets = [target]
+            if target not in ordered:
+                ordered.append(target)
         log.trace(resolved)
-        _sync(context)
+    if len(ordered) == 0:
+        return
+    context.targets = ordered
+    _sync(context)
 
 
 def _clean(context):
@@ -220,6 +369,10 @@ def _clean(context):
         for f in files:
             log.console_output("removing {}".format(f[0]))
             os.remove(f[1])
+    unused = sources.unused(context)
+    if len(unused) > 0:
+        _confirm(context, "clear sources of removed packages", unused)
+        sources.prune(context, unused)
     dirs = [x for x in context.get_cache_dirs()]
     if len(dirs) == 0:
         log.console_output("no directories to cleanup")
@@ -259,26 +412,37 @@ def _get_deltahours(input_str, now):
     return hours
 
 
-def _check_vcs_ignore(context, threshold):
-    """VCS caching check."""
-    log.debug("checking vcs ignore cache")
-    cache_check = context.cache_file("vcs")
-    update_cache = True
-    result = None
-    now = context.now
-    current_time = context.timestamp
-    # we have a cache item, has necessary time elapsed?
-    if os.path.exists(cache_check):
-        with open(cache_check, 'r') as f:
-            hours = _get_deltahours(f.read(), now)
-            if hours < threshold:
-                update_cache = False
-                result = True
-    if update_cache:
-        log.debug("updating vcs last cache time")
-        with open(cache_check, 'w') as f:
-            f.write(str(current_time))
-    return result
+def _package_bases(context, names):
+    """Get the package bases of packages (name -> base)."""
+    bases = {}
+    for name in names:
+        package = _rpc_search(name, True, context)
+        bases[name] = package.base if package else name
+    return bases
+
+
+def _vcs_schedule(context, args, names, bases):
+    """Schedule vcs package checks (get the deferred packages)."""
+    state = vcs.load(context, names)
+    durations = history.load(context)
+    estimates = {x: history.estimate(durations, bases[x], None)
+                 for x in bases}
+    checking = vcs.schedule(state,
+                            names,
+                            context.timestamp,
+                            args.vcs_ignore,
+                            budget=args.vcs_budget,
+                            budget_seconds=args.vcs_budget_time * 60,
+                            estimates=estimates)
+    for name in checking:
+        state[name] = context.timestamp
+    vcs.save(context, state)
+    deferred = [x for x in names if x not in checking]
+    log.debug("vcs checks: {}, deferred: {}".format(checking, deferred))
+    if len(checking) > 0 and len(deferred) > 0:
+        log.console_output("checking {} vcs package(s), {} deferred".format(
+            len(checking), len(deferred)))
+    return deferred
 
 
 def _ignore_for(context, ignore_for, ignored):
@@ -322,13 +486,42 @@ def _ignore_for(context, ignore_for, ignored):
         f.write(json.dumps(ignore_definition))
 
 
-def _syncing(context, is_install, targets, updating):
-    """Sync/install packages."""
+def _prefetch(context, names):
+    """Batch rpc lookups when the request budget is under pressure."""
+    if not ratelimit.pressure():
+        return
+    log.console_output("rpc budget under pressure, batching lookups")
+    context.lock()
+    try:
+        aur.rpc_prefetch(names, context)
+    except Exception as e:
+        log.error("unexpected prefetch error")
+        log.error(e)
+    context.unlock()
+
+
+@timing.timed("syncing")
+def _syncing(context, is_install, targets, updating, rebuild=()):
+    """Sync/install packages (rebuild: never install from the repo)."""
+    ratelimit.priority(ratelimit.CRITICAL)
     if context.root:
         log.console_error(
             "can not run install/upgrades as root (uses makepkg)")
         context.exiting(1)
     args = context.groups[sync_args.SYNC_UP_OPTIONS]
+    resumed = None
+    if args.resume:
+        resumed = journal.load(context.get_cache_journal())
+        if resumed is None:
+            log.console_output("nothing to resume")
+            if len(targets) == 0:
+                return
+        else:
+            targets = journal.remaining(resumed)
+            is_install = journal.is_install(resumed)
+            updating = journal.is_updating(resumed)
+            rebuild = journal.rebuilding(resumed)
+            log.console_output("resuming: {}".format(", ".join(targets)))
     ignored = args.ignore
     skip_filters = False
     if args.force_refresh or is_install:
@@ -339,16 +532,6 @@ def _syncing(context, is_install, targets, updating):
     no_vcs = False
     if args.no_vcs or (args.refresh and not skip_filters):
         no_vcs = True
-    if not no_vcs and args.vcs_ignore > 0 and not skip_filters:
-        context.lock()
-        try:
-            if _check_vcs_ignore(context, args.vcs_ignore) is not None:
-                log.trace("vcs ignore threshold met")
-                no_vcs = True
-        except Exception as e:
-            log.error("unexpected vcs error")
-            log.error(e)
-        context.unlock()
     log.debug("novcs? {}".format(no_vcs))
     if args.ignore_for and len(args.ignore_for) > 0 and not skip_filters:
         log.debug("handling ignorefors")
@@ -360,6 +543,25 @@ def _syncing(context, is_install, targets, updating):
             log.error(e)
         context.unlock()
     log.trace("ignoring {}".format(ignored))
+    _prefetch(context, [x for x in targets if x not in ignored])
+    vcs_deferred = []
+    if not no_vcs and args.vcs_ignore > 0 and not skip_filters:
+        vcs_names = [x for x in targets if aur.is_vcs(x) and x not in ignored]
+        bases = {}
+        if args.vcs_budget_time > 0:
+            # build history is kept by package base (only due checks)
+            bases = _package_bases(context,
+                                   vcs.due(vcs.load(context, vcs_names),
+                                           vcs_names,
+                                           context.timestamp,
+                                           args.vcs_ignore))
+        context.lock()
+        try:
+            vcs_deferred = _vcs_schedule(context, args, vcs_names, bases)
+        except Exception as e:
+            log.error("unexpected vcs error")
+            log.error(e)
+        context.unlock()
     check_inst = []
     for name in targets:
         if name in ignored:
@@ -369,6 +571,9 @@ def _syncing(context, is_install, targets, updating):
         if no_vcs and vcs:
             log.debug("skipping vcs package {}".format(name))
             continue
+        if name in vcs_deferred:
+            log.debug("vcs check deferred {}".format(name))
+            continue
         package = _rpc_search(name, True, context)
         if package and package.name in context.do_not_track:
             log.debug("do not track: {}".format(package.name))
@@ -403,7 +608,7 @@ def _syncing(context, is_install, targets, updating):
         if len(obj) == 0:
             inst += [item]
     log.trace(inst)
-    report = []
+    tags = {}
     do_install = []
     for i in inst:
         pkg = context.db.get_pkg(i.name)
@@ -422,14 +627,37 @@ def _syncing(context, is_install, targets, updating):
         log.trace(i)
         if vcs:
             vers = vcs
-        report.append("{} {}{}".format(i.name, vers, tag))
+        tags[i.name] = "{} {}{}".format(i.name, vers, tag)
         do_install.append(i)
     if len(do_install) == 0:
         log.console_output("nothing to do")
-        context.exiting(0)
-    _confirm(context, "install packages", report)
+        return
     makepkg = context.get_custom_arg(csm_args.CUSTOM_MAKEPKG)
     log.debug("makepkg {}".format(makepkg))
+    do_install = _preflight(context, do_install, makepkg)
+    durations = history.load(context)
+    if args.time_budget:
+        do_install = _time_budget(context,
+                                  do_install,
+                                  durations,
+                                  budget.seconds(args.time_budget),
+                                  resumed)
+        if len(do_install) == 0:
+            return
+    report = []
+    estimated = {}
+    for i in do_install:
+        tag = ""
+        if resumed and journal.artifacts(resumed, i.base, i.version, [i.name]):
+            tag = " [built]"
+        elif i.base not in estimated:
+            estimated[i.base] = history.estimate(durations, i.base, i.version)
+            if estimated[i.base] is not None:
+                tag = " (~{})".format(history.duration(estimated[i.base]))
+        report.append(tags[i.name] + tag)
+    _confirm(context,
+             "install packages{}".format(_eta(estimated.values())),
+             report)
     cache = context.handle.cachedirs
     cache_dirs = ""
     if not args.no_cache and cache and len(cache) > 0:
@@ -444,36 +672,234 @@ def _syncing(context, is_install, targets, updating):
             os.makedirs(naaman_pkg)
         use_caches.append(naaman_pkg)
         cache_dirs = " ".join(['{}'.format(x) for x in use_caches])
+    repo_pkgs = {}
+    if context.repo_dir:
+        # packages to rebuild are built (and replaced in the repository)
+        repo_pkgs = {k: v for k, v in repo.packages(context.repo_dir).items()
+                     if k not in rebuild}
+    builds = _group_bases(do_install)
+    paths = {}
+    needs = {}
+    queued = set()
+    if context.executor.parallel:
+        builds, paths = budget.critical_path(
+            builds,
+            budget.costs(do_install, estimated))
+        needs = budget.requires(builds)
     context.lock()
     try:
-        for i in do_install:
-            if not aur.install(i,
-                               makepkg,
-                               cache_dirs,
-                               context,
-                               None):
+        journal.begin(context.get_cache_journal(),
+                      [x.name for x in do_install],
+                      is_install,
+                      updating,
+                      resumed=resumed,
+                      rebuild=rebuild)
+        failed = False
+        failed_bases = set()
+        for idx, group in enumerate(builds):
+            base = group[0].base
+            if context.executor.parallel:
+                done = set([x[0].base for x in builds[:idx]]) - failed_bases
+                _queue_ready(context,
+                             builds[idx:],
+                             done,
+                             needs,
+                             paths,
+                             queued,
+                             repo_pkgs,
+                             resumed,
+                             makepkg)
+            blocked = needs.get(base, set()) & failed_bases
+            if len(blocked) > 0:
+                # its (spooled) build would lack the failed packages
+                failed = True
+                failed_bases.add(base)
+                metrics.count(metrics.PACKAGES_FAILED, len(group))
+                log.console_error("skipping {} (failed: {})".format(
+                    ", ".join([x.name for x in group]),
+                    ", ".join(sorted(blocked))))
+                continue
+            build = []
+            for x in group:
+                if _install_repo(context, repo_pkgs, x):
+                    journal.installed([x.name])
+                else:
+                    build.append(x)
+            if len(build) == 0:
+                continue
+            outputs = [x.name for x in build]
+            files = None
+            if resumed:
+                files = journal.artifacts(resumed,
+                                          build[0].base,
+                                          build[0].version,
+                                          outputs)
+            if files:
+                log.console_output("installing built: {}".format(
+                    ", ".join(outputs)))
+                installed = context.pacman(["-U"] + files)
+                if installed:
+                    context.executor.built(build[0].base, files)
+            else:
+                installed = aur.install(build[0],
+                                        makepkg,
+                                        cache_dirs,
+                                        context,
+                                        None,
+                                        outputs=outputs)
+            if installed:
+                metrics.count(metrics.PACKAGES_INSTALLED, len(build))
+                journal.installed(outputs)
+            else:
+                failed = True
+                failed_bases.add(base)
+                metrics.count(metrics.PACKAGES_FAILED, len(build))
                 log.console_error(
-                    "error installing package: {}".format(i.name))
-                next_pkgs = []
-                after = False
-                for e in do_install:
-                    if e.name == i.name:
-                        after = True
-                        continue
-                    if not after:
-                        continue
-                    next_pkgs.append(e.name)
+                    "error installing package: {}".format(", ".join(outputs)))
+                next_pkgs = [x.name for g in builds[idx + 1:] for x in g]
                 if len(next_pkgs) > 0:
                     _confirm(context,
                              "attempt to continue",
                              next_pkgs,
                              default_yes=False)
+        if not failed:
+            journal.finish()
     except Exception as e:
         log.error("unexpected install error")
         log.error(e)
+    finally:
+        # also when exiting (declined to continue, interrupted)
+        context.executor.finish()
     context.unlock()
 
 
+def _queue_ready(context, pending, done, needs, paths, queued, repo_pkgs,
+                 resumed, makepkg):
+    """Queue the builds not waiting on other (planned) builds."""
+    for group in pending:
+        base = group[0].base
+        if base in queued or not needs[base] <= done:
+            continue
+        queued.add(base)
+        if resumed and journal.artifacts(resumed,
+                                         base,
+                                         group[0].version,
+                                         [x.name for x in group]):
+            continue
+        in_repo = [x for x in group
+                   if not aur.is_vcs(x.name) and
+                   repo.lookup(context.repo_dir,
+                               repo_pkgs,
+                               x.name,
+                               x.version) is not None]
+        if len(in_repo) == len(group):
+            continue
+        context.executor.submit(aur.build_job(group[0], makepkg, context),
+                                priority=paths[base],
+                                requires=needs[base])
+
+
+def _preflight(context, packages, makepkg):
+    """Reject (and report) planned packages that can not be installed."""
+    feasible, problems = preflight.check(context, packages, makepkg)
+    for pkg in packages:
+        if pkg.name in problems:
+            log.console_error("{} can not be installed: {}".format(
+                pkg.name, ", ".join(problems[pkg.name])))
+    if len(feasible) == 0:
+        log.console_error("no packages can be installed")
+        context.exiting(1)
+    if len(problems) > 0:
+        log.console_output("skipping {} package(s)".format(len(problems)))
+    return feasible
+
+
+def _time_budget(context, packages, durations, budget_seconds, resumed):
+    """Fit planned packages into a time budget (deferring the rest)."""
+    estimates = {}
+    explicit = set()
+    for pkg in packages:
+        if resumed and journal.artifacts(resumed,
+                                         pkg.base,
+                                         pkg.version,
+                                         [pkg.name]):
+            estimates[pkg.base] = 0
+        elif pkg.base not in estimates:
+            estimates[pkg.base] = history.estimate(durations,
+                                                   pkg.base,
+                                                   pkg.version)
+        local = context.db.get_pkg(pkg.name)
+        if local is None:
+            if pkg.name in context.targets:
+                explicit.add(pkg.name)
+        elif local.reason == _EXPLICIT:
+            explicit.add(pkg.name)
+    costs = budget.costs(packages, estimates)
+    selected, deferred = budget.select(packages,
+                                       costs,
+                                       budget_seconds,
+                                       explicit)
+    if len(deferred) > 0:
+        log.console_output("deferred (time budget {}):".format(
+            history.duration(budget_seconds)))
+        for pkg in deferred:
+            log.console_output("  {} {} (~{})".format(
+                pkg.name,
+                pkg.version,
+                history.duration(costs[pkg.base])))
+        log.console_output("{} package(s) deferred to a later run".format(
+            len(deferred)))
+    if len(selected) == 0:
+        log.console_output("nothing fits the time budget")
+    return selected
+
+
+def _eta(estimates):
+    """Get the estimated time of builds for display."""
+    known = [x for x in estimates if x is not None]
+    if len(known) == 0:
+        return ""
+    unknown = len(estimates) - len(known)
+    eta = history.duration(sum(known))
+    if unknown > 0:
+        eta = "{}+, {} without history".format(eta, unknown)
+    return " (estimated {})".format(eta)
+
+
+def _group_bases(packages):
+    """Group packages by package base (built once, in first-seen order)."""
+    builds = []
+    bases = {}
+    for p in packages:
+        if p.base in bases:
+            bases[p.base].append(p)
+            continue
+        bases[p.base] = [p]
+        builds.append(bases[p.base])
+    return builds
+
+
+def _install_repo(context, repo_pkgs, package):
+    """Install a package from the local repository (if available)."""
+    if aur.is_vcs(package.name):
+        return False
+    repo_file = repo.lookup(context.repo_dir,
+                            repo_pkgs,
+                            package.name,
+                            package.version)
+    if not repo_file:
+        return False
+    log.console_output("installing from repository: {}".format(
+        os.path.basename(repo_file)))
+    if context.pacman(["-U", repo_file]):
+        metrics.count(metrics.PACKAGES_INSTALLED)
+        context.executor.built(package.base, [repo_file])
+        return True
+    log.console_error("unable to install {}".format(repo_file))
+    return False
+
+
+@timing.timed("upgrades")
 def _upgrades(context):
     """Ordered upgrade."""
     pkgs = list(_do_query(context))
@@ -486,6 +912,83 @@ def _upgrades(context):
     _syncing(context, False, names, True)
 
 
+@timing.timed("rebuild needed")
+def _rebuild_needed(context):
+    """Rebuild AUR packages needing missing libraries/dependencies."""
+    pkgs = list(_do_query(context))
+    context.lock()
+    try:
+        entries = rdeps.index(context, pkgs)
+    except Exception as e:
+        log.error("unexpected index error")
+        log.error(e)
+        context.exiting(1)
+    context.unlock()
+    needed = rdeps.affected(context, entries)
+    if len(needed) == 0:
+        log.console_output("no rebuilds needed")
+        return
+    for name in sorted(needed):
+        if context.quiet:
+            log.info(name)
+        else:
+            log.info("{} ({})".format(name, ", ".join(needed[name])))
+    names = []
+    for d in aur.get_deps([x for x in pkgs if x.name in needed]):
+        if d.name in names:
+            continue
+        names.append(d.name)
+    _syncing(context, True, names, False, rebuild=sorted(needed))
+
+
+@timing.timed("fetch")
+def _fetch(context):
+    """Fetch (clone/pull) targets and their AUR dependencies."""
+    context.lock()
+    try:
+        results = aur.rpc_prewarm(context.targets, context)
+    except Exception as e:
+        log.error("unexpected fetch error")
+        log.error(e)
+        context.exiting(1)
+    context.unlock()
+    pkgs = [aur.rpc_package(x) for x in results]
+    names = [x.name for x in pkgs]
+    for target in context.targets:
+        if target not in names:
+            log.console_error("unknown AUR package: {}".format(target))
+            context.exiting(1)
+    bases = []
+    for pkg in pkgs:
+        if pkg.base not in bases:
+            bases.append(pkg.base)
+    log.console_output("fetching {} package bases".format(len(bases)))
+    fetched = aur.fetch_all(bases, context.fetch_dir)
+    counts = {}
+    for base in bases:
+        status, changes = fetched[base]
+        counts[status] = counts.get(status, 0) + 1
+        if status == aur.FETCH_UNCHANGED:
+            continue
+        if status == aur.FETCH_FAILED:
+            log.console_error("unable to fetch {}".format(base))
+            continue
+        if status == aur.FETCH_CLONED:
+            log.info("{} (new)".format(base))
+            continue
+        log.info("{} ({} new commit(s))".format(base, len(changes)))
+        if not context.quiet:
+            for change in changes:
+                log.info("  {}".format(change))
+    log.console_output(", ".join(["{} {}".format(counts.get(x, 0), x)
+                                  for x in [aur.FETCH_CLONED,
+                                            aur.FETCH_UPDATED,
+                                            aur.FETCH_UNCHANGED,
+                                            aur.FETCH_FAILED]]))
+    if counts.get(aur.FETCH_FAILED, 0) > 0:
+        context.exiting(1)
+
+
 def _remove(context):
     """Remove package."""
     p = list(_do_query(context))
@@ -509,14 +1012,24 @@ def _rpc_search(package_name, exact, context, include_deps=False):
     return aur.rpc_search(package_name, exact, context, include_deps)
 
 
+@timing.timed("search")
 def _search(context):
     """Perform a search."""
-    if len(context.targets) != 1:
-        log.console_error("please provide ONE target for search")
-        context.exiting(1)
-    for target in context.targets:
-        log.debug("searching for {}".format(target))
-        _rpc_search(target, False, context)
+    args = context.groups[sync_args.SYNC_UP_OPTIONS]
+    fields = [x for x in context.rpc_field.split(",") if x]
+    if context.info_verbose or \
+       (len(context.targets) == 1 and len(fields) == 1):
+        for target in context.targets:
+            log.debug("searching for {}".format(target))
+            _rpc_search(target, False, context)
+        return
+    log.debug("searching for {} by {}".format(context.targets, fields))
+    if not aur.rpc_search_many(context.targets,
+                               fields,
+                               args.search_union,
+                               context):
+        if not context.quiet:
+            log.console_output("no packages found")
 
 
 def _query(context):
@@ -529,10 +1042,124 @@ def _gone(context):
     _querying(context, True)
 
 
+def _serve_rpc(context):
+    """Run the caching rpc proxy."""
+    args = context.groups[svc_args.SERVICE_OPTIONS]
+    try:
+        proxy.serve(context, args.serve_rpc)
+    except ValueError:
+        log.console_error("invalid address: {}".format(args.serve_rpc))
+        context.exiting(1)
+
+
+def _build_worker(context):
+    """Claim and build jobs from a build spool."""
+    if context.root:
+        log.console_error("can not run a build worker as root (uses makepkg)")
+        context.exiting(1)
+    args = context.groups[svc_args.SERVICE_OPTIONS]
+    if not os.path.isdir(args.build_worker):
+        log.console_error("invalid build spool: {}".format(args.build_worker))
+        context.exiting(1)
+    chroot = args.worker_chroot
+    if chroot and not os.path.isdir(os.path.join(chroot, "root")):
+        log.console_error("invalid worker chroot: {}".format(chroot))
+        context.exiting(1)
+    worker = "{}.{}".format(socket.gethostname(), os.getpid())
+    executor.work(args.build_worker,
+                  worker,
+                  idle=args.worker_idle,
+                  chroot=chroot)
+
+
+@timing.timed("querying")
+def _query_upgrades(context):
+    """Perform query for aur packages with available upgrades."""
+    matched = False
+    pkgs = list(_do_query(context))
+    _prefetch(context, [x.name for x in pkgs])
+    for q in pkgs:
+        found = _rpc_search(q.name, True, context)
+        if not found or found.version == q.version:
+            continue
+        if aur.is_vcs(q.name):
+            continue
+        if context.quiet:
+            log.info(q.name)
+        else:
+            log.info("{} {} -> {}".format(q.name, q.version, found.version))
+        matched = True
+    if not matched and not context.quiet:
+        log.console_output("no upgrades found")
+
+
+@timing.timed("prewarm")
+def _prewarm(context):
+    """Prewarm rpc caching and git mirrors."""
+    if context.rpc_cache <= 0:
+        log.warn("rpc caching is disabled, only updating mirrors")
+    context.lock()
+    try:
+        names = []
+        for pkg in _do_query(context):
+            names.append(pkg.name)
+            for d in pkg.depends:
+                names.append(aur.deps_compare(d).pkg)
+        results = aur.rpc_prewarm(names, context)
+        log.console_output("refreshed {} packages".format(len(results)))
+        bases = sorted(set([x[aur.AUR_BASE] for x in results]))
+        for base in bases:
+            if not context.quiet:
+                log.update_progress("mirror: {}".format(base))
+            if not aur.mirror(base, context):
+                log.console_error("unable to mirror {}".format(base))
+        log.console_output("mirrored {} package bases".format(len(bases)))
+        _complete_refresh(context.cache_file(complete.INDEX, ext=""), None)
+    except Exception as e:
+        log.error("unexpected prewarm error")
+        log.error(e)
+    context.unlock()
+
+
+def _complete_refresh(index, source):
+    """Refresh the completion index."""
+    if not source:
+        source = aur.base_url() + complete.PACKAGES
+    log.debug("refreshing completion index from {}".format(source))
+    try:
+        count = complete.refresh(index, source)
+        log.console_output("indexed {} AUR package names".format(count))
+    except Exception as e:
+        log.error("unable to refresh completion index")
+        log.error(e)
+        return 1
+    return 0
+
+
+def _daemon(context):
+    """Run the resident daemon."""
+    args = context.groups[svc_args.SERVICE_OPTIONS]
+    pacman = context.pacman_config
+
+    def _request(argv, resident):
+        r_args, r_unknown, r_groups = _parse(argv)
+        return _validate_options(r_args,
+                                 r_unknown,
+                                 r_groups,
+                                 resident=resident)
+    path = args.socket
+    if not path:
+        path = context.cache_file(svc_args.SOCKET, ext="")
+    daemon.serve(context, pacman, path, _request)
+
+
+@timing.timed("querying")
 def _querying(context, gone):
     """Query for package information."""
     matched = False
-    for q in _do_query(context):
+    pkgs = list(_do_query(context))
+    _prefetch(context, [x.name for x in pkgs])
+    for q in pkgs:
         found = _rpc_search(q.name, True, context)
         if found:
             if gone:
@@ -573,15 +1200,19 @@ def _do_query(context):
                 yield pkg
 
 
-def main():
-    """Entry point."""
+def _parse(argv, init_log=False):
+    """Parse arguments, config, and argument groups."""
     cache_dir = config_args.get_default_cache()
     config_file = config_args.get_default_config()
     parser = common_args.build(config_file, cache_dir)
     sync_args.sync_up_options(parser)
     query_args.options(parser)
-    args, unknown = parser.parse_known_args()
-    log.init(args.verbose, args.trace, args.cache_dir)
+    svc_args.options(parser)
+    diag_args.options(parser)
+    cmp_args.options(parser)
+    args, unknown = parser.parse_known_args(argv)
+    if init_log:
+        log.init(args.verbose, args.trace, args.cache_dir)
     log.trace("files/folders")
     log.trace(args.cache_dir)
     log.trace(args.config)
@@ -608,6 +1239,33 @@ def main():
         g = {a.dest: getattr(args, a.dest, None) for a in group._group_actions}
         arg_groups[group.title] = argparse.Namespace(**g)
     log.trace(arg_groups)
+    return args, unknown, arg_groups
+
+
+def main():
+    """Entry point."""
+    argv = sys.argv[1:]
+    args, unknown, arg_groups = _parse(argv, init_log=True)
+    if args.complete is not None:
+        exit(complete.complete(args.cache_dir, args.complete))
+    if args.complete_refresh is not None:
+        index = os.path.join(args.cache_dir, complete.INDEX)
+        exit(_complete_refresh(index, args.complete_refresh))
+    if args.client:
+        path = args.socket
+        if not path:
+            path = os.path.join(args.cache_dir, svc_args.SOCKET)
+        exit(daemon.client(path, [x for x in argv if x != "--client"]))
+    if args.aur_url:
+        aur.set_url(args.aur_url)
+    if args.rpc_limit > 0:
+        ratelimit.enable(args.cache_dir, args.rpc_limit)
+    if args.profile:
+        timing.enable(args.cache_dir, dump_top=args.profile_dump)
+    if args.trace_file:
+        timing.trace(args.trace_file)
+    if args.metrics_file or args.metrics_textfile:
+        metrics.enable(args.metrics_file, args.metrics_textfile)
     _validate_options(args, unknown, arg_groups)
 
 
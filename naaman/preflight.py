@@ -0,0 +1,150 @@
+"""
+Preflight checks of planned packages.
+
+Before anything is cloned or built, planned AUR packages are checked
+against the local db, the sync dbs and each other (rpc Depends,
+MakeDepends, CheckDepends, Provides, Conflicts and Replaces). Packages
+that can not be installed (unsatisfiable dependencies, conflicts) are
+rejected along with the planned packages requiring them and the rest
+are ordered so planned dependencies are installed first.
+"""
+import naaman.aur as aur
+
+_NOCHECK = "--nocheck"
+
+
+def _names(entries):
+    """Get the (unversioned) names of dependency-like entries."""
+    return set([aur.deps_compare(x).pkg for x in entries])
+
+
+def _by_name(packages, field):
+    """Get the entries of a field by name (name -> (package, entry))."""
+    result = {}
+    for pkg in packages:
+        for entry in getattr(pkg, field):
+            name = aur.deps_compare(entry).pkg
+            if name not in result:
+                result[name] = []
+            result[name].append((pkg.name, entry))
+    return result
+
+
+def _conflicting(conflict, provided):
+    """Check if a (versioned) conflict matches provided names/versions."""
+    d = aur.deps_compare(conflict)
+    for version in provided.get(d.pkg, ()):
+        if aur.version_matches(version, d.op, d.version):
+            return True
+    return False
+
+
+def _satisfied(provided, depends):
+    """Check if a dependency is provided by any of the given indexes."""
+    for p in provided:
+        if aur.satisfied(p, depends):
+            return True
+    return False
+
+
+def _requires(pkg, checking=True):
+    """Get the dependencies needed to build/install a package."""
+    if not checking:
+        return pkg.depends + pkg.makedepends
+    return pkg.depends + pkg.makedepends + pkg.checkdepends
+
+
+def _conflicts(pkg, packages, installed, local):
+    """Get the conflicts of a planned package."""
+    reasons = []
+    own = aur.provided([pkg])
+    replaced = set(own.keys()) | _names(pkg.replaces)
+    planned = set([x.name for x in packages])
+    for conflict in pkg.conflicts:
+        name = aur.deps_compare(conflict).pkg
+        for other in packages:
+            if other.name == pkg.name:
+                continue
+            if _conflicting(conflict, aur.provided([other])):
+                reasons.append("conflicts with {}".format(other.name))
+        if name in replaced:
+            continue
+        for other, provided in installed.get(name, []):
+            if other != pkg.name and other not in planned and \
+                    _conflicting(conflict, provided):
+                reasons.append("conflicts with installed {}".format(other))
+    for name in own:
+        for other, conflict in local.get(name, []):
+            if other not in replaced and other not in planned and \
+                    _conflicting(conflict, own):
+                reasons.append("conflicts with installed {}".format(other))
+    return sorted(set(reasons))
+
+
+def _order(packages):
+    """Order packages so planned dependencies come first."""
+    result = []
+    visited = set()
+    by_name = {}
+    for pkg in packages:
+        for name in [pkg.name] + list(_names(pkg.provides)):
+            by_name[name] = pkg
+
+    def _visit(pkg):
+        if pkg.name in visited:
+            return
+        visited.add(pkg.name)
+        for d in _requires(pkg):
+            dep = by_name.get(aur.deps_compare(d).pkg, None)
+            if dep is not None:
+                _visit(dep)
+        result.append(pkg)
+    for pkg in packages:
+        _visit(pkg)
+    return result
+
+
+def check(context, packages, makepkg=()):
+    """Check planned packages (feasible packages in order, problems)."""
+    checking = _NOCHECK not in " ".join(makepkg).split()
+    local = context.db.pkgcache
+    available = [aur.provided(local)]
+    for db in context.get_syncdbs():
+        available.append(aur.provided(db.pkgcache))
+    installed = {}
+    for pkg in local:
+        for name, versions in aur.provided([pkg]).items():
+            if name not in installed:
+                installed[name] = []
+            installed[name].append((pkg.name, {name: versions}))
+    local_conflicts = _by_name(local, "conflicts")
+    planned = aur.provided(packages)
+    problems = {}
+    for pkg in packages:
+        reasons = []
+        if not context.skip_deps:
+            for d in _requires(pkg, checking):
+                if not _satisfied(available + [planned], d):
+                    reasons.append("requires {}".format(d))
+        reasons += _conflicts(pkg, packages, installed, local_conflicts)
+        if len(reasons) > 0:
+            problems[pkg.name] = reasons
+    # reject the packages requiring (only) rejected packages
+    everything = planned
+    changed = True
+    while changed:
+        changed = False
+        feasible = [x for x in packages if x.name not in problems]
+        planned = aur.provided(feasible)
+        for pkg in feasible:
+            for d in _requires(pkg, checking):
+                if not aur.satisfied(everything, d) or \
+                   _satisfied(available + [planned], d):
+                    continue
+                if pkg.name not in problems:
+                    problems[pkg.name] = []
+                problems[pkg.name].append(
+                    "requires {} (can not be installed)".format(d))
+                changed = True
+    feasible = [x for x in packages if x.name not in problems]
+    return _order(feasible), problems
@@ -0,0 +1,266 @@
+"""
+Caching AUR rpc proxy.
+
+Serves the /rpc (v5) info and search endpoints to many hosts on top of
+naaman's rpc cache so a fleet makes one upstream request per package (per
+cache period) instead of one per host. Concurrent requests for the same
+package/search are coalesced into a single upstream request. Any other
+path (e.g. git clones) is redirected to the upstream AUR. At most
+_MAX_CACHED results are kept in memory (expired, then oldest, dropped).
+"""
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.parse
+import naaman.aur as aur
+import naaman.logger as log
+
+_RPC = "/rpc"
+_INFO = "info"
+_SEARCH = "search"
+_ENCODING = "utf-8"
+_MISSING = object()
+_MAX_CACHED = 10000
+
+
+def _response(req_type, results, error=None):
+    """Get an rpc (v5) response object."""
+    obj = {}
+    obj["version"] = 5
+    obj["type"] = req_type
+    obj["resultcount"] = len(results)
+    obj["results"] = results
+    if error is not None:
+        obj["error"] = error
+    return obj
+
+
+class _Inflight(object):
+    """An upstream request being made (waited on by coalesced requests)."""
+
+    def __init__(self):
+        """Init the request."""
+        self.done = threading.Event()
+        self.error = None
+        self.value = None
+
+
+class RpcProxy(object):
+    """Shared, coalescing rpc cache."""
+
+    def __init__(self, context):
+        """Init the proxy (cache period from the context)."""
+        self._context = context
+        self._ttl = context.rpc_cache * 60
+        self._cache = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        """Get an info result from the rpc cache files."""
+        if key[0] != _INFO:
+            return _MISSING
+        cache_file = aur.rpc_cache_file(key[1], self._context)
+        if not os.path.exists(cache_file):
+            return _MISSING
+        stamp = os.path.getmtime(cache_file)
+        if time.time() - stamp > self._ttl:
+            return _MISSING
+        try:
+            with open(cache_file, 'r') as f:
+                results = json.loads(f.read()).get("results", [])
+        except Exception as e:
+            log.error("unable to read rpc cache")
+            log.error(e)
+            return _MISSING
+        result = None
+        if len(results) > 0:
+            result = results[0]
+        self._store(key, result, stamp)
+        return result
+
+    def _store(self, key, value, stamp):
+        """Cache a value in memory."""
+        if self._ttl <= 0:
+            return
+        self._cache.pop(key, None)
+        if len(self._cache) >= _MAX_CACHED:
+            now = time.time()
+            for k in [k for k, v in self._cache.items()
+                      if now - v[0] > self._ttl]:
+                del self._cache[k]
+        while len(self._cache) >= _MAX_CACHED:
+            # insertion ordered, the first entry is the oldest
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = (stamp, value)
+
+    def _cached(self, key):
+        """Get a fresh cached value (or _MISSING)."""
+        if self._ttl <= 0:
+            return _MISSING
+        cached = self._cache.get(key, None)
+        if cached is None:
+            return self._file(key)
+        stamp, value = cached
+        if time.time() - stamp > self._ttl:
+            del self._cache[key]
+            return _MISSING
+        return value
+
+    def _get(self, keys, fetch):
+        """Get values by key, fetching (once) those not cached."""
+        values = {}
+        fetching = []
+        waiting = []
+        with self._lock:
+            for key in keys:
+                if key in values or key in fetching:
+                    continue
+                value = self._cached(key)
+                if value is not _MISSING:
+                    values[key] = value
+                elif key in self._inflight:
+                    waiting.append((key, self._inflight[key]))
+                else:
+                    self._inflight[key] = _Inflight()
+                    fetching.append(key)
+        if len(fetching) > 0:
+            error = None
+            try:
+                fetched = fetch(fetching)
+                now = time.time()
+                with self._lock:
+                    for key in fetching:
+                        values[key] = fetched.get(key, None)
+                        self._inflight[key].value = values[key]
+                        self._store(key, values[key], now)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in fetching:
+                        inflight = self._inflight.pop(key)
+                        inflight.error = error
+                        inflight.done.set()
+        for key, inflight in waiting:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            values[key] = inflight.value
+        return values
+
+    def _fetch_info(self, keys):
+        """Get info results from upstream (batched)."""
+        names = [x[1] for x in keys]
+        fetched = {}
+        while len(names) > 0:
+            batch = names[0:aur.INFO_BATCH]
+            names = names[aur.INFO_BATCH:]
+            found = aur.rpc_info(batch)
+            for name in batch:
+                result = found.get(name, None)
+                fetched[(_INFO, name)] = result
+                try:
+                    aur.cache_info(name, result, self._context)
+                except Exception as e:
+                    log.error("unable to write rpc cache")
+                    log.error(e)
+        return fetched
+
+    def _fetch_search(self, keys):
+        """Get search results from upstream."""
+        fetched = {}
+        for key in keys:
+            fetched[key] = aur.rpc_search_results(key[1], key[2])
+        return fetched
+
+    def info(self, package_names):
+        """Get info results for packages."""
+        keys = [(_INFO, x) for x in package_names]
+        values = self._get(keys, self._fetch_info)
+        results = []
+        for key in keys:
+            if values[key] is not None and values[key] not in results:
+                results.append(values[key])
+        return results
+
+    def search(self, field, term):
+        """Get search results for a term (by field)."""
+        key = (_SEARCH, field, term)
+        return self._get([key], self._fetch_search)[key] or []
+
+    def rpc(self, query):
+        """Handle an rpc query string, returns (status, response)."""
+        q = urllib.parse.parse_qs(query)
+        req_type = q.get("type", [""])[0]
+        if req_type in [_INFO, "multiinfo"]:
+            names = q.get("arg[]", []) + q.get("arg", [])
+            return 200, _response("multiinfo", self.info(names))
+        if req_type == _SEARCH:
+            field = q.get("by", [aur.RPC_NAME_DESC])[0]
+            if field not in aur.RPC_FIELDS:
+                return 400, _response("error", [], "Incorrect by field")
+            term = q.get("arg", [""])[0]
+            return 200, _response(_SEARCH, self.search(field, term))
+        return 400, _response("error", [], "Incorrect request type")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Handle proxy requests."""
+
+    def do_GET(self):
+        """Serve rpc requests, redirect anything else upstream."""
+        url = urllib.parse.urlparse(self.path)
+        if url.path != _RPC:
+            self.send_response(302)
+            self.send_header("Location", aur.base_url() + self.path)
+            self.end_headers()
+            return
+        try:
+            status, obj = self.server.proxy.rpc(url.query)
+        except Exception as e:
+            log.error("upstream rpc failed")
+            log.error(e)
+            status, obj = 502, _response("error", [], "upstream failed")
+        body = json.dumps(obj).encode(_ENCODING)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        """Log requests (debug only)."""
+        log.debug(fmt % args)
+
+
+def parse_address(address):
+    """Parse a [host:]port listen address."""
+    host = ""
+    port = address
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def server(context, address):
+    """Create a (threaded) proxy server for a [host:]port address."""
+    httpd = http.server.ThreadingHTTPServer(parse_address(address),
+                                            _Handler)
+    httpd.proxy = RpcProxy(context)
+    return httpd
+
+
+def serve(context, address):
+    """Serve rpc requests until interrupted."""
+    httpd = server(context, address)
+    host, port = httpd.server_address[0:2]
+    log.console_output("rpc proxy listening on {}:{}".format(host, port))
+    log.console_output("upstream: {}".format(aur.base_url()))
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
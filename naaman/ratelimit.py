@@ -0,0 +1,139 @@
+"""
+AUR rpc request budget.
+
+The AUR limits rpc requests per (source) address per day. Requests made
+are tracked per window in the cache directory (shared across runs) so
+naaman can back off before the limit is hit: under pressure lookups are
+batched and cached longer, and as the budget runs out only install
+critical lookups (sync/dependency resolution) are made so upgrades can
+finish. HTTP 429 (Retry-After) responses block requests until then.
+"""
+import json
+import os
+import threading
+import time
+import naaman.logger as log
+
+CRITICAL = "critical"
+NORMAL = "normal"
+WINDOW = 24 * 60 * 60
+_FILE = "ratelimit.json"
+_PRESSURE = 0.5
+_RESERVE = 0.1
+_TTL_FACTOR = 6
+_MAX_WAIT = 60
+_STATE = {}
+_LOCK = threading.Lock()
+_PATH = "path"
+_LIMIT = "limit"
+_PRIORITY = "priority"
+_START = "start"
+_COUNT = "count"
+_BLOCKED = "blocked"
+
+
+class Limited(Exception):
+    """The rpc request budget does not allow a request."""
+
+
+def enable(cache_dir, limit):
+    """Track the request budget (limit per window) in the cache dir."""
+    _STATE[_PATH] = os.path.join(cache_dir, _FILE)
+    _STATE[_LIMIT] = limit
+    _STATE[_PRIORITY] = NORMAL
+    _STATE[_START] = time.time()
+    _STATE[_COUNT] = 0
+    _STATE[_BLOCKED] = 0
+    if not os.path.exists(_STATE[_PATH]):
+        return
+    try:
+        with open(_STATE[_PATH], 'r') as f:
+            saved = json.loads(f.read())
+        if time.time() - saved[_START] < WINDOW:
+            _STATE[_START] = saved[_START]
+            _STATE[_COUNT] = saved[_COUNT]
+        _STATE[_BLOCKED] = saved.get(_BLOCKED, 0)
+    except Exception as e:
+        log.error("unable to read rpc budget")
+        log.error(e)
+
+
+def _enabled():
+    """Check if the budget is tracked."""
+    return _STATE.get(_LIMIT, 0) > 0
+
+
+def _save():
+    """Save the budget state."""
+    path = _STATE[_PATH]
+    if not os.path.isdir(os.path.dirname(path)):
+        return
+    obj = {k: _STATE[k] for k in [_START, _COUNT, _BLOCKED]}
+    try:
+        tmp = path + ".{}".format(os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(obj))
+        os.rename(tmp, path)
+    except Exception as e:
+        log.error("unable to save rpc budget")
+        log.error(e)
+
+
+def priority(level):
+    """Set the priority of the requests being made."""
+    _STATE[_PRIORITY] = level
+
+
+def pressure():
+    """Check if the budget is under pressure."""
+    if not _enabled():
+        return False
+    return _STATE[_COUNT] >= _STATE[_LIMIT] * _PRESSURE
+
+
+def ttl(minutes):
+    """Get the rpc cache period (minutes) to use for the budget."""
+    if minutes > 0 and pressure():
+        log.debug("rpc budget pressure, extending cache")
+        return minutes * _TTL_FACTOR
+    return minutes
+
+
+def acquire():
+    """Take a request from the budget (waits/raises when limited)."""
+    with _LOCK:
+        critical = _STATE.get(_PRIORITY, NORMAL) == CRITICAL
+        wait = _STATE.get(_BLOCKED, 0) - time.time()
+        if wait > 0:
+            if not critical or wait > _MAX_WAIT:
+                raise Limited("rpc requests blocked for {}s".format(
+                    int(wait)))
+            log.console_output("rpc rate limited, waiting {}s".format(
+                int(wait)))
+            time.sleep(wait)
+        if not _enabled():
+            return
+        if time.time() - _STATE[_START] >= WINDOW:
+            _STATE[_START] = time.time()
+            _STATE[_COUNT] = 0
+        limit = _STATE[_LIMIT]
+        if _STATE[_COUNT] >= limit:
+            raise Limited("rpc request budget ({}) used".format(limit))
+        if not critical and _STATE[_COUNT] >= limit * (1 - _RESERVE):
+            raise Limited("rpc request budget reserved for installs")
+        _STATE[_COUNT] += 1
+        _save()
+
+
+def blocked(retry_after):
+    """Block requests for a period (seconds) after a 429."""
+    seconds = _MAX_WAIT
+    try:
+        seconds = int(retry_after)
+    except (TypeError, ValueError):
+        log.debug("invalid retry-after: {}".format(retry_after))
+    with _LOCK:
+        _STATE[_BLOCKED] = time.time() + seconds
+        if _enabled():
+            _save()
+    return seconds
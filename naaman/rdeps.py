@@ -0,0 +1,144 @@
+"""
+Reverse-dependency index of installed AUR packages.
+
+Indexes which shared libraries (DT_NEEDED sonames of the package files)
+and which packages (local db depends) each installed AUR package needs,
+kept in the cache directory per installed version so only changed
+packages are read again. Packages needing a library that is no longer
+installed (e.g. after a soname bump) or a dependency that is no longer
+provided are the ones to rebuild.
+"""
+import json
+import os
+import stat
+import naaman.aur as aur
+import naaman.elf as elf
+import naaman.logger as log
+
+_FILE = "rdeps"
+_EXT = ".json"
+_VERSION = "version"
+_NEEDED = "needed"
+_DEPENDS = "depends"
+_LIB_DIRS = ["usr/lib", "usr/lib32", "usr/lib64", "lib", "lib64"]
+
+
+def _file(context):
+    """Get the index file."""
+    return context.cache_file(_FILE, ext=_EXT)
+
+
+def _package(root, package):
+    """Get the needed (not self-provided) sonames of a package."""
+    needed = set()
+    own = set()
+    for f in package.files:
+        path = os.path.join(root, f[0])
+        try:
+            mode = os.lstat(path).st_mode
+        except OSError:
+            continue
+        if ".so" in os.path.basename(path):
+            own.add(os.path.basename(path))
+        if not stat.S_ISREG(mode):
+            continue
+        try:
+            needed.update(elf.needed(path))
+        except Exception as e:
+            log.debug("unable to read {}".format(path))
+            log.debug(e)
+    return sorted(needed - own)
+
+
+def index(context, packages):
+    """Index (and cache) what installed AUR packages need."""
+    cached = {}
+    index_file = _file(context)
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'r') as f:
+                cached = json.loads(f.read())
+        except Exception as e:
+            log.error("unable to read reverse-dependency index")
+            log.error(e)
+    root = context.handle.root
+    result = {}
+    for pkg in packages:
+        entry = cached.get(pkg.name, None)
+        if entry is None or entry[_VERSION] != pkg.version:
+            log.debug("indexing {}".format(pkg.name))
+            entry = {}
+            entry[_VERSION] = pkg.version
+            entry[_NEEDED] = _package(root, pkg)
+            entry[_DEPENDS] = list(pkg.depends)
+        result[pkg.name] = entry
+    tmp = index_file + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(result, sort_keys=True))
+    os.rename(tmp, index_file)
+    return result
+
+
+def reverse(entries):
+    """Get the packages needing each soname/dependency."""
+    result = {}
+    for name in sorted(entries):
+        entry = entries[name]
+        for needs in entry[_NEEDED] + entry[_DEPENDS]:
+            if needs not in result:
+                result[needs] = []
+            result[needs].append(name)
+    return result
+
+
+def _lib_dirs(root):
+    """Get the library directories (including ld.so.conf entries)."""
+    dirs = list(_LIB_DIRS)
+    configs = [os.path.join(root, "etc", "ld.so.conf")]
+    conf_dir = os.path.join(root, "etc", "ld.so.conf.d")
+    if os.path.isdir(conf_dir):
+        configs += [os.path.join(conf_dir, x)
+                    for x in sorted(os.listdir(conf_dir))]
+    for conf in configs:
+        if not os.path.isfile(conf):
+            continue
+        with open(conf, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("/"):
+                    dirs.append(line.lstrip("/"))
+    return dirs
+
+
+def _library(root, dirs, soname):
+    """Check if a library is installed."""
+    for lib in dirs:
+        if os.path.exists(os.path.join(root, lib, soname)):
+            return True
+    return False
+
+
+def affected(context, entries):
+    """Get the indexed packages needing a rebuild (name -> reasons)."""
+    root = context.handle.root
+    provided = aur.provided(context.db.pkgcache)
+    dirs = _lib_dirs(root)
+    result = {}
+    for needs, names in reverse(entries).items():
+        # the same entry can be a soname of one package, a dependency of
+        # another (or both)
+        reasons = []
+        if len([x for x in names if needs in entries[x][_NEEDED]]) > 0 and \
+           not _library(root, dirs, needs):
+            reasons.append((_NEEDED, "missing {}".format(needs)))
+        if len([x for x in names if needs in entries[x][_DEPENDS]]) > 0 and \
+           not aur.satisfied(provided, needs):
+            reasons.append((_DEPENDS, "unsatisfied {}".format(needs)))
+        for name in sorted(set(names)):
+            for field, reason in reasons:
+                if needs not in entries[name][field]:
+                    continue
+                if name not in result:
+                    result[name] = []
+                result[name].append(reason)
+    return result
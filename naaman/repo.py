@@ -0,0 +1,90 @@
+"""
+Local pacman (binary) repository of built packages.
+
+Packages built by naaman are added to a repository database (via
+repo-add) so other hosts can consume them as a normal [naaman] repository
+and naaman can skip building versions that are already available.
+"""
+import os
+import shutil
+import tarfile
+import naaman.consts as cst
+import naaman.logger as log
+import naaman.shell as sh
+
+REPO_NAME = cst.NAME
+_DB_EXT = ".db.tar.gz"
+_DESC = "desc"
+_NAME = "%NAME%"
+_VERSION = "%VERSION%"
+_FILENAME = "%FILENAME%"
+
+
+def db_file(repo_dir):
+    """Get the repository database file."""
+    return os.path.join(repo_dir, REPO_NAME + _DB_EXT)
+
+
+def _parse_desc(text):
+    """Parse a repository desc entry."""
+    values = {}
+    key = None
+    for line in text.split("\n"):
+        line = line.strip()
+        if len(line) == 0:
+            key = None
+            continue
+        if line.startswith("%") and line.endswith("%"):
+            key = line
+            continue
+        if key is not None and key not in values:
+            values[key] = line
+    return values
+
+
+def packages(repo_dir):
+    """Get packages in the repository (name -> (version, file))."""
+    result = {}
+    db = db_file(repo_dir)
+    if not os.path.exists(db):
+        return result
+    with tarfile.open(db, "r:*") as tar:
+        for member in tar.getmembers():
+            if not member.isfile():
+                continue
+            if os.path.basename(member.name) != _DESC:
+                continue
+            desc = _parse_desc(tar.extractfile(member).read().decode("utf-8"))
+            if _NAME not in desc or _VERSION not in desc:
+                log.debug("invalid repo entry {}".format(member.name))
+                continue
+            result[desc[_NAME]] = (desc[_VERSION], desc.get(_FILENAME, None))
+    return result
+
+
+def lookup(repo_dir, repo_packages, name, version):
+    """Find the package file of an exact version in the repository."""
+    if name not in repo_packages:
+        return None
+    vers, file_name = repo_packages[name]
+    if vers != version or file_name is None:
+        return None
+    path = os.path.join(repo_dir, file_name)
+    if not os.path.exists(path):
+        log.debug("missing repo file {}".format(path))
+        return None
+    return path
+
+
+def add(repo_dir, artifacts):
+    """Add built package files to the repository."""
+    if len(artifacts) == 0:
+        return True
+    added = []
+    for a in artifacts:
+        dest = os.path.join(repo_dir, os.path.basename(a))
+        log.debug("adding {} to repo".format(dest))
+        shutil.copyfile(a, dest)
+        added.append(dest)
+    return sh.command(["repo-add", "--quiet", "--remove", db_file(repo_dir)]
+                      + added)
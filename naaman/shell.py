@@ -5,8 +5,10 @@ Output to the shell in certain formats, executing shell commands,
 getting response from the user in the shell (as needed)
 """
 import subprocess
+import shlex
 import os
 import naaman.logger as log
+import naaman.timing as timing
 from datetime import datetime
 
 _BASH_WRAPPER = r"""#!/bin/bash
@@ -28,18 +30,28 @@ vers="$(_section 'pkgver')-$(_section 'pkgrel')"
 _PKGVER = _SRCINFO + r"""[[ "$vers" == '{VERSION}' ]] && exit 1"""
 
 # handle installing some or all packages
-_PACMAN_U = "{SUDO}pacman -U"
+_PACMAN_U = "{SUDO}pacman{CONFIG} -U"
 _INSTALL_ALL = _PACMAN_U + " *.pkg.tar.xz"
+# (in one transaction, split packages may depend on each other's version)
 _INSTALL = _SRCINFO + r"""
-fname="{PKGNAME}-${vers}-{ARCH}.pkg.tar.xz"
-if [ -e "$fname" ]; then
-    """ + _PACMAN_U + """ $fname
+files=""
+for pkgname in {PKGNAMES}; do
+    for arch in any x86_64; do
+        fname="$pkgname-${vers}-$arch.pkg.tar.xz"
+        if [ -e "$fname" ]; then
+            files="$files $fname"
+        fi
+    done
+done
+if [ -n "$files" ]; then
+    """ + _PACMAN_U + """ $files
     if [ $? -ne 0 ]; then
         exit 1
     fi
 fi
 """
-_ARCH_INSTALLS = [_INSTALL.replace("{ARCH}", x) for x in ["any", "x86_64"]]
+_PKG_EXT = ".pkg.tar."
+_SIG_EXT = ".sig"
 
 # If there are cache files, cache them
 _CACHE = r"""
@@ -66,58 +78,72 @@ fi
 class InstallPkg(object):
     """Wrapper for installing packages (via makepkg)."""
 
-    def __init__(self, sudo, workingdir):
+    def __init__(self, sudo, workingdir, config=None):
         """Init a package install."""
         self._workdir = workingdir
         self._sudo = ""
         if sudo:
             self._sudo = "sudo "
+        self._config = ""
+        if config:
+            self._config = " --config {}".format(shlex.quote(config))
         self._timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         self._idx = 0
 
-    def makepkg(self, args):
-        """Run makepkg."""
-        self._log_bash("makepkg")
-        return self._run(["makepkg {}".format(" ".join(args))])
-
-    def install(self, name):
-        """Install a package."""
-        self._log_bash("install")
-        scripts = []
-        if name is None:
-            scripts = [_INSTALL_ALL]
-        else:
-            scripts = [x.replace("{PKGNAME}", name) for x in _ARCH_INSTALLS]
-        scripts = [x.replace("{SUDO}", self._sudo) for x in scripts]
-        return self._run(scripts)
+    def makepkg(self, args, srcdest=None):
+        """Run makepkg, optionally with a managed SRCDEST."""
+        with self._bash("makepkg"):
+            cmd = "makepkg {}".format(" ".join(args))
+            if srcdest:
+                cmd = "SRCDEST={} {}".format(shlex.quote(srcdest), cmd)
+            return self._run([cmd])
+
+    def install(self, names):
+        """Install packages (all packages if no names)."""
+        with self._bash("install"):
+            scripts = []
+            if names is None:
+                scripts = [_INSTALL_ALL]
+            else:
+                pkgnames = " ".join([shlex.quote(x) for x in names])
+                scripts = [_INSTALL.replace("{PKGNAMES}", pkgnames)]
+            scripts = [x.replace("{SUDO}", self._sudo) for x in scripts]
+            scripts = [x.replace("{CONFIG}", self._config) for x in scripts]
+            return self._run(scripts)
 
     def version(self, vers):
         """Check the makepkg output version."""
-        self._log_bash("version")
-        if vers is None:
-            return True
-        return self._run([_PKGVER.replace("{VERSION}", vers)])
+        with self._bash("version"):
+            if vers is None:
+                return True
+            return self._run([_PKGVER.replace("{VERSION}", vers)])
 
     def is_split(self):
         """Indicate if split package."""
-        self._log_bash("split")
-        return not self._run([_SPLIT])
+        with self._bash("split"):
+            return not self._run([_SPLIT])
 
     def cache(self, dirs):
         """Cache output files."""
-        self._log_bash("cache")
-        if dirs is None or len(dirs.strip()) == 0:
-            return True
-        scripts = []
-        cache_cmd = _CACHE.format("{}", self._sudo, "{}", "{}")
-        for f in ["xz"]:
-            for cd in dirs.split(" "):
-                scripts.append(cache_cmd.format(f, f, cd))
-        return self._run(scripts)
-
-    def _log_bash(self, name):
-        """Log that a bash step is running."""
+        with self._bash("cache"):
+            if dirs is None or len(dirs.strip()) == 0:
+                return True
+            scripts = []
+            cache_cmd = _CACHE.format("{}", self._sudo, "{}", "{}")
+            for f in ["xz"]:
+                for cd in dirs.split(" "):
+                    scripts.append(cache_cmd.format(f, f, cd))
+            return self._run(scripts)
+
+    def artifacts(self):
+        """Get the package files produced by makepkg."""
+        return artifacts(self._workdir)
+
+    def _bash(self, name):
+        """Log (and time) that a bash step is running."""
         log.debug("bash: {}".format(name))
+        return timing.phase("bash: {}".format(name),
+                            args={"workdir": self._workdir})
 
     def _run(self, scripts):
         """Run a set of scripts."""
@@ -133,9 +159,25 @@ class InstallPkg(object):
 
     def git(self, source, dest, path):
         """Git clone an AUR package."""
-        log.debug("git clone")
-        return command(["git", "clone", "--depth=1", source, dest],
-                       workdir=path)
+        with self._bash("git"):
+            cmd = ["git", "clone"]
+            if not os.path.isdir(source):
+                cmd.append("--depth=1")
+            return command(cmd + [source, dest], workdir=path)
+
+    def update(self, source):
+        """Update a (workspace) clone in place to the source revision."""
+        with self._bash("update"):
+            if not command(["git", "fetch", source], workdir=self._workdir):
+                return False
+            return command(["git", "reset", "--hard", "FETCH_HEAD"],
+                           workdir=self._workdir)
+
+    def clear(self):
+        """Remove previously built package files."""
+        for f in self.artifacts():
+            log.debug("removing {}".format(f))
+            os.remove(f)
 
     def _bashpkg(self, file_name, cmd):
         """Do some shell work in bash."""
@@ -155,10 +197,83 @@ class InstallPkg(object):
 
 def command(command, shell=False, workdir=None):
     """Execute a subprocess command."""
-    res = subprocess.call(command, shell=shell, cwd=workdir)
+    name = os.path.basename(command[0].split(" ")[0])
+    with timing.phase("command: {}".format(name),
+                      args={"command": command, "workdir": workdir}):
+        res = subprocess.call(command, shell=shell, cwd=workdir)
+    return res == 0
+
+
+def logged(command, log_file, workdir=None):
+    """Execute a subprocess command (output appended to a log file)."""
+    name = os.path.basename(command[0])
+    with timing.phase("command: {}".format(name),
+                      args={"command": command, "workdir": workdir}):
+        with open(log_file, 'a') as f:
+            f.write("==> {}\n".format(" ".join(command)))
+            f.flush()
+            try:
+                res = subprocess.call(command,
+                                      cwd=workdir,
+                                      stdout=f,
+                                      stderr=subprocess.STDOUT)
+            except OSError as e:
+                f.write("{}\n".format(e))
+                return False
     return res == 0
 
 
+def artifacts(path):
+    """Get the package files (produced by makepkg) in a directory."""
+    files = []
+    for f in sorted(os.listdir(path)):
+        if _PKG_EXT in f and not f.endswith(_SIG_EXT):
+            files.append(os.path.join(path, f))
+    return files
+
+
+def mirror(source, path):
+    """Clone or update a (bare) git mirror."""
+    if os.path.exists(path):
+        log.debug("updating mirror {}".format(path))
+        return command(["git", "remote", "update", "--prune"], workdir=path)
+    log.debug("creating mirror {}".format(path))
+    return command(["git", "clone", "--mirror", source, path])
+
+
+def _git_output(args, path):
+    """Get the output of a git command (None on failure)."""
+    try:
+        out = subprocess.check_output(["git"] + args,
+                                      cwd=path,
+                                      stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, OSError) as e:
+        log.debug(e)
+        return None
+    return out.decode("utf-8").strip()
+
+
+def head(path):
+    """Get the HEAD commit of a git clone."""
+    return _git_output(["rev-parse", "HEAD"], path)
+
+
+def remote_head(source):
+    """Get the HEAD commit of a (remote) git repository."""
+    out = _git_output(["ls-remote", source, "HEAD"], None)
+    if not out:
+        return None
+    return out.split()[0]
+
+
+def changes(path, old, new):
+    """Get the commits (one line each) between two revisions."""
+    out = _git_output(["log", "--oneline", "{}..{}".format(old, new)], path)
+    if not out:
+        return []
+    return out.split("\n")
+
+
 def confirm(message, display, default_yes, must_confirm):
     """Confirm package changes."""
     exiting = None
@@ -0,0 +1,126 @@
+"""
+Managed makepkg source cache (SRCDEST).
+
+Downloaded sources (tarballs, vcs clones) are kept per package base in a
+persistent SRCDEST so rebuilds and vcs checks do not download them again.
+An index tracks when each base was last used, its size, and its packages
+so the cache can be capped (least recently used first) and pruned of
+packages that are no longer installed.
+"""
+import json
+import os
+import shutil
+import time
+import naaman.logger as log
+
+_INDEX = "index.json"
+_USED = "used"
+_SIZE = "size"
+_PACKAGES = "packages"
+_MB = 1024 * 1024
+
+
+def _index_file(context):
+    """Get the index file."""
+    return os.path.join(context.get_cache_sources(), _INDEX)
+
+
+def _load(context):
+    """Load the sources index."""
+    index_file = _index_file(context)
+    if not os.path.exists(index_file):
+        return {}
+    try:
+        with open(index_file, 'r') as f:
+            return json.loads(f.read())
+    except Exception as e:
+        log.error("unable to read sources index")
+        log.error(e)
+        return {}
+
+
+def _save(context, index):
+    """Save the sources index."""
+    index_file = _index_file(context)
+    tmp = index_file + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(index, sort_keys=True))
+    os.rename(tmp, index_file)
+
+
+def tree_size(path):
+    """Get the size (bytes) of a directory tree."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _remove(context, index, base):
+    """Remove a package base's sources."""
+    path = os.path.join(context.get_cache_sources(), base)
+    log.debug("removing sources {}".format(path))
+    if os.path.exists(path):
+        shutil.rmtree(path, ignore_errors=True)
+    if base in index:
+        del index[base]
+
+
+def srcdest(context, base, package_names):
+    """Get (and mark as used) the SRCDEST for a package base."""
+    path = os.path.join(context.get_cache_sources(), base)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    index = _load(context)
+    entry = index.get(base, {})
+    entry[_USED] = time.time()
+    packages = set(entry.get(_PACKAGES, []))
+    packages.update(package_names)
+    entry[_PACKAGES] = sorted(packages)
+    entry[_SIZE] = entry.get(_SIZE, 0)
+    index[base] = entry
+    _save(context, index)
+    return path
+
+
+def update(context, base):
+    """Record a package base's source size and evict over the cap."""
+    index = _load(context)
+    if base in index:
+        path = os.path.join(context.get_cache_sources(), base)
+        index[base][_SIZE] = tree_size(path)
+    cap = context.sources_size * _MB
+    total = sum([x[_SIZE] for x in index.values()])
+    log.debug("sources: {} of {} bytes".format(total, cap))
+    for name in sorted(index.keys(), key=lambda x: index[x][_USED]):
+        if total <= cap:
+            break
+        if name == base:
+            continue
+        log.console_output("evicting sources: {}".format(name))
+        total -= index[name][_SIZE]
+        _remove(context, index, name)
+    _save(context, index)
+
+
+def unused(context):
+    """Get package bases with no installed packages."""
+    installed = set([x.name for x in context.db.pkgcache])
+    index = _load(context)
+    bases = []
+    for base in sorted(index.keys()):
+        if len(installed & set(index[base][_PACKAGES])) == 0:
+            bases.append(base)
+    return bases
+
+
+def prune(context, bases):
+    """Remove the sources of package bases."""
+    index = _load(context)
+    for base in bases:
+        _remove(context, index, base)
+    _save(context, index)
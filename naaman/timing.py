@@ -0,0 +1,162 @@
+"""
+Timing/profiling of naaman operations.
+
+Phases (rpc requests, dependency resolution, builds, shell commands) are
+timed when profiling is enabled and reported at exit, optionally with a
+cProfile (.pstats) and tracemalloc (top-N) dump into the cache directory.
+
+Phases can also be recorded as nested spans (chrome trace-event format)
+to view a whole run in a timeline viewer (e.g. chrome://tracing, perfetto).
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import naaman.logger as log
+
+_PHASES = {}
+_EVENTS = []
+_STATE = {}
+_LOCK = threading.Lock()
+_ENABLED = "enabled"
+_TRACE = "trace"
+_START = "start"
+_PROFILER = "profiler"
+_TOP = "top"
+_CACHE = "cache"
+_CALLS = 0
+_SECONDS = 1
+_HEADER = "{:<32} {:>8} {:>10} {:>6}"
+_ROW = "{:<32} {:>8} {:>10.3f} {:>6.1f}"
+
+
+def _start():
+    """Start recording phases."""
+    if _STATE.get(_ENABLED, False):
+        return
+    _STATE[_ENABLED] = True
+    _STATE[_START] = time.perf_counter()
+
+
+def enable(cache_dir, dump_top=None):
+    """Enable phase timing (and profiling dumps with top-N)."""
+    _start()
+    _STATE[_CACHE] = cache_dir
+    if dump_top is not None:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _STATE[_PROFILER] = profiler
+        _STATE[_TOP] = dump_top
+    atexit.register(_report)
+
+
+def trace(trace_file):
+    """Enable recording phases as trace-event spans."""
+    _start()
+    _STATE[_TRACE] = trace_file
+    atexit.register(_write_trace)
+
+
+@contextlib.contextmanager
+def phase(name, args=None):
+    """Time a phase of work (args are attached to the trace span)."""
+    if not _STATE.get(_ENABLED, False):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _LOCK:
+            if name not in _PHASES:
+                _PHASES[name] = [0, 0.0]
+            _PHASES[name][_CALLS] += 1
+            _PHASES[name][_SECONDS] += elapsed
+            if _TRACE in _STATE:
+                _EVENTS.append(_span(name, start, elapsed, args))
+
+
+def _span(name, start, elapsed, args):
+    """Create a complete ('X') trace event."""
+    event = {}
+    event["name"] = name
+    event["cat"] = name.split(":")[0]
+    event["ph"] = "X"
+    event["ts"] = round((start - _STATE[_START]) * 1000000, 3)
+    event["dur"] = round(elapsed * 1000000, 3)
+    event["pid"] = os.getpid()
+    event["tid"] = threading.get_ident()
+    if args:
+        event["args"] = args
+    return event
+
+
+def _write_trace():
+    """Write the trace events."""
+    trace_file = _STATE[_TRACE]
+    try:
+        with _LOCK:
+            obj = {"traceEvents": _EVENTS, "displayTimeUnit": "ms"}
+            with open(trace_file, 'w') as f:
+                f.write(json.dumps(obj))
+        log.console_output("trace: {}".format(trace_file))
+    except Exception as e:
+        log.error("unable to write trace file")
+        log.error(e)
+
+
+def timed(name):
+    """Time each call of a function as a phase."""
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+def _dump(stamp):
+    """Write the cProfile and tracemalloc dumps."""
+    import tracemalloc
+    profiler = _STATE[_PROFILER]
+    profiler.disable()
+    cache_dir = _STATE[_CACHE]
+    stats_file = os.path.join(cache_dir, "profile.{}.pstats".format(stamp))
+    profiler.dump_stats(stats_file)
+    log.console_output("cProfile stats: {}".format(stats_file))
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    mem_file = os.path.join(cache_dir, "profile.{}.malloc".format(stamp))
+    with open(mem_file, 'w') as f:
+        for stat in snapshot.statistics("lineno")[0:_STATE[_TOP]]:
+            f.write("{}\n".format(stat))
+    top = _STATE[_TOP]
+    log.console_output("tracemalloc top {}: {}".format(top, mem_file))
+
+
+def _report():
+    """Report the phase breakdown."""
+    total = time.perf_counter() - _STATE[_START]
+    log.info("")
+    log.info(_HEADER.format("phase", "calls", "seconds", "%"))
+    for name in _PHASES:
+        calls, seconds = _PHASES[name]
+        percent = 0
+        if total > 0:
+            percent = 100 * seconds / total
+        log.info(_ROW.format(name, calls, seconds, percent))
+    log.info(_ROW.format("(total)", "", total, 100))
+    if _PROFILER in _STATE:
+        try:
+            _dump(int(time.time()))
+        except Exception as e:
+            log.error("unable to write profile dumps")
+            log.error(e)
@@ -0,0 +1,78 @@
+"""
+VCS package check scheduling.
+
+Tracks when each VCS package was last checked (vcs.json in the cache
+directory) so checks are spread across runs: each run only checks the
+stalest packages past the --vcs-ignore threshold, up to a per-run budget
+(number of packages and/or estimated time).
+"""
+import json
+import os
+import naaman.logger as log
+
+_FILE = "vcs"
+_EXT = ".json"
+
+
+def load(context, names):
+    """Load the last check times (name -> timestamp) of (and for) packages."""
+    state = {}
+    state_file = context.cache_file(_FILE, ext=_EXT)
+    default = 0
+    if os.path.exists(state_file):
+        try:
+            with open(state_file, 'r') as f:
+                state = json.loads(f.read())
+        except Exception as e:
+            log.error("unable to read vcs state")
+            log.error(e)
+    else:
+        # the single (all packages) check time of older versions
+        legacy = context.cache_file(_FILE)
+        if os.path.exists(legacy):
+            with open(legacy, 'r') as f:
+                default = float(f.read())
+    for name in names:
+        if name not in state:
+            state[name] = default
+    return state
+
+
+def save(context, state):
+    """Save the last check time of packages."""
+    state_file = context.cache_file(_FILE, ext=_EXT)
+    tmp = state_file + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(state, sort_keys=True))
+    os.rename(tmp, state_file)
+
+
+def due(state, names, now, threshold):
+    """Get the packages to check (after threshold hours), stalest first."""
+    result = [x for x in names if (now - state[x]) / 3600 >= threshold]
+    return sorted(result, key=lambda x: (state[x], x))
+
+
+def schedule(state, names, now, threshold, budget=0, budget_seconds=0,
+             estimates=None):
+    """Get the stalest packages to check within the budget."""
+    known = []
+    if estimates:
+        known = [x for x in estimates.values() if x is not None]
+    guess = 0
+    if len(known) > 0:
+        guess = sum(known) / len(known)
+    selected = []
+    spent = 0
+    for name in due(state, names, now, threshold):
+        if budget > 0 and len(selected) >= budget:
+            break
+        cost = guess
+        if estimates and estimates.get(name, None) is not None:
+            cost = estimates[name]
+        if budget_seconds > 0 and len(selected) > 0 and \
+           spent + cost > budget_seconds:
+            break
+        selected.append(name)
+        spent += cost
+    return selected
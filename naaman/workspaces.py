@@ -0,0 +1,73 @@
+"""
+Persistent per package base build workspaces.
+
+Instead of a throwaway build directory, a workspace per package base is
+kept (and updated in place to the new PKGBUILD revision) so makepkg can
+reuse src/ and build systems that support it rebuild incrementally.
+Workspaces are evicted by age and (total) size.
+"""
+import os
+import shutil
+import time
+import naaman.logger as log
+import naaman.sources as sources
+
+_DAY = 24 * 60 * 60
+_MB = 1024 * 1024
+_CLEAN_LONG = ["--clean", "--cleanbuild"]
+_CLEAN_SHORT = "cC"
+
+
+def get(context, base):
+    """Get (and mark as used) the workspace for a package base."""
+    path = os.path.join(context.get_cache_workspaces(), base)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    os.utime(path)
+    return path
+
+
+def makepkg_args(args):
+    """Get makepkg arguments without the clean options."""
+    result = []
+    for arg in args:
+        if arg in _CLEAN_LONG:
+            continue
+        if arg.startswith("-") and not arg.startswith("--"):
+            arg = "".join([x for x in arg if x not in _CLEAN_SHORT])
+            if arg == "-":
+                continue
+        result.append(arg)
+    return result
+
+
+def evict(context, keep):
+    """Evict workspaces over the age and size limits."""
+    root = context.get_cache_workspaces()
+    if not os.path.exists(root):
+        return
+    now = time.time()
+    found = []
+    for base in os.listdir(root):
+        path = os.path.join(root, base)
+        if base == keep or not os.path.isdir(path):
+            continue
+        found.append((os.path.getmtime(path), base, path))
+    remaining = []
+    for used, base, path in sorted(found):
+        if now - used > context.workspace_age * _DAY:
+            log.console_output("evicting workspace: {}".format(base))
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        remaining.append((base, path))
+    cap = context.workspace_size * _MB
+    sizes = {base: sources.tree_size(path) for base, path in remaining}
+    total = sum(sizes.values())
+    total += sources.tree_size(os.path.join(root, keep))
+    log.debug("workspaces: {} of {} bytes".format(total, cap))
+    for base, path in remaining:
+        if total <= cap:
+            break
+        log.console_output("evicting workspace: {}".format(base))
+        shutil.rmtree(path, ignore_errors=True)
+        total -= sizes[base]
@@ -23,7 +23,7 @@ setup(
     packages=[__pkg_name__, __pkg_name__ + ".arguments"],
     entry_points={
         'console_scripts': [
-            'naaman = naaman.naaman:main',
+            'naaman = naaman.complete:main',
         ],
     },
 )
@@ -1,6 +1,8 @@
 """Argument handling."""
+import argparse
 import naaman.arguments.utils as arg
 import naaman.arguments.config as conf
+import naaman.arguments.syncup as syncup
 import os
 
 
@@ -108,9 +110,22 @@ def manual_args():
     _info(idx, not a.info or a.info_verbose)
 
 
+def roots_args():
+    """Roots are given one per option (targets are not roots)."""
+    parser = argparse.ArgumentParser()
+    syncup.sync_up_options(parser)
+    args, unknown = parser.parse_known_args(["--roots", "a.conf",
+                                             "--roots", "b.conf",
+                                             "pkg"])
+    if args.roots != ["a.conf", "b.conf"] or unknown != ["pkg"]:
+        print("invalid roots: {} {}".format(args.roots, unknown))
+        exit(1)
+
+
 def main():
     """Main-entry harness."""
     manual_args()
+    roots_args()
     config_args()
     print('completed')
 
@@ -1,5 +1,78 @@
 """AUR package testing."""
+import logging
+import os
+import pty
+import shutil
+import subprocess
+import tempfile
 import naaman.aur as aur
+import naaman.executor as executor
+import naaman.shell as sh
+import bench.mockaur as mockaur
+
+_MAKEPKG = """#!/bin/bash
+case "$1" in
+  --printsrcinfo) printf "pkgver = 1.0\\npkgrel = 1\\n";;
+  --packagelist) for p in a b; do echo "$PWD/split-$p-1.0-1-any.pkg.tar.xz"
+                 done;;
+  *) touch split-a-1.0-1-any.pkg.tar.xz split-b-1.0-1-any.pkg.tar.xz;;
+esac
+"""
+_PACMAN = """#!/bin/bash
+echo "$@" >> "$NAAMAN_TEST_PACMAN"
+"""
+
+
+class _Context(object):
+    """Install context."""
+
+    def __init__(self, cache_dir):
+        """Init the instance."""
+        self.can_sudo = False
+        self.workspaces = False
+        self.root_config = None
+        self.sources_size = 0
+        self.repo_dir = None
+        self.executor = executor.Local()
+        self._cache_dir = cache_dir
+
+    def build_dir(self):
+        """Get a build area."""
+        return tempfile.TemporaryDirectory(dir=self._cache_dir)
+
+    def get_cache_mirrors(self):
+        """Get the mirrors."""
+        return os.path.join(self._cache_dir, "mirrors")
+
+    def cache_file(self, file_name, ext=".json"):
+        """Get a cache file."""
+        return os.path.join(self._cache_dir, file_name + ext)
+
+
+class _SearchContext(object):
+    """Search context (quiet, names only)."""
+
+    def __init__(self, repos):
+        """Init the instance."""
+        self.quiet = True
+        self._repos = repos
+
+    def check_repos(self, name):
+        """Check if a package is in the repositories."""
+        return name in self._repos
+
+
+class _Found(logging.Handler):
+    """Collect the printed search results."""
+
+    def __init__(self):
+        """Init the instance."""
+        super().__init__()
+        self.names = []
+
+    def emit(self, record):
+        """Collect a result."""
+        self.names.append(record.getMessage())
 
 
 class MockPkg(object):
@@ -60,11 +133,247 @@ def deps_compare():
     exit(1)
 
 
+def vercmp():
+    """Package version comparison."""
+    for a, b, expect in [("1.0", "1.0", 0),
+                         ("1.0", "2.0", -1),
+                         ("1.10", "1.9", 1),
+                         ("1.0rc1", "1.0", -1),
+                         ("1.0.a", "1.0", 1),
+                         ("1:1.0", "2.0", 1),
+                         ("2.0-1", "2.0-2", -1),
+                         ("2.0", "2.0-5", 0)]:
+        if aur.vercmp(a, b) != expect:
+            print("invalid vercmp: {} {}".format(a, b))
+            exit(1)
+    if not aur.version_matches("1.0-1", "<", "2") or \
+       aur.version_matches("2.0-1", "<", "2") or \
+       aur.version_matches(None, ">=", "1") or \
+       not aur.version_matches(None, None, None):
+        print("invalid version matching")
+        exit(1)
+
+
+def rpc_package():
+    """Package records from rpc results."""
+    result = {"Name": "test",
+              "Version": "1.0-1",
+              "URLPath": "/cgit/aur.git/snapshot/test.tar.gz",
+              "PackageBase": "test-base",
+              "Depends": ["test2>=1", "glibc"],
+              "Provides": ["test-bin"],
+              "LastModified": 1500000000}
+    p = aur.rpc_package(result, deps=result["Depends"])
+    if p.name != "test" or p.base != "test-base" or p.version != "1.0-1":
+        print("invalid package record")
+        exit(1)
+    if p.deps != ("test2>=1", "glibc") or p.depends != p.deps:
+        print("invalid dependencies")
+        exit(1)
+    if p.provides != ("test-bin",) or p.conflicts != ():
+        print("invalid provides/conflicts")
+        exit(1)
+    if p.last_modified != 1500000000 or p.maintainer is not None:
+        print("invalid metadata")
+        exit(1)
+    if hasattr(p, "__dict__"):
+        print("package records should be slotted")
+        exit(1)
+
+
+def _git(args, cwd):
+    """Run a git command."""
+    subprocess.check_call(["git",
+                           "-c", "user.name=test",
+                           "-c", "user.email=test@localhost"] + args,
+                          cwd=cwd,
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+
+def fetch():
+    """Clone and pull package bases."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "fetch")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    work = os.path.join(f, "work")
+    fetch_dir = os.path.join(f, "fetched")
+    os.makedirs(work)
+    os.makedirs(fetch_dir)
+    with open(os.path.join(work, "PKGBUILD"), 'w') as p:
+        p.write("pkgname=test\n")
+    _git(["init", "-q"], work)
+    _git(["add", "PKGBUILD"], work)
+    _git(["commit", "-q", "-m", "init"], work)
+    for base in ["test", "test2"]:
+        _git(["clone", "-q", "--bare", work, base + ".git"], f)
+    aur.set_url(f)
+    results = aur.fetch_all(["test", "test2"], fetch_dir)
+    if [results[x][0] for x in ["test", "test2"]] != [aur.FETCH_CLONED] * 2:
+        print("packages should be cloned")
+        exit(1)
+    _git(["remote", "add", "origin", os.path.join(f, "test.git")], work)
+    _git(["commit", "-q", "--allow-empty", "-m", "update"], work)
+    _git(["push", "-q", "origin", "HEAD"], work)
+    results = aur.fetch_all(["test", "test2"], fetch_dir)
+    status, changes = results["test"]
+    if status != aur.FETCH_UPDATED or len(changes) != 1:
+        print("invalid update: {} {}".format(status, changes))
+        exit(1)
+    if results["test2"][0] != aur.FETCH_UNCHANGED:
+        print("package should be unchanged")
+        exit(1)
+    aur.set_url(aur.AUR_URL)
+
+
+def _script(path, content):
+    """Write an executable script."""
+    with open(path, 'w') as f:
+        f.write(content)
+    os.chmod(path, 0o755)
+
+
+def _installs(pacman_log):
+    """Get the (pacman) install transactions."""
+    if not os.path.exists(pacman_log):
+        return []
+    with open(pacman_log, 'r') as f:
+        result = [x.split(" ") for x in f.read().strip().split("\n")]
+    os.remove(pacman_log)
+    return result
+
+
+def _split():
+    """Install the outputs of a split package base."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "split")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    work = os.path.join(f, "work")
+    fake = os.path.join(f, "fakebin")
+    os.makedirs(work)
+    os.makedirs(fake)
+    _script(os.path.join(fake, "makepkg"), _MAKEPKG)
+    _script(os.path.join(fake, "pacman"), _PACMAN)
+    path = os.environ["PATH"]
+    os.environ["PATH"] = fake + os.pathsep + path
+    pacman_log = os.path.join(f, "pacman")
+    os.environ["NAAMAN_TEST_PACMAN"] = pacman_log
+    with open(os.path.join(work, "PKGBUILD"), 'w') as p:
+        p.write("pkgbase=split\n")
+    _git(["init", "-q"], work)
+    _git(["add", "PKGBUILD"], work)
+    _git(["commit", "-q", "-m", "init"], work)
+    _git(["clone", "-q", "--bare", work, "split.git"], f)
+    aur.set_url(f)
+    prompts = []
+    confirm = sh.confirm
+
+    def counted(message, display, default_yes, must_confirm):
+        prompts.append(message)
+        return None
+    sh.confirm = counted
+    context = _Context(f)
+    pkg = aur.AURPackage("split-a", "1.0-1", None, None, "split")
+    if not aur.install(pkg, [], "", context, None,
+                       outputs=["split-a", "split-b"]):
+        print("split outputs should install")
+        exit(1)
+    installs = _installs(pacman_log)
+    if len(prompts) != 0 or len(installs) != 1 or \
+       installs[0] != ["-U",
+                       "split-a-1.0-1-any.pkg.tar.xz",
+                       "split-b-1.0-1-any.pkg.tar.xz"]:
+        print("outputs should install at once: {} {}".format(
+            prompts, installs))
+        exit(1)
+    if not aur.install(pkg, [], "", context, None):
+        print("split package should install")
+        exit(1)
+    installs = _installs(pacman_log)
+    if len(prompts) != 1 or len(installs) != 1 or len(installs[0]) != 3:
+        print("split package should prompt once: {} {}".format(
+            prompts, installs))
+        exit(1)
+    sh.confirm = confirm
+    os.environ["PATH"] = path
+    aur.set_url(aur.AUR_URL)
+
+
+def split():
+    """Install split outputs (in a terminal, installs run in bash)."""
+    pid, fd = pty.fork()
+    if pid == 0:
+        _split()
+        os._exit(0)
+    output = b""
+    while True:
+        try:
+            data = os.read(fd, 1024)
+        except OSError:
+            break
+        if not data:
+            break
+        output += data
+    if os.waitpid(pid, 0)[1] != 0:
+        print(output.decode("utf-8"))
+        exit(1)
+
+
+def search_many():
+    """Search for several terms."""
+    pkgs = {}
+    for name, desc in [("python-foo", "foo library"),
+                       ("python-bar", "bar library"),
+                       ("foo-bar", "foo and bar"),
+                       ("repo-foo", "in the repositories")]:
+        pkgs[name] = {"Name": name,
+                      "PackageBase": name,
+                      "Version": "1.0-1",
+                      "Description": desc}
+    upstream = mockaur.MockAUR(pkgs)
+    aur.set_url(upstream.start())
+    ctx = _SearchContext(["repo-foo"])
+    logger = logging.getLogger("naaman")
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    found = _Found()
+    logger.addHandler(found)
+    try:
+        for terms, fields, union, expect in [
+                (["foo", "bar"], ["name"], False, ["foo-bar"]),
+                (["foo", "bar"], ["name"], True, ["foo-bar",
+                                                  "python-bar",
+                                                  "python-foo"]),
+                (["foo"], ["name"], False, ["foo-bar", "python-foo"]),
+                (["library"], ["name", "name-desc"], False, ["python-bar",
+                                                             "python-foo"]),
+                (["repo"], ["name"], False, [])]:
+            found.names = []
+            matched = aur.rpc_search_many(terms, fields, union, ctx)
+            if found.names != expect or matched != (len(expect) > 0):
+                print("invalid search {} {}: {}".format(terms,
+                                                        union,
+                                                        found.names))
+                exit(1)
+    finally:
+        logger.removeHandler(found)
+        logger.setLevel(level)
+        upstream.stop()
+        aur.set_url(aur.AUR_URL)
+
+
 def main():
     """Main-entry harness."""
     is_vcs()
     deps_compare()
+    vercmp()
     get_deps()
+    rpc_package()
+    fetch()
+    search_many()
+    split()
     print('completed')
 
 
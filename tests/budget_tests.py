@@ -0,0 +1,113 @@
+"""Time budget testing."""
+import naaman.aur as aur
+import naaman.budget as budget
+import naaman.naaman as naaman
+
+
+def _planned(name, last_modified, depends=(), base=None):
+    """Create a planned package."""
+    pkg = aur.AURPackage(name, "1.0-1", None, None, base or name)
+    pkg.depends = tuple(depends)
+    pkg.last_modified = last_modified
+    return pkg
+
+
+def seconds():
+    """Parse durations."""
+    for value, expect in [("45m", 2700),
+                          ("1h30m", 5400),
+                          ("90s", 90),
+                          ("10", 600)]:
+        if budget.seconds(value) != expect:
+            print("invalid duration: {}".format(value))
+            exit(1)
+    for value in ["", "0", "m", "10x", "1h30"]:
+        try:
+            budget.seconds(value)
+            print("duration should be invalid: {}".format(value))
+            exit(1)
+        except ValueError:
+            pass
+
+
+def costs():
+    """Estimate package base costs."""
+    a = _planned("a", 1)
+    b = _planned("b", 1)
+    b.makedepends = ("x", "y")
+    result = budget.costs([a, b], {"a": None, "b": None})
+    if result != {"a": 300, "b": 420}:
+        print("invalid metadata costs: {}".format(result))
+        exit(1)
+    result = budget.costs([a, b], {"a": 100, "b": None})
+    if result != {"a": 100, "b": 100}:
+        print("invalid history costs: {}".format(result))
+        exit(1)
+
+
+def select():
+    """Select packages within the budget."""
+    packages = [_planned("lib", 50),
+                _planned("app", 40, depends=["lib>=1"]),
+                _planned("old", 10),
+                _planned("new", 90),
+                _planned("new-docs", 90, base="new")]
+    base_costs = {"lib": 20, "app": 20, "old": 30, "new": 10}
+    selected, deferred = budget.select(packages, base_costs, 60, ["app"])
+    if [x.name for x in selected] != ["lib", "app", "new", "new-docs"]:
+        print("invalid selection: {}".format([x.name for x in selected]))
+        exit(1)
+    if [x.name for x in deferred] != ["old"]:
+        print("invalid deferred: {}".format([x.name for x in deferred]))
+        exit(1)
+    selected, deferred = budget.select(packages, base_costs, 45, [])
+    if [x.name for x in selected] != ["old", "new", "new-docs"]:
+        print("invalid stale selection: {}".format(
+            [x.name for x in selected]))
+        exit(1)
+
+
+def critical_path():
+    """Order builds by their critical path."""
+    lib = _planned("lib", 1)
+    app = _planned("app", 1, depends=["lib>=1"])
+    tool = _planned("tool", 1)
+    docs = _planned("docs", 1, depends=["app"])
+    builds = [[tool], [lib], [app], [docs]]
+    base_costs = {"tool": 50, "lib": 10, "app": 20, "docs": 30}
+    ordered, lengths = budget.critical_path(builds, base_costs)
+    if [x[0].name for x in ordered] != ["lib", "tool", "app", "docs"]:
+        print("invalid order: {}".format([x[0].name for x in ordered]))
+        exit(1)
+    if lengths != {"lib": 60, "app": 50, "docs": 30, "tool": 50}:
+        print("invalid path lengths: {}".format(lengths))
+        exit(1)
+    if budget.requires(builds)["docs"] != set(["app"]):
+        print("invalid requirements")
+        exit(1)
+
+
+def group_bases():
+    """Group split outputs by package base."""
+    builds = naaman._group_bases([_planned("a", 1),
+                                  _planned("x-one", 1, base="x"),
+                                  _planned("b", 1, base="b"),
+                                  _planned("x-two", 1, base="x")])
+    result = [[x.name for x in group] for group in builds]
+    if result != [["a"], ["x-one", "x-two"], ["b"]]:
+        print("invalid package base groups: {}".format(result))
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    seconds()
+    costs()
+    select()
+    critical_path()
+    group_bases()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
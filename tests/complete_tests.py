@@ -0,0 +1,44 @@
+"""Package name completion testing."""
+import gzip
+import os
+import naaman.complete as complete
+
+_NAMES = ["yay", "naaman", "aurutils", "naaman-git", "pkg-a", "pkg-b", "zz"]
+
+
+def lookups():
+    """Prefix lookups on the name index."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    source = os.path.join(f, "packages.gz")
+    with open(source, 'wb') as g:
+        text = "# AUR package list\n" + "\n".join(_NAMES) + "\n"
+        g.write(gzip.compress(text.encode("utf-8")))
+    index = os.path.join(f, complete.INDEX)
+    if complete.refresh(index, source) != len(_NAMES):
+        print("invalid index")
+        exit(1)
+    for prefix, expect in [("naaman", ["naaman", "naaman-git"]),
+                           ("pkg-", ["pkg-a", "pkg-b"]),
+                           ("a", ["aurutils"]),
+                           ("zz", ["zz"]),
+                           ("zzz", []),
+                           ("0", []),
+                           ("", sorted(_NAMES))]:
+        found = complete.lookup(index, prefix)
+        if found != expect:
+            print("invalid lookup {}: {}".format(prefix, found))
+            exit(1)
+    if complete.lookup(index, "", limit=2) != ["aurutils", "naaman"]:
+        print("lookups should be limited")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    lookups()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
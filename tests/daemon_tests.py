@@ -0,0 +1,97 @@
+"""Resident daemon (and client) testing."""
+import contextlib
+import io
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import naaman.daemon as daemon
+
+_DAEMON = """import sys
+import naaman.daemon as daemon
+import naaman.logger as log
+
+
+class _Handle(object):
+    dbpath = sys.argv[2]
+
+
+class _Context(object):
+    alpm = None
+    handle = _Handle()
+
+
+def _runner(args, resident):
+    if args == ["fail"]:
+        raise Exception("failing request")
+    if args == ["exit"]:
+        exit(3)
+    for arg in args:
+        log.console_output(arg)
+    return 0
+
+
+log.init(False, False, sys.argv[2])
+daemon.serve(_Context(), None, sys.argv[1], _runner)
+"""
+
+
+def _client(path, args):
+    """Run a client request (exit code and output)."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        code = daemon.client(path, args)
+    return code, out.getvalue()
+
+
+def serving():
+    """Serve client requests over the socket until interrupted."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "daemon")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    os.makedirs(f)
+    path = os.path.join(f, "naaman.sock")
+    if _client(path, ["hello"])[0] != 1:
+        print("client should fail without a daemon")
+        exit(1)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(f))
+    proc = subprocess.Popen([sys.executable, "-c", _DAEMON, path, f],
+                            env=env,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+        for args, expect in [(["hello", "two\nlines"],
+                              (0, " => hello\n => two\nlines\n")),
+                             (["exit"], (3, "")),
+                             (["fail"], (1, "")),
+                             (["again"], (0, " => again\n"))]:
+            result = _client(path, args)
+            if result != expect:
+                print("invalid reply {}: {}".format(args, result))
+                exit(1)
+        proc.send_signal(signal.SIGINT)
+        proc.wait(timeout=10)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    if os.path.exists(path):
+        print("socket should be removed on shutdown")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    serving()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
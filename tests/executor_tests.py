@@ -0,0 +1,252 @@
+"""Build executor (spool/worker) testing."""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import naaman.executor as executor
+import naaman.shell as sh
+
+_MAKEPKG = """#!/bin/bash
+[ -e FAIL ] && echo "failing build" && exit 1
+base=$(basename $PWD)
+echo "$base $@" >> "$NAAMAN_TEST_BUILT"
+sleep 0.5
+touch "$base-1.0-1-any.pkg.tar.xz"
+"""
+_CHROOT = """#!/bin/bash
+echo "$@" >> "$NAAMAN_TEST_INSTALLED"
+while [ "$1" != "--" ]; do shift; done
+shift
+makepkg "$@"
+"""
+_WORKER = """import sys
+import naaman.executor as executor
+executor.work(sys.argv[1], sys.argv[2], idle=2, chroot=sys.argv[3])
+"""
+
+
+def _git(args, path):
+    """Run git in a directory."""
+    subprocess.check_call(["git",
+                           "-c", "user.name=naaman",
+                           "-c", "user.email=naaman@localhost"] + args,
+                          cwd=path)
+
+
+def _setup(f, bases):
+    """Create the (fake) makepkg and git sources of package bases."""
+    fake = os.path.join(f, "fakebin")
+    os.makedirs(fake)
+    makepkg = os.path.join(fake, "makepkg")
+    with open(makepkg, 'w') as m:
+        m.write(_MAKEPKG)
+    os.chmod(makepkg, 0o755)
+    chroot = os.path.join(fake, "makechrootpkg")
+    with open(chroot, 'w') as m:
+        m.write(_CHROOT)
+    os.chmod(chroot, 0o755)
+    os.environ["PATH"] = fake + os.pathsep + os.environ["PATH"]
+    os.environ["NAAMAN_TEST_BUILT"] = os.path.join(f, "built")
+    os.environ["NAAMAN_TEST_INSTALLED"] = os.path.join(f, "installed")
+    sources = {}
+    for base in bases:
+        work = os.path.join(f, "work", base)
+        os.makedirs(work)
+        with open(os.path.join(work, "PKGBUILD"), 'w') as p:
+            p.write("pkgname={}\n".format(base))
+        if base == "fail":
+            open(os.path.join(work, "FAIL"), 'w').close()
+        _git(["init", "-q"], work)
+        _git(["add", "."], work)
+        _git(["commit", "-q", "-m", "init"], work)
+        sources[base] = (work, sh.head(work))
+    return sources
+
+
+def _build(spool, out, build_job):
+    """Build (wait for) a job."""
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    return spool.build(None, out, build_job)
+
+
+def workers():
+    """Build jobs on several worker processes."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "executor")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    bases = ["a", "b", "c", "d", "fail"]
+    sources = _setup(f, bases)
+    spool_dir = os.path.join(f, "spool")
+    os.makedirs(spool_dir)
+    spool = executor.Spool(spool_dir)
+    jobs = {}
+    for base in bases:
+        source, commit = sources[base]
+        jobs[base] = executor.job(base, source, commit, ["-f"])
+    spool.submit(jobs["a"], priority=10)
+    spool.submit(jobs["b"], priority=100)
+    claimed = executor.claim(spool_dir, "test")
+    if claimed is None or claimed[1]["base"] != "b":
+        print("highest priority job should be claimed first")
+        exit(1)
+    executor.run(spool_dir, "test", claimed[0], claimed[1])
+    out = os.path.join(f, "out")
+    if _build(spool, out, jobs["b"]) is None or \
+       not os.path.exists(os.path.join(out, "b-1.0-1-any.pkg.tar.xz")):
+        print("job not built")
+        exit(1)
+    spool.submit(jobs["c"], requires=["b"], priority=100)
+    claimed = executor.claim(spool_dir, "test")
+    if executor.run(spool_dir, "test", claimed[0], claimed[1]):
+        print("job requiring packages should fail without a chroot")
+        exit(1)
+    if _build(spool, out, jobs["c"]) is not None or \
+       os.path.exists(os.environ["NAAMAN_TEST_INSTALLED"]):
+        print("required packages should not be installed on the host")
+        exit(1)
+    spool.submit(jobs["c"], requires=["b"])
+    for base in ["d", "fail"]:
+        spool.submit(jobs[base])
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(
+        os.path.dirname(f)))
+    procs = []
+    for idx in range(3):
+        procs.append(subprocess.Popen([sys.executable,
+                                       "-c",
+                                       _WORKER,
+                                       spool_dir,
+                                       "worker{}".format(idx),
+                                       "chroot"],
+                                      env=env,
+                                      stdout=subprocess.DEVNULL))
+    for base in ["a", "c", "d"]:
+        if _build(spool, out, jobs[base]) is None:
+            print("job failed: {}".format(base))
+            exit(1)
+        if sh.artifacts(out) != [os.path.join(
+                out, "{}-1.0-1-any.pkg.tar.xz".format(base))]:
+            print("invalid artifacts: {}".format(sh.artifacts(out)))
+            exit(1)
+    if _build(spool, out, jobs["fail"]) is not None:
+        print("job should fail")
+        exit(1)
+    logs = os.listdir(os.path.join(spool_dir, "logs"))
+    # c failed once without a chroot
+    if len(logs) != len(bases) + 1:
+        print("invalid logs: {}".format(logs))
+        exit(1)
+    for p in procs:
+        if p.wait(timeout=30) != 0:
+            print("worker failed")
+            exit(1)
+    with open(os.environ["NAAMAN_TEST_BUILT"], 'r') as b:
+        built = sorted(b.read().split("\n"))
+    if built != ["", "a -f", "b -f", "c -f", "d -f"]:
+        print("jobs should be built once: {}".format(built))
+        exit(1)
+    with open(os.environ["NAAMAN_TEST_INSTALLED"], 'r') as i:
+        installed = [x.split(" ") for x in i.read().strip().split("\n")
+                     if "-I" in x]
+    if len(installed) != 1 or \
+       installed[0][:4] != ["-c", "-r", "chroot", "-I"] or \
+       not installed[0][4].endswith("/b/b-1.0-1-any.pkg.tar.xz") or \
+       installed[0][5:] != ["--", "-f"]:
+        print("required packages should be installed: {}".format(installed))
+        exit(1)
+    spool.finish()
+    if os.listdir(os.path.join(spool_dir, "packages")) != []:
+        print("run packages should be dropped")
+        exit(1)
+    for d in ["jobs", "claimed", "done"]:
+        if os.listdir(os.path.join(spool_dir, d)) != []:
+            print("spool not empty: {}".format(d))
+            exit(1)
+
+
+def stalled():
+    """Requeue stale claims and fail without workers."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "stalled")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    sources = _setup(f, ["a", "b"])
+    spool_dir = os.path.join(f, "spool")
+    executor._STALE = 2
+    executor._HEARTBEAT = 0.2
+    spool = executor.Spool(spool_dir)
+    jobs = {}
+    for base in ["a", "b"]:
+        source, commit = sources[base]
+        jobs[base] = executor.job(base, source, commit, [])
+    spool.submit(jobs["a"])
+    ghost = executor.claim(spool_dir, "ghost")
+    worker = threading.Thread(target=executor.work,
+                              args=(spool_dir, "live"),
+                              kwargs={"idle": 3})
+    worker.start()
+    out = os.path.join(f, "out")
+    if _build(spool, out, jobs["a"]) is None:
+        print("stale claim should be requeued")
+        exit(1)
+    if executor.run(spool_dir, "ghost", ghost[0], ghost[1]):
+        print("stale claim should be discarded")
+        exit(1)
+    worker.join()
+    if _build(spool, out, jobs["b"]) is not None:
+        print("job should fail without workers")
+        exit(1)
+    for d in ["jobs", "claimed", "done", "workers"]:
+        if os.listdir(os.path.join(spool_dir, d)) != []:
+            print("spool not empty: {}".format(d))
+            exit(1)
+    executor._STALE = 300
+    executor._HEARTBEAT = 30
+
+
+def cancel():
+    """Cancel queued jobs."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "spool")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    spool = executor.Spool(f)
+    spool.submit(executor.job("a", "a.git", "1", []))
+    spool.submit(executor.job("a", "a.git", "2", []))
+    if len(os.listdir(os.path.join(f, "jobs"))) != 1:
+        print("outdated job should be cancelled")
+        exit(1)
+    queued = spool.submit(executor.job("a", "a.git", "2", []))
+    if spool.submit(executor.job("a", "a.git", "2", [])) != queued:
+        print("same job should not be requeued")
+        exit(1)
+    if spool.submit(executor.job("a", "a.git", "2", ["-C"])) == queued or \
+       len(os.listdir(os.path.join(f, "jobs"))) != 1:
+        print("job with other makepkg arguments should replace it")
+        exit(1)
+    spool.finish()
+    if executor.claim(f, "test") is not None:
+        print("queued jobs should be cancelled")
+        exit(1)
+    try:
+        executor._depends(f, {"depends": ["packages/../jobs/x"]})
+        print("job dependencies should be in the spool packages")
+        exit(1)
+    except ValueError:
+        pass
+
+
+def main():
+    """Main-entry harness."""
+    workers()
+    stalled()
+    cancel()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Build duration history testing."""
+import os
+import naaman.history as history
+
+
+class _Context(object):
+    """History context stand-in."""
+
+    def __init__(self, cache_dir):
+        """Init the context."""
+        self._cache_dir = cache_dir
+
+    def cache_file(self, file_name, ext):
+        """Get a cache file."""
+        return os.path.join(self._cache_dir, file_name + ext)
+
+
+def estimates():
+    """Estimate builds from recorded durations."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    ctx = _Context(os.path.join(f, "bin"))
+    for version in range(10):
+        history.record(ctx, "test", str(version), version * 10, 5)
+    durations = history.load(ctx)
+    if len(durations["test"]) != 5:
+        print("old versions should be dropped")
+        exit(1)
+    if history.estimate(durations, "test", "7") != 75:
+        print("invalid version estimate")
+        exit(1)
+    if history.estimate(durations, "test", "10") != 95:
+        print("should estimate from the latest version")
+        exit(1)
+    if history.estimate(durations, "other", "1") is not None:
+        print("unknown package should not be estimated")
+        exit(1)
+
+
+def durations():
+    """Display durations."""
+    for seconds, expect in [(0.4, "0s"),
+                            (59, "59s"),
+                            (65, "1m05s"),
+                            (3720, "1h02m")]:
+        if history.duration(seconds) != expect:
+            print("invalid duration {}".format(seconds))
+            exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    estimates()
+    durations()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Sync/upgrade journal testing."""
+import os
+import naaman.journal as journal
+
+
+def resume():
+    """Resume a journal with built and installed packages."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    path = os.path.join(f, "journal")
+    artifact = os.path.join(f, "test-1.0-1-any.pkg.tar.xz")
+    with open(artifact, 'w') as a:
+        a.write("test")
+    journal.begin(path, ["test", "test2", "test3"], True, False,
+                  rebuild=["test2"])
+    journal.installed(["test3"])
+    journal.built("test", "1.0-1", [artifact])
+    os.remove(artifact)
+    resumed = journal.load(path)
+    if resumed is None or not journal.is_install(resumed):
+        print("journal should be saved")
+        exit(1)
+    if journal.remaining(resumed) != ["test", "test2"]:
+        print("invalid remaining packages")
+        exit(1)
+    if journal.rebuilding(resumed) != ["test2"]:
+        print("rebuilt packages should be saved")
+        exit(1)
+    files = journal.artifacts(resumed, "test", "1.0-1", ["test"])
+    if files is None or not os.path.exists(files[0]):
+        print("built package files should be saved")
+        exit(1)
+    for base, version, names in [("test", "1.0-2", ["test"]),
+                                 ("test", "1.0-1", ["test-docs"]),
+                                 ("test2", "1.0-1", ["test2"])]:
+        if journal.artifacts(resumed, base, version, names) is not None:
+            print("invalid built package: {} {}".format(base, version))
+            exit(1)
+    journal.begin(path, journal.remaining(resumed), True, False, resumed)
+    journal.installed(["test", "test2"])
+    if journal.remaining(journal.load(path)) != []:
+        print("all packages should be installed")
+        exit(1)
+    journal.finish()
+    if journal.load(path) is not None or os.path.exists(path):
+        print("journal should be finished")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    resume()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Run metrics testing."""
+import os
+import subprocess
+import sys
+import naaman.metrics as metrics
+
+_FAILING = """import sys
+import naaman.metrics as metrics
+metrics.enable(None, sys.argv[1])
+metrics.operation("sync")
+raise Exception("failing run")
+"""
+
+
+def _record(builds):
+    """Get a run record."""
+    record = {"timestamp": 100.5,
+              "operation": "sync",
+              "exit": 0,
+              "duration": 2.25,
+              "build_seconds": builds}
+    for idx, c in enumerate(metrics._COUNTERS):
+        record[c] = idx
+    return record
+
+
+def prometheus():
+    """Format the textfile collector metrics."""
+    text = metrics._prometheus(_record({"b": 2.5, "a": 1}))
+    if not text.endswith("\n"):
+        print("textfile should end with a newline")
+        exit(1)
+    lines = text.strip().split("\n")
+    if lines[:3] != ["# HELP naaman_last_run_timestamp_seconds run start time",
+                     "# TYPE naaman_last_run_timestamp_seconds gauge",
+                     'naaman_last_run_timestamp_seconds{operation="sync"} '
+                     "100.5"]:
+        print("invalid metric: {}".format(lines[:3]))
+        exit(1)
+    samples = [x for x in lines if not x.startswith("#")]
+    if len(samples) != 3 + len(metrics._COUNTERS) + 2:
+        print("invalid samples: {}".format(samples))
+        exit(1)
+    if 'naaman_last_run_exit_code{operation="sync"} 0' not in samples or \
+       'naaman_last_run_packages_built{operation="sync"} 5' not in samples:
+        print("invalid samples: {}".format(samples))
+        exit(1)
+    if samples[-2:] != [
+            'naaman_last_run_build_seconds{operation="sync",package="a"} 1',
+            'naaman_last_run_build_seconds{operation="sync",package="b"} 2.5']:
+        print("invalid build samples: {}".format(samples[-2:]))
+        exit(1)
+    described = [x.split(" ")[2] for x in lines if x.startswith("#")]
+    for name in set([x.split("{")[0] for x in samples]):
+        if described.count(name) != 2 or \
+           "# TYPE {} gauge".format(name) not in lines:
+            print("metric should be described once: {}".format(name))
+            exit(1)
+    if "build_seconds" in metrics._prometheus(_record({})):
+        print("no builds should not export build times")
+        exit(1)
+
+
+def failing():
+    """Export an uncaught error as a failed run."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    os.makedirs(f, exist_ok=True)
+    textfile = os.path.join(f, "metrics.prom")
+    if os.path.exists(textfile):
+        os.remove(textfile)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(f)
+    proc = subprocess.run([sys.executable, "-c", _FAILING, textfile],
+                          env=env,
+                          stderr=subprocess.DEVNULL)
+    if proc.returncode != 1 or not os.path.exists(textfile):
+        print("failing run should be exported")
+        exit(1)
+    with open(textfile, 'r') as t:
+        text = t.read()
+    if 'naaman_last_run_exit_code{operation="sync"} 1\n' not in text:
+        print("failing run should export its exit code: {}".format(text))
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    prometheus()
+    failing()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Preflight check testing."""
+import naaman.aur as aur
+import naaman.preflight as preflight
+
+
+class _Package(object):
+    """Installed package stand-in."""
+
+    def __init__(self, name, provides=(), conflicts=()):
+        """Init the package."""
+        self.name = name
+        self.version = "1.0-1"
+        self.provides = list(provides)
+        self.conflicts = list(conflicts)
+
+
+class _Db(object):
+    """Database stand-in."""
+
+    def __init__(self, packages):
+        """Init the database."""
+        self.pkgcache = packages
+
+
+class _Context(object):
+    """Preflight context stand-in."""
+
+    def __init__(self):
+        """Init the context."""
+        self.skip_deps = False
+        self.db = _Db([_Package("installed-x"),
+                       _Package("old-f"),
+                       _Package("z", conflicts=["g"]),
+                       _Package("y", conflicts=["i>=2"])])
+        self._sync = [_Db([_Package("repo-lib", provides=["lib.so=1-64"])])]
+
+    def get_syncdbs(self):
+        """Get the sync dbs."""
+        return self._sync
+
+
+def _planned(name, depends=(), conflicts=(), replaces=(), checkdepends=()):
+    """Create a planned package."""
+    pkg = aur.AURPackage(name, "1.0-1", None, None, name)
+    pkg.depends = tuple(depends)
+    pkg.checkdepends = tuple(checkdepends)
+    pkg.conflicts = tuple(conflicts)
+    pkg.replaces = tuple(replaces)
+    return pkg
+
+
+def check():
+    """Reject infeasible packages and order the rest."""
+    packages = [_planned("a", depends=["b"]),
+                _planned("b", depends=["repo-lib", "lib.so=1-64"]),
+                _planned("c", depends=["missing>=1"]),
+                _planned("d", depends=["c"]),
+                _planned("e", conflicts=["installed-x"]),
+                _planned("f", conflicts=["old-f"], replaces=["old-f"]),
+                _planned("g"),
+                _planned("h", conflicts=["installed-x<1.0"]),
+                _planned("i", conflicts=["installed-x<2"]),
+                _planned("j", depends=["repo-lib>=2"]),
+                _planned("k", depends=["repo-lib>=1", "repo-lib<2"]),
+                _planned("l", checkdepends=["missing-check"])]
+    ctx = _Context()
+    feasible, problems = preflight.check(ctx, packages, ["-sr"])
+    if [x.name for x in feasible] != ["b", "a", "f", "h", "k"]:
+        print("invalid feasible packages: {}".format(
+            [x.name for x in feasible]))
+        exit(1)
+    expect = {"c": ["requires missing>=1"],
+              "d": ["requires c (can not be installed)"],
+              "e": ["conflicts with installed installed-x"],
+              "g": ["conflicts with installed z"],
+              "i": ["conflicts with installed installed-x"],
+              "j": ["requires repo-lib>=2"],
+              "l": ["requires missing-check"]}
+    if problems != expect:
+        print("invalid problems: {}".format(problems))
+        exit(1)
+    feasible, problems = preflight.check(ctx, packages, ["-sr", "--nocheck"])
+    if "l" in problems:
+        print("check dependencies should be skipped with --nocheck")
+        exit(1)
+    ctx.skip_deps = True
+    feasible, problems = preflight.check(ctx, packages)
+    if "c" in problems or "d" in problems:
+        print("dependency checks should be skipped")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    check()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""RPC proxy testing."""
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.request
+import naaman.aur as aur
+import naaman.proxy as proxy
+import bench.mockaur as mockaur
+
+
+class _Context(object):
+    """Cache context stand-in."""
+
+    def __init__(self, cache_dir):
+        """Init the context."""
+        self.rpc_cache = 60
+        self._cache_dir = cache_dir
+
+    def cache_file(self, name):
+        """Get a cache file."""
+        return os.path.join(self._cache_dir, name + ".cache")
+
+
+def _packages():
+    """Get upstream packages."""
+    pkgs = {}
+    for name in ["test", "test2", "other"]:
+        pkgs[name] = {"Name": name,
+                      "PackageBase": name,
+                      "Version": "1.0-1",
+                      "Description": "proxy " + name}
+    return pkgs
+
+
+def _get(url, path):
+    """Get an rpc response from the proxy."""
+    with urllib.request.urlopen(url + path) as req:
+        return json.loads(req.read().decode("utf-8"))
+
+
+def serving():
+    """Proxy serving and caching."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin", "proxy")
+    if os.path.exists(f):
+        shutil.rmtree(f)
+    os.makedirs(f)
+    upstream = mockaur.MockAUR(_packages())
+    aur.set_url(upstream.start())
+    ctx = _Context(f)
+    httpd = proxy.server(ctx, "127.0.0.1:0")
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:{}".format(httpd.server_address[1])
+    try:
+        j = _get(url, "/rpc?v=5&type=info&arg[]=test&arg[]=test2&arg[]=no")
+        if j["resultcount"] != 2:
+            print("invalid info results")
+            exit(1)
+        if upstream.rpc_requests != 1:
+            print("info should batch upstream")
+            exit(1)
+        j = _get(url, "/rpc?v=5&type=info&arg[]=test2&arg[]=no")
+        if j["resultcount"] != 1 or upstream.rpc_requests != 1:
+            print("info should be cached")
+            exit(1)
+        if not os.path.exists(aur.rpc_cache_file("test", ctx)):
+            print("rpc cache file not written")
+            exit(1)
+        j = _get(url, "/rpc?v=5&type=search&by=name&arg=test")
+        j = _get(url, "/rpc?v=5&type=search&by=name&arg=test")
+        if j["resultcount"] != 2 or upstream.rpc_requests != 2:
+            print("search should be cached")
+            exit(1)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        upstream.stop()
+        aur.set_url(aur.AUR_URL)
+
+
+def coalescing():
+    """Concurrent requests share one upstream request."""
+    p = proxy.RpcProxy(_Context(""))
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch(keys):
+        calls.append(keys)
+        started.set()
+        release.wait()
+        return {k: k[1] for k in keys}
+    results = []
+
+    def get():
+        results.append(p._get([("info", "test")], fetch))
+    first = threading.Thread(target=get)
+    first.start()
+    started.wait()
+    second = threading.Thread(target=get)
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+    if len(calls) != 1:
+        print("requests not coalesced")
+        exit(1)
+    if results != [{("info", "test"): "test"}] * 2:
+        print("invalid coalesced results")
+        exit(1)
+
+
+def failing():
+    """Coalesced requests fail with the upstream request."""
+    p = proxy.RpcProxy(_Context(""))
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch(keys):
+        calls.append(keys)
+        started.set()
+        release.wait()
+        raise IOError("upstream failed")
+    errors = []
+
+    def get():
+        try:
+            p._get([("info", "test")], fetch)
+        except IOError as e:
+            errors.append(e)
+    first = threading.Thread(target=get)
+    first.start()
+    started.wait()
+    second = threading.Thread(target=get)
+    second.start()
+    time.sleep(0.1)
+    release.set()
+    first.join()
+    second.join()
+    if len(calls) != 1 or len(errors) != 2:
+        print("coalesced request should fail: {} {}".format(calls, errors))
+        exit(1)
+
+
+def bounded():
+    """Cache only while results can be served, in bounded memory."""
+    ctx = _Context("")
+    ctx.rpc_cache = 0
+    p = proxy.RpcProxy(ctx)
+    p._get([("search", "name", "test")], lambda keys: {k: [] for k in keys})
+    if len(p._cache) != 0:
+        print("nothing should be cached without a cache period")
+        exit(1)
+    p = proxy.RpcProxy(_Context(""))
+    proxy._MAX_CACHED = 3
+    try:
+        for term in ["a", "b", "c", "d"]:
+            p._get([("search", "name", term)],
+                   lambda keys: {k: [] for k in keys})
+        if sorted([x[2] for x in p._cache.keys()]) != ["b", "c", "d"]:
+            print("oldest result should be dropped: {}".format(p._cache))
+            exit(1)
+        p._cache[("search", "name", "d")] = (0, [])
+        p._get([("search", "name", "e")], lambda keys: {k: [] for k in keys})
+        if sorted([x[2] for x in p._cache.keys()]) != ["b", "c", "e"]:
+            print("expired result should be dropped: {}".format(p._cache))
+            exit(1)
+    finally:
+        proxy._MAX_CACHED = 10000
+
+
+def main():
+    """Main-entry harness."""
+    serving()
+    coalescing()
+    failing()
+    bounded()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
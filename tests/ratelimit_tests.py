@@ -0,0 +1,74 @@
+"""RPC request budget testing."""
+import os
+import time
+import naaman.ratelimit as ratelimit
+
+
+def _limited():
+    """Check if a request is refused."""
+    try:
+        ratelimit.acquire()
+    except ratelimit.Limited:
+        return True
+    return False
+
+
+def budget():
+    """Reserve the end of the budget for critical requests."""
+    f = os.path.join(os.path.dirname(os.path.realpath(__file__)), "bin")
+    state = os.path.join(f, "ratelimit.json")
+    if os.path.exists(state):
+        os.remove(state)
+    os.makedirs(f, exist_ok=True)
+    ratelimit.enable(f, 10)
+    ratelimit.priority(ratelimit.NORMAL)
+    for idx in range(9):
+        if _limited():
+            print("request {} should be allowed".format(idx))
+            exit(1)
+        if ratelimit.pressure() != (idx >= 4):
+            print("invalid pressure at {}".format(idx))
+            exit(1)
+    if ratelimit.ttl(60) != 360:
+        print("cache should be extended")
+        exit(1)
+    if not _limited():
+        print("normal requests should be reserved")
+        exit(1)
+    ratelimit.priority(ratelimit.CRITICAL)
+    if _limited():
+        print("critical requests should be allowed")
+        exit(1)
+    if not _limited():
+        print("budget should be used")
+        exit(1)
+    ratelimit.enable(f, 10)
+    if not ratelimit.pressure():
+        print("budget should be saved")
+        exit(1)
+
+
+def retry_after():
+    """Block (or wait) after a 429."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    ratelimit.enable(os.path.join(f, "bin"), 0)
+    ratelimit.blocked("1")
+    if not _limited():
+        print("normal requests should be blocked")
+        exit(1)
+    ratelimit.priority(ratelimit.CRITICAL)
+    started = time.time()
+    if _limited() or time.time() - started < 0.5:
+        print("critical requests should wait")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    budget()
+    retry_after()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
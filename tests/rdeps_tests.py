@@ -0,0 +1,112 @@
+"""Reverse-dependency index testing."""
+import os
+import shutil
+import naaman.elf as elf
+import naaman.rdeps as rdeps
+
+_LS = "/bin/ls"
+
+
+class _Package(object):
+    """Installed package stand-in."""
+
+    def __init__(self, name, files, depends, provides):
+        """Init the package."""
+        self.name = name
+        self.version = "1.0-1"
+        self.files = [(x, 0, "") for x in files]
+        self.depends = depends
+        self.provides = provides
+
+
+class _Db(object):
+    """Local database stand-in."""
+
+    def __init__(self, packages):
+        """Init the database."""
+        self.pkgcache = packages
+
+
+class _Handle(object):
+    """Handle stand-in."""
+
+    def __init__(self, root):
+        """Init the handle."""
+        self.root = root
+
+
+class _Context(object):
+    """Index context stand-in."""
+
+    def __init__(self, cache_dir, packages):
+        """Init the context."""
+        self._cache_dir = cache_dir
+        self.handle = _Handle(os.path.join(cache_dir, "root"))
+        self.db = _Db(packages)
+
+    def cache_file(self, file_name, ext):
+        """Get a cache file."""
+        return os.path.join(self._cache_dir, file_name + ext)
+
+
+def needed():
+    """Read the sonames an ELF file needs."""
+    if not os.path.exists(_LS):
+        return
+    sonames = elf.needed(_LS)
+    if len(sonames) == 0 or len([x for x in sonames if ".so" in x]) == 0:
+        print("invalid needed sonames: {}".format(sonames))
+        exit(1)
+    if elf.needed(os.path.realpath(__file__)) != []:
+        print("not an elf file")
+        exit(1)
+
+
+def affected():
+    """Find the packages needing a rebuild."""
+    if not os.path.exists(_LS):
+        return
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    root = os.path.join(f, "root")
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(os.path.join(root, "usr", "bin"))
+    os.makedirs(os.path.join(root, "usr", "lib"))
+    shutil.copyfile(_LS, os.path.join(root, "usr", "bin", "test"))
+    sonames = elf.needed(_LS)
+    for soname in sonames[1:]:
+        open(os.path.join(root, "usr", "lib", soname), 'w').close()
+    pkgs = [_Package("test", ["usr/", "usr/bin/test"], [], []),
+            _Package("test2", [], ["lib.so=1-64", "test"], []),
+            _Package("test3", [], ["lib.so=2-64"], []),
+            _Package("test4", [], [sonames[1]], []),
+            _Package("test5", [], ["lib.so>=3-64"], []),
+            _Package("lib", [], [], ["lib.so=2-64"])]
+    ctx = _Context(f, pkgs)
+    entries = rdeps.index(ctx, pkgs[0:5])
+    if entries["test"]["needed"] != sorted(sonames):
+        print("invalid index")
+        exit(1)
+    if rdeps.reverse(entries)["test"] != ["test2"]:
+        print("invalid reverse index")
+        exit(1)
+    result = rdeps.affected(ctx, rdeps.index(ctx, pkgs[0:5]))
+    expect = {"test": ["missing {}".format(sonames[0])],
+              "test2": ["unsatisfied lib.so=1-64"],
+              "test4": ["unsatisfied {}".format(sonames[1])],
+              "test5": ["unsatisfied lib.so>=3-64"]}
+    if result != expect:
+        print("invalid affected packages: {}".format(result))
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    needed()
+    affected()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Local repository testing."""
+import io
+import os
+import tarfile
+import naaman.repo as repo
+
+_DESC = """%FILENAME%
+{}-{}-any.pkg.tar.xz
+
+%NAME%
+{}
+
+%VERSION%
+{}
+
+%DESC%
+test package
+"""
+
+
+def _write_db(repo_dir):
+    """Write a repository database."""
+    with tarfile.open(repo.db_file(repo_dir), "w:gz") as tar:
+        for name, vers in [("test", "1.0-1"), ("test2", "2.0-3")]:
+            data = _DESC.format(name, vers, name, vers).encode("utf-8")
+            info = tarfile.TarInfo("{}-{}/desc".format(name, vers))
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with open(os.path.join(repo_dir, "test-1.0-1-any.pkg.tar.xz"), 'w') as f:
+        f.write("")
+
+
+def packages():
+    """Repository package reading."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    _write_db(f)
+    pkgs = repo.packages(f)
+    if pkgs.get("test2", None) != ("2.0-3", "test2-2.0-3-any.pkg.tar.xz"):
+        print("invalid repo entry")
+        exit(1)
+    if repo.lookup(f, pkgs, "test", "1.0-1") is None:
+        print("did not find package")
+        exit(1)
+    if repo.lookup(f, pkgs, "test", "1.0-2") is not None:
+        print("found wrong version")
+        exit(1)
+    if repo.lookup(f, pkgs, "test2", "2.0-3") is not None:
+        print("found missing package file")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    packages()
+    print('completed')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Managed sources testing."""
+import os
+import naaman.sources as sources
+
+
+class _Package(object):
+    """Installed package stand-in."""
+
+    def __init__(self, name):
+        """Init the package."""
+        self.name = name
+
+
+class _Db(object):
+    """Local database stand-in."""
+
+    def __init__(self, names):
+        """Init the database."""
+        self.pkgcache = [_Package(x) for x in names]
+
+
+class _Context(object):
+    """Sources context stand-in."""
+
+    def __init__(self, cache_dir):
+        """Init the context."""
+        self.sources_size = 1
+        self.db = _Db(["test", "test2"])
+        self._cache_dir = cache_dir
+
+    def get_cache_sources(self):
+        """Get the sources location."""
+        return os.path.join(self._cache_dir, "sources")
+
+
+def _download(path, size):
+    """Write a source file of a size (bytes)."""
+    with open(os.path.join(path, "source.tar.gz"), 'wb') as f:
+        f.write(b"0" * size)
+
+
+def eviction():
+    """Evict sources over the cap (least recently used)."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    ctx = _Context(os.path.join(f, "bin"))
+    half = 600 * 1024
+    for base in ["test", "test2", "test3"]:
+        path = sources.srcdest(ctx, base, [base])
+        _download(path, half)
+        sources.update(ctx, base)
+    remaining = sorted(os.listdir(ctx.get_cache_sources()))
+    if remaining != ["index.json", "test3"]:
+        print("invalid eviction: {}".format(remaining))
+        exit(1)
+    if sources.unused(ctx) != ["test3"]:
+        print("test3 is not installed")
+        exit(1)
+    sources.prune(ctx, ["test3"])
+    if os.path.exists(os.path.join(ctx.get_cache_sources(), "test3")):
+        print("test3 was not pruned")
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    eviction()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
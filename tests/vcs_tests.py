@@ -0,0 +1,82 @@
+"""VCS check scheduling testing."""
+import os
+import naaman.vcs as vcs
+
+_HOUR = 3600
+
+
+class _Context(object):
+    """Scheduling context stand-in."""
+
+    def __init__(self, cache_dir):
+        """Init the context."""
+        self._cache_dir = cache_dir
+
+    def cache_file(self, file_name, ext=".cache"):
+        """Get a cache file."""
+        return os.path.join(self._cache_dir, file_name + ext)
+
+
+def schedule():
+    """Select the stalest due packages within the budget."""
+    now = 100 * _HOUR
+    state = {"a-git": 0, "b-git": 10 * _HOUR, "c-git": 5 * _HOUR,
+             "d-git": 99 * _HOUR}
+    names = sorted(state.keys())
+    if vcs.due(state, names, now, 24) != ["a-git", "c-git", "b-git"]:
+        print("invalid due packages (stalest first)")
+        exit(1)
+    result = vcs.schedule(state, names, now, 24)
+    if result != ["a-git", "c-git", "b-git"]:
+        print("invalid due packages: {}".format(result))
+        exit(1)
+    result = vcs.schedule(state, names, now, 24, budget=2)
+    if result != ["a-git", "c-git"]:
+        print("invalid budget: {}".format(result))
+        exit(1)
+    estimates = {"a-git": 600, "b-git": 60, "c-git": None, "d-git": None}
+    result = vcs.schedule(state, names, now, 24, budget_seconds=900,
+                          estimates=estimates)
+    if result != ["a-git"]:
+        print("invalid time budget (guess): {}".format(result))
+        exit(1)
+    result = vcs.schedule(state, names, now, 24, budget_seconds=60,
+                          estimates=estimates)
+    if result != ["a-git"]:
+        print("at least one package should be checked: {}".format(result))
+        exit(1)
+
+
+def state():
+    """Load and save the per-package check times."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    f = os.path.join(f, "bin")
+    if not os.path.exists(f):
+        os.makedirs(f)
+    ctx = _Context(f)
+    for name in [ctx.cache_file("vcs", ext=".json"), ctx.cache_file("vcs")]:
+        if os.path.exists(name):
+            os.remove(name)
+    with open(ctx.cache_file("vcs"), 'w') as legacy:
+        legacy.write("10.0")
+    loaded = vcs.load(ctx, ["a-git"])
+    if loaded != {"a-git": 10.0}:
+        print("legacy time not used: {}".format(loaded))
+        exit(1)
+    loaded["a-git"] = 20.0
+    vcs.save(ctx, loaded)
+    loaded = vcs.load(ctx, ["a-git", "b-git"])
+    if loaded != {"a-git": 20.0, "b-git": 0}:
+        print("invalid state: {}".format(loaded))
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    schedule()
+    state()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()
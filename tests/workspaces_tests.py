@@ -0,0 +1,56 @@
+"""Build workspace testing."""
+import os
+import naaman.workspaces as workspaces
+
+
+class _Context(object):
+    """Workspace context stand-in."""
+
+    def __init__(self, cache_dir):
+        """Init the context."""
+        self.workspace_age = 30
+        self.workspace_size = 1
+        self._cache_dir = cache_dir
+
+    def get_cache_workspaces(self):
+        """Get the workspaces location."""
+        return os.path.join(self._cache_dir, "workspaces")
+
+
+def makepkg():
+    """Drop makepkg clean options."""
+    args = workspaces.makepkg_args(["-src",
+                                    "--cleanbuild",
+                                    "-C",
+                                    "--noconfirm"])
+    if args != ["-sr", "--noconfirm"]:
+        print("invalid makepkg args: {}".format(args))
+        exit(1)
+
+
+def eviction():
+    """Evict old and oversized workspaces."""
+    f = os.path.dirname(os.path.realpath(__file__))
+    ctx = _Context(os.path.join(f, "bin"))
+    for base in ["old", "big", "test"]:
+        path = workspaces.get(ctx, base)
+        with open(os.path.join(path, "PKGBUILD"), 'wb') as f:
+            f.write(b"0" * 1024 * 1024)
+    old = os.path.join(ctx.get_cache_workspaces(), "old")
+    os.utime(old, (0, 0))
+    workspaces.evict(ctx, "test")
+    remaining = sorted(os.listdir(ctx.get_cache_workspaces()))
+    if remaining != ["test"]:
+        print("invalid eviction: {}".format(remaining))
+        exit(1)
+
+
+def main():
+    """Main-entry harness."""
+    makepkg()
+    eviction()
+    print("completed")
+
+
+if __name__ == "__main__":
+    main()